@@ -77,6 +77,19 @@ def verify_jwt_token(jwt_token) -> tuple[Any, bool] | tuple[None, bool]:
         return None, False
 
 
+def get_request_user_id(request) -> int | None:
+    """
+    ID пользователя из заголовка Authorization для маршрутов, доступных без авторизации.
+    """
+    if not request.headers.get("Authorization"):
+        return None
+
+    payload, verify_result = verify_jwt_token(request.headers["Authorization"])
+    if not payload or not verify_result:
+        return None
+    return payload["user_id"]
+
+
 def verify_refresh_token(token: str) -> bool:
     current_token = Token.query.filter_by(refresh_token=token).first()
     return current_token and current_token.refresh_token == token and current_token.ttl > time()
@@ -1,5 +1,6 @@
 import os
 import logging
+import tempfile
 from dotenv import load_dotenv
 
 
@@ -27,6 +28,28 @@ ADMIN_ROLE_ID = 1
 FACULTY_ROLE_ID = 2
 DEPARTMENT_ROLE_ID = 3
 
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or os.path.join(
+    tempfile.gettempdir(), "maps_uploads"
+)
+GUNICORN_WORKERS = int(os.getenv("GUNICORN_WORKERS") or 4)
+# пул разбора создается в каждом воркере gunicorn, поэтому ядра делятся между воркерами
+EXCEL_POOL_WORKERS = int(
+    os.getenv("EXCEL_POOL_WORKERS") or max(1, (os.cpu_count() or 1) // GUNICORN_WORKERS)
+)
+UPLOAD_TOKEN_LIFETIME = 30 * 60  # 30 minutes in seconds
+UPLOAD_SESSION_LIFETIME = 24 * 3600  # 1 day in seconds
+UPLOAD_COMMIT_BATCH_SIZE = 20  # files per transaction
+UPLOAD_JOB_LEASE = int(os.getenv("UPLOAD_JOB_LEASE") or 10 * 60)  # seconds without heartbeat before requeue
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE") or 8 * 1024 * 1024)
+UPLOAD_SESSION_MAX_FILES = int(os.getenv("UPLOAD_SESSION_MAX_FILES") or 500)
+UPLOAD_MAX_FILE_SIZE = int(os.getenv("UPLOAD_MAX_FILE_SIZE") or 100 * 1024 * 1024)
+UPLOAD_SESSION_MAX_SIZE = int(os.getenv("UPLOAD_SESSION_MAX_SIZE") or 2 * 1024 * 1024 * 1024)
+
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "maps_exports"
+)
+EXPORT_CACHE_SIZE = int(os.getenv("EXPORT_CACHE_SIZE") or 512 * 1024 * 1024)
+
 ACCESS_TOKEN_LIFETIME = 3600  # 1 hour in seconds
 REFRESH_TOKEN_LIFETIME = 7 * 24 * 3600  # 7 days in seconds
 
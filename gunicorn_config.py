@@ -1,5 +1,7 @@
 import sys
 
+from config import GUNICORN_WORKERS
+
 # ------------------------------
 # Server Socket Configuration
 # ------------------------------
@@ -9,7 +11,7 @@ backlog = 2048  # Pending connections queue size
 # ------------------------------
 # Worker Processes
 # ------------------------------
-workers = 4  # Number of worker processes
+workers = GUNICORN_WORKERS  # Number of worker processes, also divides EXCEL_POOL_WORKERS
 worker_class = "sync"  # Worker type: sync, eventlet, gevent, tornado, gthread
 worker_connections = 1000  # Max number of connections per worker
 timeout = 30  # Worker timeout in seconds
@@ -0,0 +1,18 @@
+# ------------------------------
+# Export instance: long streamed responses
+# ------------------------------
+# GET /api/faculties/<id>/maps.zip and GET /api/export-aups build a whole faculty in one request.
+# Sync workers of the main instance are killed after `timeout` seconds of one request, so these
+# routes are served by a separate instance (see README). gthread workers keep notifying the
+# arbiter while request threads run, so `timeout` only catches hung workers, not long downloads.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from gunicorn_config import *  # noqa: E402,F401,F403
+
+bind = "0.0.0.0:5001"  # Server socket to bind
+workers = 2  # Number of worker processes
+worker_class = "gthread"  # Long requests do not block the worker heartbeat
+threads = 4  # Concurrent exports per worker
+proc_name = "maps-gunicorn-export"  # Process name
@@ -0,0 +1,102 @@
+import click
+from flask import Blueprint
+
+from maps.logic.analytics_dump import (
+    DUMP_CHUNK_SIZE,
+    FORMAT_CSV,
+    FORMAT_PARQUET,
+    get_available_format,
+    write_dump,
+)
+from maps.logic.faculty_export import get_faculty_plans, iter_faculty_maps, stream_zip
+from maps.logic.import_dir import format_report, import_dir
+from maps.logic.upload_jobs import run_worker
+
+
+def register_commands(app: Blueprint):
+    @app.cli.command('upload-worker')
+    @click.option('--poll-interval', default=2.0, help='Seconds between queue polls.')
+    def upload_worker(poll_interval):
+        run_worker(poll_interval)
+
+    @app.cli.command('import-dir')
+    @click.argument('path', type=click.Path(exists=True, file_okay=False))
+    @click.option('--resume', is_flag=True, help='Skip files imported by the previous run.')
+    @click.option('--state-file', default=None, help='Resume state file (default: PATH/.maps-import-state).')
+    @click.option('--batch-size', default=20, help='Files per transaction.')
+    @click.option('--merge', is_flag=True, help='Merge re-uploaded plans instead of replacing them.')
+    @click.option('--fill-null-modules', is_flag=True, help='Take missing modules from other plans.')
+    @click.option('--skip-existing', is_flag=True, help='Do not replace existing plans.')
+    @click.option('--no-integrity-check', is_flag=True)
+    @click.option('--no-sum-check', is_flag=True)
+    def import_dir_command(
+        path,
+        resume,
+        state_file,
+        batch_size,
+        merge,
+        fill_null_modules,
+        skip_existing,
+        no_integrity_check,
+        no_sum_check,
+    ):
+        options = {
+            'checkboxIntegralityModel': not no_integrity_check,
+            'checkboxSumModel': not no_sum_check,
+            'checkboxForcedUploadModel': not skip_existing,
+            'checkboxFillNullModulesModel': fill_null_modules,
+            'checkboxMergeModel': merge,
+        }
+        results = import_dir(
+            path,
+            options,
+            batch_size=batch_size,
+            resume=resume,
+            state_path=state_file,
+            echo=click.echo,
+        )
+        click.echo(format_report(results))
+
+    @app.cli.command('export-maps')
+    @click.argument('faculty_id', type=int)
+    @click.argument('output', type=click.Path(dir_okay=False, writable=True))
+    @click.option('--paper-size', type=click.Choice(['3', '4']), default='3', help='A3 or A4.')
+    @click.option('--orientation', type=click.Choice(['land', 'port']), default='land')
+    @click.option('--control', is_flag=True, help='Show control types.')
+    @click.option('--load', is_flag=True, help='Show loads.')
+    def export_maps_command(faculty_id, output, paper_size, orientation, control, load):
+        aup_infos = get_faculty_plans(faculty_id)
+        if not aup_infos:
+            raise click.ClickException(f'Faculty {faculty_id} has no plans')
+
+        options = {'paper_size': paper_size, 'orientation': orientation, 'control': control, 'load': load}
+
+        def entries():
+            for i, (name, data) in enumerate(iter_faculty_maps(aup_infos, options), start=1):
+                click.echo(f'{i}/{len(aup_infos)} {name}')
+                yield name, data
+
+        with open(output, 'wb') as fo:
+            for chunk in stream_zip(entries()):
+                fo.write(chunk)
+
+    @app.cli.command('dump')
+    @click.argument('output', type=click.Path(dir_okay=False, writable=True))
+    @click.option(
+        '--format',
+        'dump_format',
+        type=click.Choice([FORMAT_PARQUET, FORMAT_CSV]),
+        default=None,
+        help='Default: parquet if pyarrow is installed, otherwise gzipped csv.',
+    )
+    @click.option('--chunk-size', default=DUMP_CHUNK_SIZE, help='Rows per fetch from the database.')
+    def dump_command(output, dump_format, chunk_size):
+        available_format = get_available_format(dump_format)
+        if dump_format is not None and available_format != dump_format:
+            raise click.ClickException('Parquet requires pyarrow, use --format csv')
+
+        rows_count = 0
+        with open(output, 'wb') as fo:
+            for rows_count in write_dump(fo, available_format, chunk_size):
+                click.echo(f'{rows_count} rows')
+        click.echo(f'{rows_count} rows written to {output} ({available_format})')
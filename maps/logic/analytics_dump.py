@@ -0,0 +1,172 @@
+"""
+Выгрузка всех строк планов одной денормализованной таблицей для аналитики
+(`flask maps dump`, GET /api/aup-data/dump).
+
+Строки плана с полями шапки плана и названиями из справочников читаются одним запросом
+серверным курсором порциями по DUMP_CHUNK_SIZE строк и сразу пишутся в файл: Parquet
+(порция - группа строк), если установлен pyarrow, иначе CSV в gzip. Явный запрос Parquet
+без pyarrow отклоняется. Память не зависит от числа планов.
+"""
+import csv
+import gzip
+import io
+from typing import BinaryIO, Iterator
+
+from sqlalchemy import or_, select
+
+from maps.models import (AupData, AupInfo, D_Blocks, D_ControlType, D_EdIzmereniya, D_Modules, D_Part, D_Period,
+                         D_TypeRecord, Department, Groups, NameOP, SprDegreeEducation, SprDiscipline, SprFaculty,
+                         SprFormEducation, SprOKCO, db)
+from utils.streams import StreamBuffer
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+FORMAT_PARQUET = "parquet"
+FORMAT_CSV = "csv"
+EXTENSIONS = {FORMAT_PARQUET: ".parquet", FORMAT_CSV: ".csv.gz"}
+MIMETYPES = {FORMAT_PARQUET: "application/vnd.apache.parquet", FORMAT_CSV: "application/gzip"}
+
+DUMP_CHUNK_SIZE = 10000
+
+# (название столбца, выражение, тип в Parquet)
+DUMP_COLUMNS = [
+    ("num_aup", AupInfo.num_aup, "string"),
+    ("faculty", SprFaculty.name_faculty, "string"),
+    ("department", Department.name_department, "string"),
+    ("degree", SprDegreeEducation.name_deg, "string"),
+    ("form", SprFormEducation.form, "string"),
+    ("program_code", NameOP.program_code, "string"),
+    ("direction", SprOKCO.name_okco, "string"),
+    ("profile", NameOP.name_spec, "string"),
+    ("year_beg", AupInfo.year_beg, "int32"),
+    ("year_end", AupInfo.year_end, "int32"),
+    ("is_actual", AupInfo.is_actual, "bool"),
+    ("block", D_Blocks.title, "string"),
+    ("shifr", AupData.shifr, "string"),
+    ("part", D_Part.title, "string"),
+    ("module", D_Modules.title, "string"),
+    ("group", Groups.name_group, "string"),
+    ("type_record", D_TypeRecord.title, "string"),
+    ("discipline", SprDiscipline.title, "string"),
+    ("semester", AupData.id_period, "int32"),
+    ("period", D_Period.title, "string"),
+    ("num_row", AupData.num_row, "int32"),
+    ("control_type", D_ControlType.title, "string"),
+    ("amount", AupData.amount, "float64"),
+    ("ed_izmereniya", D_EdIzmereniya.title, "string"),
+    ("zet", AupData.zet, "float64"),
+]
+COLUMN_NAMES = [name for name, _, _ in DUMP_COLUMNS]
+# количество и ЗЕТ хранятся в сотых долях
+HUNDREDTHS_COLUMNS = (COLUMN_NAMES.index("amount"), COLUMN_NAMES.index("zet"))
+
+
+def get_available_format(dump_format: str | None = None) -> str:
+    """
+    Запрошенный формат или CSV, если для Parquet не установлен pyarrow.
+    """
+    if dump_format == FORMAT_CSV or pyarrow is None:
+        return FORMAT_CSV
+    return FORMAT_PARQUET
+
+
+def get_dump_query():
+    return (
+        select(*(column for _, column, _ in DUMP_COLUMNS))
+        .join(AupInfo, AupData.id_aup == AupInfo.id_aup)
+        .outerjoin(SprFaculty, AupInfo.id_faculty == SprFaculty.id_faculty)
+        .outerjoin(Department, AupInfo.id_department == Department.id_department)
+        .outerjoin(SprDegreeEducation, AupInfo.id_degree == SprDegreeEducation.id_degree)
+        .outerjoin(SprFormEducation, AupInfo.id_form == SprFormEducation.id_form)
+        .outerjoin(NameOP, AupInfo.id_spec == NameOP.id_spec)
+        .outerjoin(SprOKCO, NameOP.program_code == SprOKCO.program_code)
+        .outerjoin(D_Blocks, AupData.id_block == D_Blocks.id)
+        .outerjoin(D_Part, AupData.id_part == D_Part.id)
+        .outerjoin(D_Modules, AupData.id_module == D_Modules.id)
+        .outerjoin(Groups, AupData.id_group == Groups.id_group)
+        .outerjoin(D_TypeRecord, AupData.id_type_record == D_TypeRecord.id)
+        .outerjoin(SprDiscipline, AupData.id_discipline == SprDiscipline.id)
+        .outerjoin(D_Period, AupData.id_period == D_Period.id)
+        .outerjoin(D_ControlType, AupData.id_type_control == D_ControlType.id)
+        .outerjoin(D_EdIzmereniya, AupData.id_edizm == D_EdIzmereniya.id)
+        .where(or_(AupInfo.is_delete.is_(None), AupInfo.is_delete == False))
+        .order_by(AupInfo.num_aup, AupData.id)
+    )
+
+
+def iter_dump_chunks(chunk_size: int = DUMP_CHUNK_SIZE) -> Iterator[list[list]]:
+    """
+    Строки выгрузки порциями по chunk_size. stream_results - серверный курсор
+    (SSCursor у PyMySQL), без него драйвер читает весь результат в память.
+    """
+    result = db.session.execute(
+        get_dump_query().execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    for partition in result.partitions():
+        rows = [list(row) for row in partition]
+        for row in rows:
+            for i in HUNDREDTHS_COLUMNS:
+                if row[i] is not None:
+                    row[i] = row[i] / 100
+        yield rows
+
+
+def write_parquet(fo: BinaryIO, chunks: Iterator[list[list]]) -> Iterator[None]:
+    """
+    Пишет порции в fo группами строк Parquet, после каждой порции возвращает управление.
+    """
+    schema = pyarrow.schema([(name, pyarrow.type_for_alias(type_name)) for name, _, type_name in DUMP_COLUMNS])
+    with pyarrow.parquet.ParquetWriter(fo, schema, compression="zstd") as writer:
+        for rows in chunks:
+            columns = [
+                pyarrow.array(values, type=field.type)
+                for values, field in zip(zip(*rows), schema)
+            ]
+            writer.write_table(pyarrow.Table.from_arrays(columns, schema=schema))
+            yield
+
+
+def write_csv(fo: BinaryIO, chunks: Iterator[list[list]]) -> Iterator[None]:
+    """
+    Пишет порции в fo как CSV в gzip (UTF-8 с BOM для Excel), после каждой порции возвращает управление.
+    """
+    with gzip.GzipFile(fileobj=fo, mode="wb") as archive:
+        text = io.TextIOWrapper(archive, encoding="utf-8-sig", newline="")
+        writer = csv.writer(text)
+        writer.writerow(COLUMN_NAMES)
+        for rows in chunks:
+            writer.writerows(rows)
+            text.flush()
+            yield
+        text.detach()
+
+
+def write_dump(fo: BinaryIO, dump_format: str, chunk_size: int = DUMP_CHUNK_SIZE) -> Iterator[int]:
+    """
+    Пишет выгрузку в fo, после каждой порции возвращает число записанных строк.
+    """
+    rows_count = 0
+
+    def chunks():
+        nonlocal rows_count
+        for rows in iter_dump_chunks(chunk_size):
+            rows_count += len(rows)
+            yield rows
+
+    write = write_parquet if dump_format == FORMAT_PARQUET else write_csv
+    for _ in write(fo, chunks()):
+        yield rows_count
+
+
+def stream_dump(dump_format: str, chunk_size: int = DUMP_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Выгрузка по частям для потокового ответа: после каждой порции отдается записанное.
+    """
+    buffer = StreamBuffer()
+    for _ in write_dump(buffer, dump_format, chunk_size):
+        yield buffer.pop()
+    yield buffer.pop()
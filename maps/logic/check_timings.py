@@ -0,0 +1,62 @@
+"""
+Гистограммы времени выполнения проверок выгрузки (см. excel_check.py).
+
+Гистограммы хранятся в памяти процесса: у каждого воркера gunicorn они свои,
+и GET /upload/check-timings отдает данные только того воркера, который обработал запрос
+(при N воркерах - примерно 1/N всех запусков проверок).
+Проверки, выполненные в пуле разбора (excel_pool.py), учитываются в процессе запроса
+по времени, которое вернул дочерний процесс.
+"""
+import threading
+
+# верхние границы корзин в секундах
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_lock = threading.Lock()
+_histograms: dict[str, dict] = {}
+
+
+def record_timings(timings: dict[str, float]) -> None:
+    with _lock:
+        for name, elapsed in timings.items():
+            histogram = _histograms.setdefault(
+                name, {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1)}
+            )
+            histogram["count"] += 1
+            histogram["sum"] += elapsed
+            histogram["max"] = max(histogram["max"], elapsed)
+            histogram["buckets"][_bucket_index(elapsed)] += 1
+
+
+def _bucket_index(elapsed: float) -> int:
+    for i, bound in enumerate(BUCKETS):
+        if elapsed <= bound:
+            return i
+    return len(BUCKETS)
+
+
+def get_histograms() -> dict[str, dict]:
+    """
+    Гистограммы по проверкам. Корзины накопительные (как в Prometheus):
+    значение для границы le - число запусков, уложившихся в le секунд.
+    """
+    with _lock:
+        result = {}
+        for name, histogram in sorted(_histograms.items()):
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip((*BUCKETS, "+Inf"), histogram["buckets"]):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            result[name] = {
+                "count": histogram["count"],
+                "sum": histogram["sum"],
+                "max": histogram["max"],
+                "buckets": buckets,
+            }
+        return result
+
+
+def reset_histograms() -> None:
+    with _lock:
+        _histograms.clear()
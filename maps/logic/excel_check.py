@@ -1,10 +1,25 @@
 import string
+import time
 from abc import abstractmethod
 
-import pandas
-from maps.logic.tools import timeit, check_skiplist
+import numpy
+
+from maps.logic.check_timings import record_timings
+from maps.logic.tools import get_skipped_mask
+from maps.logic.validation_rules import (
+    get_total_zet_norm,
+    integer_zet_mask,
+    integrity_error,
+    integrity_error_line,
+    is_total_zet_valid,
+    measure_to_zet,
+    total_sum_by_level,
+    total_zet_error,
+    unknown_level_error,
+    unknown_measure_error,
+)
 from maps.models import db, AupInfo
-from pandas import DataFrame
+from pandas import DataFrame, Series
 
 
 from utils.logging import logger
@@ -12,98 +27,211 @@ from utils.logging import logger
 
 class ExcelValidator:
     @classmethod
-    @timeit
-    def validate(cls, options: dict, header: DataFrame, data: DataFrame) -> list[dict]:
+    def validate_db(cls, options: dict, header: DataFrame, data: DataFrame) -> list[dict]:
         """
-        Если Required истина, то в случае неудачного теста последующие за ним не будут выполнены.
+        Проверки, которым нужен доступ к БД. Выполняются отдельно от остальных,
+        когда разбор и проверка файла идут в дочернем процессе (см. excel_pool.py).
         """
+        errors, _, timings = cls.run_validators(cls.get_db_validators(options, header, data))
+        record_timings(timings)
+        return errors
+
+    @classmethod
+    def get_validators(
+        cls, options: dict, header: DataFrame, data: DataFrame, db_checks: bool = True
+    ) -> list["AupValidator"]:
+        context = ValidationContext(header, data)
         validators = [
-            (LoadTitlesCheck(header, data), True),
-            (LoadEmptyCellsCheck(header, data), True),
-            (HeaderEmptyCellsCheck(header, data), False),
+            LoadTitlesCheck(context),
+            LoadEmptyCellsCheck(context),
+            HeaderEmptyCellsCheck(context),
         ]
 
         if options.get("checkboxIntegralityModel", True):
-            validators.append((IntegrityCheck(header, data), False))
+            validators.append(IntegrityCheck(context))
 
         if options.get("checkboxSumModel", True):
-            validators.append((TotalZetCheck(header, data), False))
+            validators.append(TotalZetCheck(context))
 
-        if not options.get("checkboxForcedUploadModel", True):
-            validators.append((ForcedUploadCheck(header, data), False))
+        if db_checks:
+            validators.extend(cls.get_db_validators(options, header, data, context))
 
-        errors = []
+        return validators
 
-        for validator, required in validators:
-            if error := validator.validate():
-                errors.append(error)
+    @classmethod
+    def get_db_validators(
+        cls,
+        options: dict,
+        header: DataFrame,
+        data: DataFrame,
+        context: "ValidationContext | None" = None,
+    ) -> list["AupValidator"]:
+        context = context or ValidationContext(header, data)
+        validators = []
+        if not options.get("checkboxForcedUploadModel", True):
+            validators.append(ForcedUploadCheck(context))
+        return validators
 
-            if error and required:
-                return errors
-        logger.info(f"End of excel validation.")
-        return errors
+    @staticmethod
+    def run_validators(
+        validators: list["AupValidator"],
+    ) -> tuple[list[dict], bool, dict[str, float]]:
+        """
+        Выполняет проверки по порядку готовности их зависимостей (depends_on).
+        Проверки выполняются последовательно: это pandas и циклы Python, которые держат GIL,
+        и потоки не дают ускорения.
+        Зависимости, которых нет в списке, считаются пройденными (их выполнил вызывающий код).
 
+        Возвращает список ошибок в порядке validators, признак того, что были выполнены
+        все проверки (False - выполнение прервано неудачной проверкой), и время каждой проверки.
+        """
+        present = {type(validator) for validator in validators}
+        done: set[type] = set()
+        failed: set[type] = set()
+        errors: dict[type, dict] = {}
+        timings = {}
+        complete = True
+
+        pending = list(validators)
+        while pending:
+            ready = [
+                validator
+                for validator in pending
+                if all(dep in done or dep not in present for dep in validator.depends_on)
+            ]
+            if not ready:
+                raise ValueError(f"Cyclic check dependencies: {[el.name for el in pending]}")
+            pending = [validator for validator in pending if validator not in ready]
+            done.update(type(validator) for validator in ready)
+
+            # проверки, зависимости которых не прошли, пропускаются
+            runnable = [el for el in ready if not failed.intersection(el.depends_on)]
+            if len(runnable) < len(ready):
+                complete = False
+                failed.update(type(el) for el in ready if el not in runnable)
+
+            for validator in runnable:
+                error, elapsed = validator.timed_validate()
+                timings[validator.name] = elapsed
+                if error:
+                    errors[type(validator)] = error
+                    failed.add(type(validator))
+
+            if any(type(el) in errors and el.required for el in runnable):
+                complete = False
+                break
+
+        ordered = [errors[type(el)] for el in validators if type(el) in errors]
+        return ordered, complete, timings
+
+
+class ValidationContext:
+    """
+    Общие для всех проверок файла данные. Производные значения (маска пропускаемых строк и т.п.)
+    вычисляются один раз при первом обращении и переиспользуются проверками.
+    """
 
-class AupValidator:
     def __init__(self, header: DataFrame, data: DataFrame):
         self.header: DataFrame = header
         self.data: DataFrame = data
+        self._skipped: Series | None = None
+        self._counted_data: DataFrame | None = None
+
+    @property
+    def skipped(self) -> Series:
+        if self._skipped is None:
+            self._skipped = get_skipped_mask(
+                self.data["Количество"],
+                self.data["Дисциплина"],
+                self.data["Тип записи"],
+                self.data["Блок"],
+            )
+        return self._skipped
+
+    @property
+    def counted_data(self) -> DataFrame:
+        """
+        Строки выгрузки, которые учитываются при подсчете ЗЕТ (без строк из skiplist).
+        """
+        if self._counted_data is None:
+            self._counted_data = self.data[~self.skipped]
+        return self._counted_data
+
+
+class AupValidator:
+    # неудача проверки прерывает выполнение оставшихся проверок
+    required: bool = False
+    # проверки, которые должны пройти до запуска этой
+    depends_on: tuple[type["AupValidator"], ...] = ()
+
+    def __init__(self, context: ValidationContext):
+        self.context: ValidationContext = context
+        self.header: DataFrame = context.header
+        self.data: DataFrame = context.data
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__
 
     @abstractmethod
     def validate(self) -> dict | None:
         raise NotImplementedError()
 
-    def add_skipped_to_df(self):
-        self.data["skipped"] = self.data.apply(
-            lambda row: not check_skiplist(
-                row["Количество"],
-                row["Дисциплина"],
-                row["Тип записи"],
-                row["Блок"],
-            ),
-            axis=1,
-        )
+    def timed_validate(self) -> tuple[dict | None, float]:
+        start_time = time.perf_counter()
+        error = self.validate()
+        return error, time.perf_counter() - start_time
 
 
-class IntegrityCheck(AupValidator):
-    def validate(self) -> dict | None:
-        """
-        Метод для проверки дисциплин учебного плана на целочисленность зет.
-        Считает общий объем по дисциплине за семестр, если сумма не целая - записывает ошибку.
-        Возвращает список ошибок.
-        """
-        logger.debug("IntegrityCheck: validating...")
-        self.add_skipped_to_df()
+def get_empty_cells(df: DataFrame, columns: str) -> list[str]:
+    """
+    Адреса пустых ячеек листа в нотации Excel (A2, B3, ...) в порядке обхода по строкам.
+    Колонки листа обозначаются буквами по порядку, первая строка листа - заголовки.
+    """
+    letters = numpy.array(list(string.ascii_uppercase[: len(df.columns)]))
+    positions = [string.ascii_uppercase.index(column) for column in columns]
 
-        df = self.data[~self.data["skipped"]]  # '~' used to inverse
-        df = df[["Дисциплина", "Период контроля", "ЗЕТ"]]
-        df = df.groupby(["Дисциплина", "Период контроля"], as_index=False)["ЗЕТ"].sum()
-        df["res"] = df["ЗЕТ"].apply(lambda x: float(abs(x - round(x))) <= 0.05)
+    mask = df.iloc[:, positions].isna().to_numpy()
+    rows, cols = numpy.nonzero(mask)
+    return [f"{letter}{row + 2}" for letter, row in zip(letters[positions][cols], rows)]
 
-        errors = []
-        for _, discipline, period, zet, res in df[~df["res"]].itertuples():
-            errors.append(f"{period}: {discipline} {zet}")
 
-        if not errors:
-            logger.debug("IntegrityCheck: ok")
-            return
+class LoadTitlesCheck(AupValidator):
+    required = True
 
-        logger.debug("IntegrityCheck: failed")
-        return {"message": f"Ошибка при подсчете ЗЕТ" + "\n".join(errors)}
+    def validate(self) -> dict | None:
+        logger.debug("LoadTitlesCheck: validating...")
+        columns = [
+            "Блок",
+            "Шифр",
+            "Часть",
+            "Модуль",
+            "Тип записи",
+            "Дисциплина",
+            "Период контроля",
+            "Нагрузка",
+            "Количество",
+            "Ед. изм.",
+            "ЗЕТ",
+        ]
+        if not all([col in list(self.data.columns) for col in columns]):
+            logger.debug("IntegrityCheck: failed")
+            return {
+                "message": "Второй лист выгрузки должен содержать следующие колонки: "
+                + ", ".join(columns)
+            }
+
+        logger.debug("IntegrityCheck: ok")
 
 
 class LoadEmptyCellsCheck(AupValidator):
+    required = True
+    depends_on = (LoadTitlesCheck,)
+
     def validate(self) -> dict | None:
         logger.debug("LoadEmptyCellsCheck: validating...")
 
-        columns = {el1: el2 for el1, el2 in zip(self.data, string.ascii_uppercase[:11])}
-        df = self.data.rename(columns=columns)
-
-        cells = []
-        for i in range(len(df)):
-            for column in "ABEFGHJ":
-                if df[column][i] is None or pandas.isna(df[column][i]):
-                    cells.append(f"{column}{i + 2}")
+        cells = get_empty_cells(self.data.iloc[:, :11], "ABEFGHJ")
 
         if not cells:
             logger.debug("IntegrityCheck: ok")
@@ -116,19 +244,43 @@ class LoadEmptyCellsCheck(AupValidator):
         }
 
 
+class IntegrityCheck(AupValidator):
+    depends_on = (LoadTitlesCheck, LoadEmptyCellsCheck)
+
+    def validate(self) -> dict | None:
+        """
+        Метод для проверки дисциплин учебного плана на целочисленность зет.
+        Считает общий объем по дисциплине за семестр, если сумма не целая - записывает ошибку.
+        Возвращает список ошибок.
+        """
+        logger.debug("IntegrityCheck: validating...")
+
+        df = self.context.counted_data
+        df = df.groupby(["Дисциплина", "Период контроля"], as_index=False)["ЗЕТ"].sum()
+        df = df[~integer_zet_mask(df["ЗЕТ"])]
+
+        errors = [
+            integrity_error_line(period, discipline, zet)
+            for discipline, period, zet in df.itertuples(index=False)
+        ]
+
+        if not errors:
+            logger.debug("IntegrityCheck: ok")
+            return
+
+        logger.debug("IntegrityCheck: failed")
+        return integrity_error(errors)
+
+
 class HeaderEmptyCellsCheck(AupValidator):
+    depends_on = (LoadTitlesCheck, LoadEmptyCellsCheck)
+
     def validate(self) -> dict | None:
         logger.debug("HeaderEmptyCellsCheck: validating...")
-        columns = {
-            el1: el2 for el1, el2 in zip(self.header, string.ascii_uppercase[:2])
-        }
-        data = self.header.rename(columns=columns)
 
-        cells = []
-        column = "B"
-        for i in range(15):
-            if data[column][i] is None or pandas.isna(data[column][i]):
-                cells.append(f"{column}{i + 2}")
+        # Шапка должна содержать 15 строк, отсутствующие строки считаются пустыми
+        header = self.header.iloc[:, :2].reindex(range(15))
+        cells = get_empty_cells(header, "B")
 
         if not cells:
             logger.debug("IntegrityCheck: ok")
@@ -141,72 +293,44 @@ class HeaderEmptyCellsCheck(AupValidator):
         }
 
 
-class LoadTitlesCheck(AupValidator):
-    def validate(self) -> dict | None:
-        logger.debug("LoadTitlesCheck: validating...")
-        columns = [
-            "Блок",
-            "Шифр",
-            "Часть",
-            "Модуль",
-            "Тип записи",
-            "Дисциплина",
-            "Период контроля",
-            "Нагрузка",
-            "Количество",
-            "Ед. изм.",
-            "ЗЕТ",
-        ]
-        if not all([col in list(self.data.columns) for col in columns]):
-            logger.debug("IntegrityCheck: failed")
-            return {
-                "message": "Второй лист выгрузки должен содержать следующие колонки: "
-                + ", ".join(columns)
-            }
-
-        logger.debug("IntegrityCheck: ok")
-
-
 class TotalZetCheck(AupValidator):
-    total_sum_by_level = {
-        "03": 240,
-        "04": 120,
-        "05": 300,
-    }
-
-    measure_to_zet = {
-        "Часы": 1 / 36,
-        "Недели": 1.5,
-        "Зет": 1,
-    }
+    depends_on = (LoadTitlesCheck, LoadEmptyCellsCheck)
+
+    total_sum_by_level = total_sum_by_level
+    measure_to_zet = measure_to_zet
 
     def validate(self) -> dict | None:
         """
-        Метод для проверки, чтобы общая сумма ЗЕТ соответствовало норме (30 * кол-во семестров)
+        Метод для проверки, чтобы общая сумма ЗЕТ соответствовало норме (30 * кол-во семестров).
+        Неизвестный уровень образования или единица измерения - тоже ошибка: без них сумму не проверить.
         """
         logger.debug("TotalZetCheck: validating...")
 
-        self.add_skipped_to_df()
-        print(self.header.keys())
         okso = self.header["Содержание"][4]
-        level_code = okso.split(".")[1]
+        total_sum = get_total_zet_norm(okso)
+        if total_sum is None:
+            logger.debug(f"TotalZetCheck: unknown education level in {okso}")
+            return unknown_level_error(okso)
+
+        df = self.context.counted_data
+        unknown = [str(el) for el in df["Ед. изм."].unique() if el not in self.measure_to_zet]
+        if unknown:
+            logger.debug(f"TotalZetCheck: unknown measures {unknown}")
+            return unknown_measure_error(unknown)
 
-        total_sum = self.total_sum_by_level[level_code]
-        df = self.data[~self.data["skipped"]]
-        s = df["Количество"] * df["Ед. изм."].map(lambda el: self.measure_to_zet[el])
-        s = s.sum()
+        s = (df["Количество"] * df["Ед. изм."].map(self.measure_to_zet)).sum()
 
-        if abs(total_sum - s) < 0.1:
+        if is_total_zet_valid(s, total_sum):
             logger.debug("IntegrityCheck: ok")
             return
 
         logger.debug("IntegrityCheck: failed")
-        return {
-            "message": f"В выгрузке общая сумма ЗЕТ ({s} ЗЕТ) не соответствует норме ({total_sum} ЗЕТ)"
-        }
+        return total_zet_error(s, total_sum)
 
 
 class ForcedUploadCheck(AupValidator):
+    depends_on = (LoadTitlesCheck, LoadEmptyCellsCheck)
+
     def validate(self) -> dict | None:
         logger.debug("ForcedUploadValidator: validating...")
 
@@ -217,3 +341,4 @@ class ForcedUploadCheck(AupValidator):
             return {"message": f"Учебный план № {aup} уже существует.", "aup": aup}
         else:
             logger.debug("ForcedUploadValidator: ok")
+
@@ -0,0 +1,186 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pandas import DataFrame
+from pandas.util import hash_pandas_object
+from werkzeug.datastructures import FileStorage
+
+import config
+from maps.logic.check_timings import record_timings
+from maps.logic.excel_check import ExcelValidator
+from maps.logic.read_excel import read_excel
+from maps.logic.read_plx import PLX_EXTENSIONS, read_plx
+from utils.logging import logger
+
+STRUCTURE_ERROR = {"message": "Некорректная структура выгрузки."}
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Пул процессов создается один раз на воркер gunicorn и переиспользуется между запросами.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=config.EXCEL_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def reset_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+
+def get_plan_suffix(filename: str | None) -> str:
+    """
+    Расширение для сохраненного файла плана: по нему read_plan выбирает способ чтения.
+    """
+    suffix = os.path.splitext(filename or "")[1].lower()
+    return suffix if suffix in PLX_EXTENSIONS else ".xlsx"
+
+
+def read_plan(path: str) -> tuple[DataFrame, DataFrame]:
+    if path.lower().endswith(PLX_EXTENSIONS):
+        return read_plx(path)
+    return read_excel(path)
+
+
+def spool_files(files: list[FileStorage]) -> list[str]:
+    """
+    Сохраняет загруженные файлы во временную директорию, чтобы передать дочерним процессам пути, а не содержимое.
+    """
+    os.makedirs(config.UPLOAD_SPOOL_DIR, exist_ok=True)
+
+    paths = []
+    for file in files:
+        fd, path = tempfile.mkstemp(
+            suffix=get_plan_suffix(file.filename), dir=config.UPLOAD_SPOOL_DIR
+        )
+        with os.fdopen(fd, "wb") as fo:
+            file.save(fo)
+        paths.append(path)
+    return paths
+
+
+def remove_files(paths: list[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fo:
+        while chunk := fo.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_data_hash(header: DataFrame, data: DataFrame) -> str:
+    """
+    Хеш разобранной выгрузки. Совпадает у файлов с одинаковыми данными,
+    даже если сами файлы различаются (например, пересохранены в Excel).
+    """
+    digest = hashlib.sha256()
+    for df in (header, data):
+        digest.update(repr(list(df.columns)).encode())
+        digest.update(hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def compact_frame(df: DataFrame) -> DataFrame:
+    """
+    Строковые колонки выгрузки состоят из небольшого числа повторяющихся значений,
+    поэтому при передаче между процессами они упаковываются в category.
+    """
+    df = df.copy()
+    for column in df.select_dtypes(include="object"):
+        df[column] = df[column].astype("category")
+    return df
+
+
+def restore_frame(df: DataFrame) -> DataFrame:
+    for column in df.select_dtypes(include="category"):
+        df[column] = df[column].astype(object)
+    return df
+
+
+def structure_error_result() -> dict:
+    return {
+        "header": None,
+        "data": None,
+        "errors": [STRUCTURE_ERROR],
+        "complete": False,
+        "data_hash": None,
+        "timings": {},
+    }
+
+
+def parse_excel_file(path: str, options: dict) -> dict:
+    """
+    Разбор и проверка одного файла. Выполняется в дочернем процессе, поэтому не обращается к БД:
+    проверки с БД выполняются в процессе запроса (ExcelValidator.validate_db).
+    """
+    start_time = time.perf_counter()
+    try:
+        header, data = read_plan(path)
+    except Exception as e:
+        logger.warning(f"Structure error in excel file {path}: {e}")
+        return structure_error_result()
+    parse_time = time.perf_counter() - start_time
+
+    errors, complete, check_timings = ExcelValidator.run_validators(
+        ExcelValidator.get_validators(options, header, data, db_checks=False)
+    )
+
+    return {
+        "header": header,
+        "data": compact_frame(data),
+        "errors": errors,
+        "complete": complete,
+        "data_hash": get_data_hash(header, data),
+        "timings": {
+            "parse": parse_time,
+            "validate": time.perf_counter() - start_time - parse_time,
+            "checks": check_timings,
+        },
+    }
+
+
+def parse_excel_files(paths: list[str], options: dict) -> list[dict]:
+    """
+    Разбирает и проверяет файлы в пуле процессов. Результаты возвращаются в порядке paths.
+    Один файл разбирается в текущем процессе, чтобы не платить за передачу данных.
+    """
+    if len(paths) <= 1 or config.EXCEL_POOL_WORKERS <= 1:
+        results = [parse_excel_file(path, options) for path in paths]
+    else:
+        futures = [get_pool().submit(parse_excel_file, path, options) for path in paths]
+
+        results = []
+        for path, future in zip(paths, futures):
+            try:
+                results.append(future.result())
+            except BrokenProcessPool as e:
+                logger.error(f"Excel pool is broken while processing {path}: {e}")
+                reset_pool()
+                results.append(structure_error_result())
+
+    for result in results:
+        if result["data"] is not None:
+            result["data"] = restore_frame(result["data"])
+        record_timings(result["timings"].get("checks", {}))
+    return results
@@ -0,0 +1,180 @@
+"""
+Дисковый кеш готовых файлов печати (карта дисциплин в xlsx).
+
+Ключ - вид файла, номер АУП, версия содержимого плана (get_plan_version) и параметры печати.
+Файлы лежат в EXPORT_CACHE_DIR/<вид>/<номер АУП>/<версия>-<параметры>.xlsx и пишутся через
+временный файл с os.replace, поэтому общую директорию безопасно используют все воркеры gunicorn.
+При чтении файла обновляется время изменения: при превышении EXPORT_CACHE_SIZE удаляются
+давно не запрошенные файлы (LRU).
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import uuid
+from typing import BinaryIO, Callable
+
+from sqlalchemy import select
+
+import config
+from maps.models import (AupData, AupInfo, ControlTypeShortName, D_Blocks, D_ControlType, D_TypeRecord, Groups,
+                         SprDiscipline, db)
+from utils.logging import logger
+
+UNSAFE_CHARS_RE = re.compile(r"[^\w.-]")
+
+
+def get_plan_version(aup_info: AupInfo) -> str:
+    """
+    Хеш всего, что попадает в файл печати: строки плана с названиями блока и типа записи
+    (по ним дисциплина пропускается), шапка, группы (названия и цвета) и сокращения типов контроля.
+    Один узкий запрос по aup_data без загрузки объектов, заметно дешевле построения файла.
+    """
+    rows = db.session.execute(
+        select(
+            AupData.id,
+            AupData._discipline,
+            SprDiscipline.title,
+            D_Blocks.title,
+            D_TypeRecord.title,
+            AupData.id_period,
+            AupData.num_row,
+            AupData.id_group,
+            AupData.id_block,
+            AupData.id_type_record,
+            AupData.id_type_control,
+            AupData.id_edizm,
+            AupData.amount,
+            AupData.zet,
+        )
+        .outerjoin(SprDiscipline, AupData.id_discipline == SprDiscipline.id)
+        .outerjoin(D_Blocks, AupData.id_block == D_Blocks.id)
+        .outerjoin(D_TypeRecord, AupData.id_type_record == D_TypeRecord.id)
+        .where(AupData.id_aup == aup_info.id_aup)
+        .order_by(AupData.id)
+    ).all()
+    groups = db.session.execute(
+        select(Groups.id_group, Groups.name_group, Groups.color).order_by(Groups.id_group)
+    ).all()
+    control_types = db.session.execute(
+        select(D_ControlType.id, D_ControlType.title, D_ControlType.default_shortname).order_by(D_ControlType.id)
+    ).all()
+    shortnames = db.session.execute(
+        select(ControlTypeShortName.user_id, ControlTypeShortName.control_type_id, ControlTypeShortName.shortname)
+        .order_by(ControlTypeShortName.user_id, ControlTypeShortName.control_type_id)
+    ).all()
+    header = (
+        aup_info.file,
+        aup_info.year_beg,
+        aup_info.spec.program_code,
+        aup_info.spec.okco.name_okco,
+        aup_info.spec.name_spec,
+        aup_info.form.form,
+    )
+
+    digest = hashlib.sha256(repr(header).encode())
+    digest.update(repr([tuple(row) for row in groups]).encode())
+    digest.update(repr([tuple(row) for row in control_types]).encode())
+    digest.update(repr([tuple(row) for row in shortnames]).encode())
+    digest.update(repr([tuple(row) for row in rows]).encode())
+    return digest.hexdigest()[:32]
+
+
+def get_cache_path(kind: str, num_aup: str, version: str, options: dict, suffix: str) -> str:
+    options_hash = hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()[:16]
+    return os.path.join(
+        config.EXPORT_CACHE_DIR, kind, UNSAFE_CHARS_RE.sub("_", num_aup), f"{version}-{options_hash}{suffix}"
+    )
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as fo:
+            fo.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def remove_stale_versions(path: str) -> None:
+    """
+    Удаляет файлы других версий того же плана: после изменения плана они больше не понадобятся.
+    """
+    version = os.path.basename(path).split("-")[0]
+    for entry in os.scandir(os.path.dirname(path)):
+        if not entry.name.startswith(version) and not entry.name.endswith(".tmp"):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def evict(max_size: int | None = None) -> None:
+    """
+    Удаляет давно не запрошенные файлы, пока размер кеша больше max_size (EXPORT_CACHE_SIZE).
+    """
+    max_size = config.EXPORT_CACHE_SIZE if max_size is None else max_size
+
+    files = []
+    for root, _, filenames in os.walk(config.EXPORT_CACHE_DIR):
+        for filename in filenames:
+            if filename.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(os.path.join(root, filename))
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, os.path.join(root, filename)))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def read_cached(path: str) -> BinaryIO | None:
+    """
+    Открытый файл из кеша или None. Открытый файл, а не путь, не сломает вытеснение другим воркером.
+    """
+    try:
+        fo = open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+    try:
+        # отметка использования для LRU
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return fo
+
+
+def store(path: str, data: bytes) -> None:
+    write_atomic(path, data)
+    remove_stale_versions(path)
+
+
+def get_cached_export(
+    kind: str, aup_info: AupInfo, options: dict, render: Callable[[], io.BytesIO], suffix: str = ".xlsx"
+) -> BinaryIO:
+    """
+    Открытый файл печати из кеша, при промахе файл строится функцией render и сохраняется.
+    """
+    path = get_cache_path(kind, aup_info.num_aup, get_plan_version(aup_info), options, suffix)
+    if (fo := read_cached(path)) is not None:
+        return fo
+
+    data = render().getvalue()
+    store(path, data)
+    evict()
+    logger.info(f"export cache: {kind} {aup_info.num_aup} rendered, {len(data)} bytes")
+    return io.BytesIO(data)
@@ -0,0 +1,117 @@
+"""
+Архив карт дисциплин всех планов факультета (GET /faculties/<id>/maps.zip, `flask maps export-maps`).
+
+Данные карт читаются из БД в текущем процессе (get_map_data), а xlsx строятся в пуле процессов
+разбора выгрузок (render_map не обращается к БД). Свежие карты берутся из кеша печати.
+Архив отдается потоком: файл попадает в архив, как только готов. План, карту которого
+не удалось построить, пропускается, а ошибка записывается в ERRORS_ENTRY в конце архива.
+"""
+import os
+import zipfile
+from concurrent.futures import Future, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator
+
+import config
+from maps.logic.excel_pool import get_pool, reset_pool
+from maps.logic.export_cache import evict, get_cache_path, get_plan_version, read_cached, store
+from maps.logic.print_excel import get_map_data, get_plans, render_map
+from maps.models import AupInfo
+from utils.logging import logger
+from utils.streams import StreamBuffer
+
+ERRORS_ENTRY = "errors.txt"
+
+
+def get_faculty_plans(id_faculty: int) -> list[AupInfo]:
+    return get_plans(id_faculty=id_faculty)
+
+
+def get_entry_name(aup_info: AupInfo) -> str:
+    return f"КД {aup_info.num_aup} {os.path.splitext(aup_info.file)[0]}.xlsx"
+
+
+def render_map_result(future: Future, map_data: dict, options: dict) -> bytes:
+    try:
+        return future.result()
+    except BrokenProcessPool as e:
+        logger.error(f"Excel pool is broken while rendering map {map_data['num_aup']}: {e}")
+        reset_pool()
+        return render_map(map_data, options["paper_size"], options["orientation"])
+
+
+def iter_faculty_maps(aup_infos: list[AupInfo], options: dict) -> Iterator[tuple[str, bytes]]:
+    """
+    Пары (имя файла в архиве, xlsx) в порядке готовности.
+    options - параметры печати: paper_size, orientation, control, load.
+    Ошибки отдельных планов не прерывают архив: последним файлом отдается ERRORS_ENTRY.
+    """
+    use_pool = len(aup_infos) > 1 and config.EXCEL_POOL_WORKERS > 1
+    # future -> (имя, путь в кеше, данные карты)
+    pending = {}
+    errors = []
+
+    def add_error(name: str, e: Exception) -> None:
+        logger.exception(f"Failed to render map {name}: {e}")
+        errors.append(f"{name}: {e}")
+
+    def finish(future: Future) -> tuple[str, bytes] | None:
+        name, path, map_data = pending.pop(future)
+        try:
+            data = render_map_result(future, map_data, options)
+        except Exception as e:
+            add_error(name, e)
+            return None
+        store(path, data)
+        return name, data
+
+    for aup_info in aup_infos:
+        name = get_entry_name(aup_info)
+        path = get_cache_path("map", aup_info.num_aup, get_plan_version(aup_info), options, ".xlsx")
+        if (fo := read_cached(path)) is not None:
+            with fo:
+                yield name, fo.read()
+            continue
+
+        try:
+            map_data = get_map_data(aup_info, options["control"], options["load"])
+            if not use_pool:
+                data = render_map(map_data, options["paper_size"], options["orientation"])
+        except Exception as e:
+            add_error(name, e)
+            continue
+
+        if not use_pool:
+            store(path, data)
+            yield name, data
+            continue
+
+        future = get_pool().submit(render_map, map_data, options["paper_size"], options["orientation"])
+        pending[future] = (name, path, map_data)
+
+        # готовые карты отдаются, пока читаются данные следующих планов
+        for future in [el for el in pending if el.done()]:
+            if entry := finish(future):
+                yield entry
+
+    for future in as_completed(list(pending)):
+        if entry := finish(future):
+            yield entry
+
+    evict()
+
+    if errors:
+        yield ERRORS_ENTRY, "\n".join(errors).encode("utf-8")
+
+
+def stream_zip(entries: Iterable[tuple[str, bytes]]) -> Iterator[bytes]:
+    """
+    ZIP-архив по частям: после каждого файла отдается записанное в архив.
+    xlsx уже сжат, поэтому файлы хранятся без сжатия.
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+            yield buffer.pop()
+    yield buffer.pop()
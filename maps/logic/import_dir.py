@@ -0,0 +1,128 @@
+import os
+import time
+from typing import Callable
+
+from maps.logic.excel_pool import hash_file
+from maps.logic.read_plx import PLX_EXTENSIONS
+from maps.logic.save_excel_data import (
+    FILE_FAILED,
+    FILE_INVALID,
+    FILE_SAVED,
+    FILE_UNCHANGED,
+    parse_new_files,
+    save_parsed_files,
+)
+
+EXPORT_EXTENSIONS = (".xlsx", *PLX_EXTENSIONS)
+STATE_FILENAME = ".maps-import-state"
+
+
+def find_export_files(path: str) -> list[str]:
+    """
+    Файлы выгрузок в директории и поддиректориях, без временных файлов Excel (~$...).
+    """
+    paths = []
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            if filename.startswith("~$"):
+                continue
+            if filename.lower().endswith(EXPORT_EXTENSIONS):
+                paths.append(os.path.join(root, filename))
+    return sorted(paths)
+
+
+def load_state(state_path: str) -> set[str]:
+    try:
+        with open(state_path) as fo:
+            return {line.strip() for line in fo if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def append_state(state_path: str, file_hashes: list[str]) -> None:
+    with open(state_path, "a") as fo:
+        fo.writelines(f"{file_hash}\n" for file_hash in file_hashes)
+
+
+def import_batch(paths: list[str], file_hashes: list[str], options: dict) -> list[dict]:
+    """
+    Загружает пачку файлов одной транзакцией, каждый файл - в своем SAVEPOINT:
+    ошибка записи одного файла не откатывает остальные.
+    """
+    parsed_files = parse_new_files(paths, options, file_hashes)
+    results = save_parsed_files(
+        [os.path.basename(path) for path in paths], parsed_files, options
+    )
+    for path, parsed, res in zip(paths, parsed_files, results):
+        res["path"] = path
+        res["rows"] = len(parsed["data"]) if parsed.get("data") is not None else 0
+    return results
+
+
+def import_dir(
+    path: str,
+    options: dict,
+    batch_size: int = 20,
+    resume: bool = False,
+    state_path: str | None = None,
+    echo: Callable[[str], None] = print,
+) -> list[dict]:
+    """
+    Загрузка всех выгрузок из директории. Разбор идет в пуле процессов,
+    запись - пачками по batch_size файлов. Хеши загруженных файлов дописываются
+    в state_path после каждой пачки; с resume такие файлы пропускаются.
+    """
+    state_path = state_path or os.path.join(path, STATE_FILENAME)
+    if not resume and os.path.exists(state_path):
+        os.remove(state_path)
+    done = load_state(state_path)
+
+    paths = find_export_files(path)
+    file_hashes = [hash_file(el) for el in paths]
+    pending = [
+        (el, file_hash)
+        for el, file_hash in zip(paths, file_hashes)
+        if file_hash not in done
+    ]
+    echo(f"{len(paths)} files found, {len(paths) - len(pending)} already imported")
+
+    results = []
+    rows = 0
+    start_time = time.perf_counter()
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        batch_results = import_batch(
+            [el for el, _ in batch], [file_hash for _, file_hash in batch], options
+        )
+        append_state(
+            state_path,
+            [
+                file_hash
+                for (_, file_hash), res in zip(batch, batch_results)
+                if res["status"] in (FILE_SAVED, FILE_UNCHANGED)
+            ],
+        )
+        results.extend(batch_results)
+
+        rows += sum(res["rows"] for res in batch_results)
+        elapsed = time.perf_counter() - start_time
+        echo(
+            f"{len(results)}/{len(pending)} files, "
+            f"{len(results) / elapsed:.1f} files/s, {rows / elapsed:.0f} rows/s"
+        )
+
+    return results
+
+
+def format_report(results: list[dict]) -> str:
+    counts = {}
+    for res in results:
+        counts[res["status"]] = counts.get(res["status"], 0) + 1
+
+    lines = [", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))]
+    for res in results:
+        if res["status"] not in (FILE_INVALID, FILE_FAILED):
+            continue
+        lines.append(f"{res['path']} (АУП {res['aup']}):")
+        lines.extend(f"    {error['message']}" for error in res["errors"])
+    return "\n".join(lines)
@@ -0,0 +1,160 @@
+"""
+Раскладка печатной карты дисциплин: в каком семестре (столбце) и с какой строки стоит дисциплина,
+сколько строк она занимает, рамки ячеек сетки, подписи курсов, шкала ЗЕТ и размер области печати.
+
+Раскладка - обычные списки и словари без привязки к Excel, ее может отрисовать любой формат
+(xlsx, svg, pdf). Координаты считаются с 0 от левого верхнего угла сетки дисциплин:
+column - номер семестра, row - строка сетки (одна строка - половина ЗЕТ).
+Все вычисления - один проход по дисциплинам и один по ячейкам сетки.
+"""
+import re
+from math import ceil
+
+THIN = "thin"
+THICK = "thick"
+
+ROWS_PER_ZET = 2
+# дисциплины меньше 1 ЗЕТ рисуются высотой в 1 ЗЕТ
+MIN_ZET = 1.0
+# на заливке темнее этой яркости (среднее R, G, B) текст белый
+DARK_FILL_GRAY = 140
+# цвета групп и модулей хранятся как #RRGGBB (или RRGGBB)
+COLOR_RE = re.compile(r"#?[0-9A-Fa-f]{6}")
+# заливка для цвета, записанного в БД в другом формате
+DEFAULT_COLOR = "#FFFFFF"
+
+
+def group_by_columns(items: list[dict]) -> list[list[dict]]:
+    """
+    Дисциплины по семестрам (num_col с 1) в порядке num_row. Семестры без дисциплин - пустые списки.
+    """
+    columns = [[] for _ in range(max((el["num_col"] for el in items), default=0))]
+    for el in items:
+        columns[el["num_col"] - 1].append(el)
+    for column in columns:
+        column.sort(key=lambda el: el["num_row"])
+    return columns
+
+
+def get_max_zet(items: list[dict]) -> int:
+    """
+    Наибольшая сумма ЗЕТ в семестре - высота шкалы ЗЕТ.
+    """
+    terms = {}
+    for el in items:
+        terms[el["num_col"]] = terms.get(el["num_col"], 0) + el["zet"]
+    return int(max(terms.values(), default=0))
+
+
+def get_courses(columns_count: int) -> list[tuple[int, int, str]]:
+    """
+    Подписи курсов: (первый столбец, последний столбец, текст). Курс - два семестра,
+    у нечетного числа семестров последний курс занимает один столбец.
+    """
+    return [
+        (course * 2, min(course * 2 + 1, columns_count - 1), f"{course + 1} курс")
+        for course in range(ceil(columns_count / 2))
+    ]
+
+
+def build_layout(items: list[dict]) -> dict:
+    """
+    items - дисциплины из create_json_print (num_col, num_row, zet). Результат:
+      columns    - дисциплины по семестрам;
+      blocks     - {"column", "row", "height", "zet", "item"} в порядке семестров и строк;
+      grid       - занятость сетки: grid[column][row] - номер блока в blocks или None;
+      rows       - число строк сетки (по самому высокому семестру);
+      last_row   - строка с толстой нижней рамкой или None, если высота семестра не целая;
+      max_zet    - высота шкалы ЗЕТ, print_rows x print_columns - размер области печати сетки;
+      scale      - (строка, значение) делений шкалы ЗЕТ, каждое на ROWS_PER_ZET строк;
+      courses    - см. get_courses.
+    """
+    columns = group_by_columns(items)
+
+    blocks = []
+    column_heights = []
+    for x, column in enumerate(columns):
+        row = 0
+        zet_sum = 0
+        for el in column:
+            zet = max(el["zet"], MIN_ZET)
+            height = round(zet * ROWS_PER_ZET)
+            blocks.append({"column": x, "row": row, "height": height, "zet": zet, "item": el})
+            row += height
+            zet_sum += zet
+        column_heights.append(zet_sum * ROWS_PER_ZET)
+
+    height = max(column_heights, default=0)
+    rows = int(height)
+
+    # блоки округляются до целых строк, поэтому могут выходить за сетку
+    grid = [[None] * rows for _ in columns]
+    for i, block in enumerate(blocks):
+        grid_column = grid[block["column"]]
+        for y in range(block["row"], min(block["row"] + block["height"], rows)):
+            grid_column[y] = i
+
+    max_zet = get_max_zet(items)
+    return {
+        "columns": columns,
+        "blocks": blocks,
+        "grid": grid,
+        "rows": rows,
+        "last_row": rows - 1 if float(height).is_integer() else None,
+        "max_zet": max_zet,
+        "print_rows": max_zet * ROWS_PER_ZET,
+        "print_columns": len(columns),
+        "scale": [(zet * ROWS_PER_ZET, zet + 1) for zet in range(max_zet)],
+        "courses": get_courses(len(columns)),
+    }
+
+
+def block_borders(layout: dict, block: dict) -> dict[str, str]:
+    """
+    Рамки блока дисциплины: тонкие слева, справа и снизу, справа у последнего семестра - толстая.
+    """
+    borders = {"left": THIN, "right": THIN, "bottom": THIN}
+    if block["column"] == layout["print_columns"] - 1:
+        borders["right"] = THICK
+    return borders
+
+
+def cell_borders(layout: dict, column: int, row: int) -> dict[str, str]:
+    """
+    Рамки ячейки сетки: у пустых ячеек рамок нет, кроме толстого края карты
+    (правого у последнего семестра и нижнего у строки last_row).
+    """
+    block = layout["grid"][column][row]
+    if block is None:
+        borders = {}
+        if column == layout["print_columns"] - 1:
+            borders["right"] = THICK
+    else:
+        borders = block_borders(layout, layout["blocks"][block])
+
+    if row == layout["last_row"]:
+        borders["bottom"] = THICK
+    return borders
+
+
+def is_color(value) -> bool:
+    return isinstance(value, str) and COLOR_RE.fullmatch(value) is not None
+
+
+def normalize_color(value) -> str:
+    """
+    Цвет в виде #RRGGBB. Значение в другом формате заменяется на DEFAULT_COLOR,
+    поэтому в разметку (SVG) и стили (xlsx) попадают только шесть hex-цифр.
+    """
+    if not is_color(value):
+        return DEFAULT_COLOR
+    return "#" + value.lstrip("#").upper()
+
+
+def get_text_color(color: str) -> str:
+    """
+    Цвет текста на заливке цветом группы (#RRGGBB или RRGGBB): белый на темной, черный на светлой.
+    """
+    color = normalize_color(color).lstrip("#")
+    r, g, b = (int(color[i:i + 2], 16) for i in (0, 2, 4))
+    return "#FFFFFF" if (r + g + b) / 3 < DARK_FILL_GRAY else "#000000"
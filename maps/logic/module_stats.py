@@ -0,0 +1,117 @@
+"""
+Таблица discipline_module_stats: сколько записей aup_data каждой дисциплины относится
+к каждому модулю. По ней при загрузке выгрузки заполняются модули "Без названия"
+(get_discipline_module_mapper).
+
+Таблица обновляется разностью счетчиков плана до и после изменения:
+
+    before = get_plan_module_counts(id_aup)
+    ...  # изменение записей плана
+    update_module_stats(before, get_plan_module_counts(id_aup))
+"""
+from collections import Counter
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from maps.models import AupData, D_Modules, DisciplineModuleStats, db
+
+NAMED_MODULE_PATTERN = '%модуль%"%"'
+
+
+def get_plan_module_counts(id_aup: int) -> Counter:
+    db.session.flush()
+    rows = db.session.execute(
+        select(AupData.id_discipline, AupData.id_module, func.count())
+        .where(
+            AupData.id_aup == id_aup,
+            AupData.id_discipline.is_not(None),
+            AupData.id_module.is_not(None),
+        )
+        .group_by(AupData.id_discipline, AupData.id_module)
+    ).all()
+    return Counter(
+        {(id_discipline, id_module): count for id_discipline, id_module, count in rows}
+    )
+
+
+def upsert_counts(values: list[dict]):
+    """
+    INSERT, который прибавляет count к существующей строке (ON DUPLICATE KEY / ON CONFLICT).
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(DisciplineModuleStats).values(values)
+        return stmt.on_duplicate_key_update(
+            count=DisciplineModuleStats.count + stmt.inserted["count"]
+        )
+
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(DisciplineModuleStats).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=["id_discipline", "id_module"],
+        set_={"count": DisciplineModuleStats.count + stmt.excluded["count"]},
+    )
+
+
+def update_module_stats(before: Counter, after: Counter) -> None:
+    """
+    Применяет к discipline_module_stats разность счетчиков плана after - before.
+    """
+    deltas = [
+        {"id_discipline": key[0], "id_module": key[1], "count": after[key] - before[key]}
+        for key in before.keys() | after.keys()
+        if after[key] != before[key]
+    ]
+    if not deltas:
+        return
+
+    db.session.execute(upsert_counts(deltas))
+    decremented = [(el["id_discipline"], el["id_module"]) for el in deltas if el["count"] < 0]
+    if decremented:
+        db.session.execute(
+            delete(DisciplineModuleStats).where(
+                tuple_(DisciplineModuleStats.id_discipline, DisciplineModuleStats.id_module).in_(decremented),
+                DisciplineModuleStats.count <= 0,
+            )
+        )
+
+
+def move_module_stats(id_module: int, to_id_module: int) -> None:
+    """
+    Переносит счетчики модуля на другой модуль (записи плана переведены на to_id_module).
+    """
+    rows = db.session.execute(
+        select(DisciplineModuleStats.id_discipline, DisciplineModuleStats.count).where(
+            DisciplineModuleStats.id_module == id_module
+        )
+    ).all()
+    update_module_stats(
+        Counter({(id_discipline, id_module): count for id_discipline, count in rows}),
+        Counter({(id_discipline, to_id_module): count for id_discipline, count in rows}),
+    )
+
+
+def get_discipline_module_mapper(id_disciplines) -> dict[int, str]:
+    """
+    Самый частый именованный модуль (Модуль "...") для каждой из дисциплин:
+    ID дисциплины -> название модуля.
+    """
+    rows = db.session.execute(
+        select(DisciplineModuleStats.id_discipline, D_Modules.title)
+        .join(D_Modules, D_Modules.id == DisciplineModuleStats.id_module)
+        .where(
+            DisciplineModuleStats.id_discipline.in_(list(id_disciplines)),
+            D_Modules.title.ilike(NAMED_MODULE_PATTERN),
+        )
+        .order_by(
+            DisciplineModuleStats.id_discipline,
+            DisciplineModuleStats.count.desc(),
+            DisciplineModuleStats.id_module,
+        )
+    ).all()
+
+    res = {}
+    for id_discipline, title in rows:
+        res.setdefault(id_discipline, title)
+    return res
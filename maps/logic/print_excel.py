@@ -1,15 +1,18 @@
 import io
 import os
+import tempfile
 from math import floor
+from typing import BinaryIO, Iterator
 
-import openpyxl
 import xlsxwriter
-from openpyxl.styles import (Alignment, Border, Font, NamedStyle, PatternFill,
-                             Side)
+from sqlalchemy import or_, select
+from xlsxwriter.utility import xl_pixel_width
 
+from maps.logic.map_layout import (THICK, THIN, block_borders, build_layout, cell_borders, get_text_color,
+                                  normalize_color)
 from maps.logic.take_from_bd import create_json_print, elective_disciplines, get_default_shortcuts, get_user_shortcuts
-from maps.logic.tools import get_maximum_rows
-from maps.models import (AupInfo, AupData, Groups, D_Period)
+from maps.models import (AupInfo, AupData, Groups, D_Blocks, D_ControlType, D_EdIzmereniya, D_Modules, D_Part,
+                         D_Period, D_TypeRecord, SprDiscipline, db)
 
 ROW_START_DISCIPLINES = 4
 ROW_HEIGHT = 23
@@ -17,250 +20,225 @@ COLUMN_WIDTH = 46
 SUM_ROW_HEIGHT = ROW_HEIGHT * 30
 SUM_COLUMN_WIDTH = COLUMN_WIDTH * 8
 
-border_thin = Side(style='thin', color='000000')
-border_thick = Side(style='thick', color='000000')
+# коды размеров бумаги Excel
+PAPER_SIZES = {"3": 8, "4": 9}  # A3, A4
+ZOOM = 45
 
+BORDER_THIN = 1
+BORDER_THICK = 5
+BORDER_STYLES = {THIN: BORDER_THIN, THICK: BORDER_THICK}
 
-def makeLegend(wb, table, aup):
-    ws = wb.create_sheet('Legend')
+FONT = {"bold": True, "font_size": 16, "font_name": "Arial"}
+CENTER = {"align": "center", "valign": "vcenter", "text_wrap": True}
 
-    ws['A1'].value = 'ЗЕТ'
-    ws['A1'].style = 'standart'
-    ws['B1'].value = 'Группа'
-    ws['B1'].style = 'standart'
-    ws.column_dimensions["A"].width = 25.0
-    ws.column_dimensions["B"].width = 60.0
+
+class MapFormats:
+    """
+    Форматы ячеек карты. Каждый add_format добавляет стиль в книгу, поэтому формат
+    создается один раз на сочетание свойств (цвет, рамки) и переиспользуется.
+    """
+
+    def __init__(self, book: xlsxwriter.Workbook):
+        self.book = book
+        self._cache = {}
+        self.standart = self.get(**FONT, **CENTER, border=BORDER_THIN)
+        self.special = self.get(**FONT, **CENTER, border=BORDER_THICK)
+        self.header = self.get(**{**FONT, "font_size": 22}, **CENTER, border=BORDER_THICK)
+
+    def get(self, **properties):
+        key = tuple(sorted(properties.items()))
+        if key not in self._cache:
+            self._cache[key] = self.book.add_format(properties)
+        return self._cache[key]
+
+    def colored(self, color: str, **borders):
+        """
+        Ячейка с заливкой цветом группы, цвет текста зависит от яркости заливки.
+        """
+        return self.get(
+            **FONT,
+            **CENTER,
+            font_color=get_text_color(color),
+            bg_color=normalize_color(color),
+            pattern=1,
+            **borders,
+        )
+
+    def grid(self, color: str | None, borders: dict[str, str]):
+        """
+        Ячейка сетки дисциплин с рамками из раскладки (map_layout.cell_borders).
+        """
+        borders = {side: BORDER_STYLES[style] for side, style in borders.items()}
+        if color is None:
+            return self.get(**borders) if borders else None
+        return self.colored(color, **borders)
+
+
+def makeLegend(book, formats: MapFormats, layout, map_data):
+    ws = book.add_worksheet('Legend')
+
+    ws.write('A1', 'ЗЕТ', formats.standart)
+    ws.write('B1', 'Группа', formats.standart)
+    ws.set_column('A:A', 25.0)
+    ws.set_column('B:B', 60.0)
 
     # Словарь с ключом id группировки и значением - сумма зет в карте для группировки
     table_dict = {}
 
     # Словарь для хранения всех группировок
-    group_dict = {}
-
-    for group in Groups.query.all():
-        group_dict[group.id_group] = {'name': group.name_group, 'color': group.color}
+    group_dict = map_data['groups']
 
     # Считаем сумму зет для каждой группировки
-    for column in table:
-        for item in column:
-            if item['id_group'] in table_dict:
-                table_dict[item['id_group']] += item['zet']
-            else:
-                table_dict[item['id_group']] = item['zet']
+    for block in layout['blocks']:
+        id_group = block['item']['id_group']
+        table_dict[id_group] = table_dict.get(id_group, 0) + block['zet']
     sum_zet = 0
 
     for i, key_value in enumerate(table_dict.items()):
-        ws.row_dimensions[i + 2].height = 20
-        ws['A' + str(i + 2)].value = int(key_value[1])
-        ws['A' + str(i + 2)].style = 'standart'
-        ws['B' + str(i + 2)].value = group_dict[key_value[0]]['name']
+        ws.set_row(i + 1, 20)
+        ws.write(i + 1, 0, int(key_value[1]), formats.standart)
+        color = group_dict[key_value[0]]['color'].replace('#', '')
+        ws.write(i + 1, 1, group_dict[key_value[0]]['name'], formats.colored(color, border=BORDER_THIN))
         sum_zet += int(key_value[1])
 
-        color_text_cell(ws, 'B' + str(i + 2), group_dict[key_value[0]]['color'].replace('#', ''))
+    ws.write(len(table_dict) + 1, 0, 'Итого: ' + str(sum_zet), formats.standart)
 
-    ws['A' + str(len(table_dict) + 2)].style = 'standart'
-    ws['A' + str(len(table_dict) + 2)].value = 'Итого: ' + str(sum_zet)
-
-    last_row = len(table_dict) + 2
+    last_row = len(table_dict) + 1
     # отступ от Итого
     last_row += 4
     # --- часть легенды с факультативами ---
 
-    ws['B' + str(last_row)].value = 'Факультативы:'
-    ws['B' + str(last_row)].style = 'standart'
+    ws.write(last_row, 1, 'Факультативы:', formats.standart)
     last_row += 1
-    ws['A' + str(last_row)].style = 'standart'
-    ws['B' + str(last_row)].style = 'standart'
-    ws['A' + str(last_row)].value = 'ЗЕТ'
-    ws['B' + str(last_row)].value = 'Название'
-    ws['C' + str(last_row)].value = 'Часы'
-    ws['C' + str(last_row)].style = 'standart'
-
-    dis = elective_disciplines(aup)
+    ws.write_row(last_row, 0, ['ЗЕТ', 'Название', 'Часы'], formats.standart)
+
+    dis = map_data['electives']
     last_row += 1
     sum = 0
     # запись названий в столбец B
     for key, value in dis.items():
-        ws['B' + str(last_row)] = key
-        ws['B' + str(last_row)].style = 'standart'
-        ws['C' + str(last_row)] = value
-        ws['C' + str(last_row)].style = 'standart'
-        ws['A' + str(last_row)] = value / 36
-        ws['A' + str(last_row)].style = 'standart'
+        ws.write_row(last_row, 0, [value / 36, key, value], formats.standart)
         sum += value / 36
         last_row += 1
 
-    ws['A' + str(last_row)].style = 'standart'
-    ws['A' + str(last_row)].value = f'Итого: {sum}'
+    ws.write(last_row, 0, f'Итого: {sum}', formats.standart)
+    ws.set_zoom(ZOOM)
 
 
-def saveMap(aup, static, papper_size, orientation, control: bool = False, load: bool = False):
-    aup = AupInfo.query.filter_by(num_aup=aup).first()
+def get_map_data(aup: AupInfo, control: bool = False, load: bool = False) -> dict:
+    """
+    Данные карты из БД: дисциплины с подписями, шапка, группы и факультативы.
+    Только простые типы, поэтому результат можно передать в пул процессов (render_map).
+    """
     data = AupData.query.filter_by(id_aup=aup.id_aup).order_by(AupData.shifr, AupData.id_discipline,
                                                                AupData.id_period).all()
-    filename_map = aup.file
-    filename_map_down = f"КД {filename_map}"
-    filename_map = os.path.join(static, 'temp', f"КД {filename_map}")
 
-    table = create_json_print(data)
-
-    max_zet = find_max_zet_excel(table)
-    table = add_table_to_arr_and_sort(table['data'])
-    ws, wb = CreateMap(filename_map, max_zet, len(table))
+    items = create_json_print(data)['data']
+    for el in items:
+        el['text'] = el['discipline']
+        if any([load, control]):
+            el['text'] += load_and_control(el, load, control)
 
     header = Header(aup)
-    header1 = f'''КАРТА ДИСЦИПЛИН УЧЕБНОГО ПЛАНА
+    return {
+        'num_aup': aup.num_aup,
+        'items': items,
+        'header': f'''КАРТА ДИСЦИПЛИН УЧЕБНОГО ПЛАНА
 {header[0]}  
-Профиль "{header[1]}", {header[2]} год набора, {header[3]}'''
-    ws['A1'].style = 'header'
-    ws['A1'] = header1
-
-    ws.merge_cells(
-        f'A1:{chr(ord("A") + len(table))}1')
-
-    for width_border in range(1, len(table) + 1):
-        ws[f"{chr(ord('A') + width_border)}1"].style = 'special'
-        ws[f"{chr(ord('A') + width_border)}2"].style = 'special'
-
-    for course in range(floor(len(table) / 2)):
-        ws[chr(ord("B") + course * 2) + f"{ROW_START_DISCIPLINES - 2}"] = str(course + 1) + " курс"
-        ws[chr(ord("B") + course * 2) + f"{ROW_START_DISCIPLINES - 2}"].style = 'special'
-        ws.merge_cells(
-            f'{chr(ord("B") + course * 2)}{ROW_START_DISCIPLINES - 2}:{chr(ord("B") + course * 2 + 1)}{ROW_START_DISCIPLINES - 2}')
-
-    if not (len(table) / 2).is_integer():
-        ws[chr(ord("B") + floor(len(table) / 2) * 2) + f"{ROW_START_DISCIPLINES - 2}"] = str(
-            floor(len(table) / 2) + 1) + " курс"
-        ws[chr(ord("B") + floor(len(table) / 2) * 2) + f"{ROW_START_DISCIPLINES - 2}"].style = 'special'
+Профиль "{header[1]}", {header[2]} год набора, {header[3]}''',
+        'groups': {group.id_group: {'name': group.name_group, 'color': group.color} for group in Groups.query.all()},
+        'electives': elective_disciplines(aup),
+    }
 
-    for semester in range(len(table)):
-        ws[chr(ord("B") + semester) + f"{ROW_START_DISCIPLINES - 1}"] = str(semester + 1) + ' семестр'
-        ws[chr(ord("B") + semester) + f"{ROW_START_DISCIPLINES - 1}"].style = 'special'
 
-    for i in range(len(table)):
-        merged = 0
-        for el in table[i]:
-            column = chr(ord("B") + i)
-            cell = f"{column}{ROW_START_DISCIPLINES + merged}"
-
-            ws[cell] = el['discipline']
-            
-            if any([load, control]):
-                ws[cell] += load_and_control(el, load, control)
-              
-            color = el['color'].replace('#', '')
+def saveMap(aup, papper_size, orientation, control: bool = False, load: bool = False) -> tuple[io.BytesIO, str]:
+    """
+    Карта дисциплин в формате xlsx. Книга собирается за один проход в памяти.
+    Возвращает файл и имя для скачивания.
+    """
+    aup = AupInfo.query.filter_by(num_aup=aup).first()
+    map_data = get_map_data(aup, control, load)
+    return io.BytesIO(render_map(map_data, papper_size, orientation)), f"КД {aup.file}"
 
-            color_text_cell(ws, cell, color)
 
-            if el['zet'] < 1:
-                el['zet'] = 1.0
+def render_map(map_data: dict, papper_size, orientation) -> bytes:
+    """
+    Построение xlsx по данным get_map_data, без обращений к БД.
+    """
+    layout = build_layout(map_data['items'])
+    columns_count = layout['print_columns']
 
-            merge_range = f"{cell}:{column}{ROW_START_DISCIPLINES + merged + round(el['zet'] * 2) - 1}"
-            ws.merge_cells(merge_range)
+    in_memory_file = io.BytesIO()
+    book = xlsxwriter.Workbook(in_memory_file)
+    formats = MapFormats(book)
+    ws = book.add_worksheet()
+    CreateMap(ws, formats, layout)
+
+    ws.merge_range(0, 0, 0, columns_count, map_data['header'], formats.header)
+
+    for first, last, title in layout['courses']:
+        if first == last:
+            ws.write(ROW_START_DISCIPLINES - 3, 1 + first, title, formats.special)
+        else:
+            ws.merge_range(ROW_START_DISCIPLINES - 3, 1 + first, ROW_START_DISCIPLINES - 3, 1 + last, title,
+                           formats.special)
+
+    for semester in range(columns_count):
+        ws.write(ROW_START_DISCIPLINES - 2, 1 + semester, str(semester + 1) + ' семестр', formats.special)
+
+    top = ROW_START_DISCIPLINES - 1
+    for block in layout['blocks']:
+        el = block['item']
+        color = el['color'].replace('#', '')
+        ws.merge_range(top + block['row'], 1 + block['column'], top + block['row'] + block['height'] - 1,
+                       1 + block['column'], el['text'], formats.grid(color, block_borders(layout, block)))
+
+    # ячейки, у которых рамки отличаются от рамок их блока: края карты
+    last_row = layout['last_row']
+    for x, column in enumerate(layout['grid']):
+        for y, block in enumerate(column):
+            if block is not None and y != last_row:
+                continue
+            color = layout['blocks'][block]['item']['color'].replace('#', '') if block is not None else None
+            cell_format = formats.grid(color, cell_borders(layout, x, y))
+            if cell_format:
+                ws.write_blank(top + y, 1 + x, None, cell_format)
+
+    makeLegend(book, formats, layout, map_data)
+
+    set_print_properties(ws, layout)
 
-            merged += round(el['zet'] * 2)
+    ### Установить нижний колонтитул
+    ws.set_footer(f'&R&"Arial,Bold"&14&K000000АУП {map_data["num_aup"]}', {'margin': 0.1})
+    ws.set_paper(PAPER_SIZES.get(str(papper_size), PAPER_SIZES["3"]))
+    if orientation == "port":
+        ws.set_portrait()
 
-    makeLegend(wb, table, aup)
+    book.close()
+    return in_memory_file.getvalue()
 
-    set_print_properties(table, ws, max_zet)
 
-    ### Установить нижний колонтитул
-    ws.oddFooter.right.text = f"АУП {aup.num_aup}"
-    ws.oddFooter.right.size = 14
-    ws.oddFooter.right.font = "Arial,Bold"
-    ws.oddFooter.right.color = "000000"
-    if papper_size == "3":
-        ws.page_setup.papperSize = ws.PAPERSIZE_A3
-    elif papper_size == "4":
-        ws.page_setup.papperSize = ws.PAPERSIZE_A4
-    if orientation == "land":
-        ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
-    elif orientation == "port":
-        ws.page_setup.orientation = ws.ORIENTATION_PORTRAIT
-
-    for sheets in wb:
-        sheets.sheet_view.zoomScale = 45
-
-    wb.save(filename=filename_map)
-    return filename_map
-
-
-def color_text_cell(ws, cell, color):
-    ws[cell].style = 'standart'
-    r, g, b = tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
-    gray = (r + g + b) / 3
-
-    if gray < 140:
-        ws[cell].font = Font(bold=True, size=16, name='Arial', color="FFFFFF")  # Dvorf False 18
-    else:
-        ws[cell].font = Font(bold=True, size=16, name='Arial', color="000000")  # Dvorf False 18
-
-    ws[cell].fill = PatternFill(start_color=str(
-        color), end_color=str(color), fill_type='solid')
-
-
-def find_max_zet_excel(table):
-    max_zet = 0
-    terms = {}
-    for item in table['data']:
-        if item['num_col'] not in terms:
-            terms[item['num_col']] = item['zet']
-            continue
-        terms[item['num_col']] += item['zet']
-    for _, value in terms.items():
-        if value > max_zet:
-            max_zet = value
-    return int(max_zet)
-
-
-def set_print_properties(table, ws, max_zet):
+def set_print_properties(ws, layout):
     # Set properties
-    alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    ws.set_landscape()
+    ws.center_horizontally()
+    ws.center_vertically()
 
-    ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
-    ws.page_setup.paperSize = ws.PAPERSIZE_A3
-    ws.print_options.horizontalCentered = True
-    ws.print_options.verticalCentered = True
-
-    max_row = get_maximum_rows(sheet_object=ws) * 2
-    ws.print_area = 'A1:' + str(alphabet[len(table)]) + str(max_zet * 2 + ROW_START_DISCIPLINES - 1)
-    ws.page_margins = openpyxl.worksheet.page.PageMargins(
-        left=1 / 5, right=1 / 5, top=1 / 5, bottom=1 / 5, header=0.1, footer=0.1)  # Правка на 0,5 см
+    ws.print_area(0, 0, layout['print_rows'] + ROW_START_DISCIPLINES - 2, layout['print_columns'])
+    ws.set_margins(left=1 / 5, right=1 / 5, top=1 / 5, bottom=1 / 5)  # Правка на 0,5 см
+    ws.set_header('', {'margin': 0.1})
 
     # Высота строк где дисциплины
-    for height_row in range(ROW_START_DISCIPLINES, max_zet * 2 + ROW_START_DISCIPLINES):
-        ws.row_dimensions[height_row].height = SUM_ROW_HEIGHT / max_zet
+    for height_row in range(ROW_START_DISCIPLINES, layout['print_rows'] + ROW_START_DISCIPLINES):
+        ws.set_row(height_row - 1, SUM_ROW_HEIGHT / layout['max_zet'])
 
     # Ширины столбцов где дисциплины
-    for width_column in range(1, len(table) + 1):
-        ws.column_dimensions[f'{chr(ord("A") + width_column)}'].width = SUM_COLUMN_WIDTH / len(table)
-
-    # Определяем высоту наибольшего столбца(семестра) для избежания выхода за границы
-    col_max_height = max([sum(map(lambda cell: cell['zet'], col)) * 2 for col in table])
-
-    # Перевод численных координат в координаты с буквой
-    cell = lambda x, y: f'{chr(ord("A") + x + 1)}{ROW_START_DISCIPLINES + y}'
-
-    # Пустая ли ячейка
-    is_none = lambda x, y: cell(x, y) not in ws.merged_cells
-
-    for x in range(len(table)):
-        for y in range(int(col_max_height)):
-            border = Border()
-            if (not is_none(x, y)):
-                border = Border(left=border_thin, right=border_thin, bottom=border_thin)
+    ws.set_column(1, layout['print_columns'], SUM_COLUMN_WIDTH / layout['print_columns'])
 
-            if (x + 1 == len(table)):
-                border.right = border_thick
-
-            if (y + 1 == col_max_height):
-                border.bottom = border_thick
-
-            ws[cell(x, y)].border = border
-
-    ws.column_dimensions['A'].width = 10  # Column ZET
+    ws.set_column(0, 0, 10)  # Column ZET
     ### Установить открытие страницы полностью
-    ws.page_setup.fitToPage = True
+    ws.fit_to_pages(1, 1)
+    ws.set_zoom(ZOOM)
 
 
 def Header(aup):
@@ -275,124 +253,88 @@ def Header(aup):
     return [program, spec, year_begin, form]
 
 
-def addStyles(workbook):
+def CreateMap(ws, formats: MapFormats, layout):
     """
-        Создает и добавляет стили к файлу Excel
+        Функция задает все данные карты кроме предметов в семестрах
     """
+    ws.set_column(1, 40, 40)
 
-    ns_standart = NamedStyle(name='standart')
-    ns_standart.font = Font(bold=True, size=16, name='Arial')
-    ns_standart.border = Border(left=border_thin, top=border_thin, right=border_thin, bottom=border_thin)
-    ns_standart.alignment = Alignment(
-        horizontal='center', vertical='center', wrapText=True)
-    workbook.add_named_style(ns_standart)
-
-    ns_special = NamedStyle(name='special')
-    ns_special.font = Font(bold=True, size=16, name='Arial')
-    ns_special.border = Border(left=border_thick, top=border_thick, right=border_thick, bottom=border_thick)
-    ns_special.alignment = Alignment(
-        horizontal='center', vertical='center', wrapText=True)
-    workbook.add_named_style(ns_special)
-
-    ns_header = NamedStyle(name='header')
-    ns_header.font = Font(bold=True, size=22, name='Arial')
-    ns_header.border = Border(left=border_thick, top=border_thick, right=border_thick, bottom=border_thick)
-    ns_header.alignment = Alignment(
-        horizontal='center', vertical='center', wrapText=True)
-    workbook.add_named_style(ns_header)
-
-    standart_last_right = NamedStyle(name='standart_last_right')
-    standart_last_right.font = Font(bold=True, size=16, name='Arial')
-    standart_last_right.border = Border(left=border_thin, top=border_thin, right=border_thick, bottom=border_thin)
-    standart_last_right.alignment = Alignment(
-        horizontal='center', vertical='center', wrapText=True)
-    workbook.add_named_style(standart_last_right)
-
-
-def CreateMap(filename_map, max_zet, table_length):
+    ws.set_row(0, 90)
+    ws.set_row(1, 20)
+
+    ws.merge_range(ROW_START_DISCIPLINES - 3, 0, ROW_START_DISCIPLINES - 2, 0, 'З.Е.', formats.special)
+
+    for row, value in layout['scale']:
+        ws.merge_range(ROW_START_DISCIPLINES - 1 + row, 0, ROW_START_DISCIPLINES + row, 0, value, formats.special)
+
+
+AUP_HEADER_FIELDS = [
+    'Номер АУП',
+    'Вид образования',
+    'Уровень образования',
+    'Направление (специальность)',
+    'Код специальности',
+    'Квалификация',
+    'Профиль (специализация)',
+    'Тип стандарта',
+    'Факультет',
+    'Выпускающая кафедра',
+    'Форма обучения',
+    'Год набора',
+    'Период обучения',
+    'На базе',
+    'Фактический срок обучения',
+]
+AUP_DATA_COLUMNS = [
+    'Блок',
+    'Шифр',
+    'Часть',
+    'Модуль',
+    'Тип записи',
+    'Дисциплина',
+    'Период контроля',
+    'Нагрузка',
+    'Количество',
+    'Ед. изм.',
+    'ЗЕТ',
+]
+# строки плана читаются из БД порциями
+AUP_DATA_CHUNK_SIZE = 1000
+# наибольшая ширина столбца в Excel - 255 символов
+MAX_COLUMN_PIXELS = 1790
+
+
+class ColumnWidths:
     """
-        Функция создает карту и задает все данные кроме предметов в семестрах, на вход требует имя карты
+    Ширина столбцов по содержимому, как worksheet.autofit(), но по мере записи строк:
+    autofit не работает в режиме constant_memory, где записанные строки сразу сбрасываются на диск.
     """
 
-    wk = xlsxwriter.Workbook(filename_map)
-    ws = wk.add_worksheet()
-    ws.set_column(1, 40, 40)
-    wk.close()
-    workbook = openpyxl.load_workbook(filename_map)
-    worksheet = workbook.active
-
-    addStyles(workbook)
-
-    worksheet.row_dimensions[1].height = 90
-    worksheet.row_dimensions[2].height = 20
-
-    merge_range = f"A{ROW_START_DISCIPLINES - 2}:A{ROW_START_DISCIPLINES - 1}"
-    worksheet.merge_cells(merge_range)
-    worksheet[f"A{ROW_START_DISCIPLINES - 2}"].style = 'special'
-    worksheet[f"A{ROW_START_DISCIPLINES - 1}"].style = 'special'
-    worksheet[f"A{ROW_START_DISCIPLINES - 2}"] = 'З.Е.'
-
-    for col in range(1, max_zet + 1):
-        merge_range = f"A{col * 2 + ROW_START_DISCIPLINES - 2}:A{col * 2 + ROW_START_DISCIPLINES - 1}"
-        worksheet.merge_cells(merge_range)
-        worksheet["A" + str(col * 2 + ROW_START_DISCIPLINES - 2)] = col
-        worksheet["A" + str(col * 2 + ROW_START_DISCIPLINES - 2)].style = 'special'
-        worksheet["A" + str(col * 2 + ROW_START_DISCIPLINES - 1)].style = 'special'
-    for col in range(ord('B'), ord('C')):
-        worksheet[chr(col) + str(5)].style = 'special'
-    return worksheet, workbook
-
-
-def add_table_to_arr_and_sort(table):
-    count_columns = 0
-    for item in table:
-        if item['num_col'] > count_columns:
-            count_columns = item['num_col']
-
-    new_table = [[] for _ in range(count_columns)]
-
-    for item in table:
-        new_table[item['num_col'] - 1].append(item)
-
-    for a in range(len(new_table)):
-        for i in range(len(new_table[a]) - 1):
-            for j in range(len(new_table[a]) - i - 1):
-                if new_table[a][j]['num_row'] > new_table[a][j + 1]['num_row']:
-                    new_table[a][j], new_table[a][j + 1] = new_table[a][j + 1], new_table[a][j]
-    return (new_table)
-
-
-def get_aup_data_excel(aup: str) -> tuple[io.BytesIO, str]:
-    in_memory_file = io.BytesIO()
-
-    book = xlsxwriter.Workbook(in_memory_file)
-    sheet = book.add_worksheet("Лист1")
-
-    header_format = book.add_format()
-    header_format.set_bold(True)
+    def __init__(self):
+        self.pixels = {}
+        self._string_pixels = {}
+
+    def update(self, values) -> None:
+        for col, value in enumerate(values):
+            if value is None:
+                continue
+            if isinstance(value, str):
+                if value not in self._string_pixels:
+                    self._string_pixels[value] = max(xl_pixel_width(el) for el in value.split('\n'))
+                length = self._string_pixels[value]
+            else:
+                length = 7 * len(str(value))
+            if length > self.pixels.get(col, 0):
+                self.pixels[col] = length
 
-    sheet.write_row(0, 0, ['Наименование', "Содержание", ], header_format)
-    sheet.write_column(1, 0, [
-        'Номер АУП',
-        'Вид образования',
-        'Уровень образования',
-        'Направление (специальность)',
-        'Код специальности',
-        'Квалификация',
-        'Профиль (специализация)',
-        'Тип стандарта',
-        'Факультет',
-        'Выпускающая кафедра',
-        'Форма обучения',
-        'Год набора',
-        'Период обучения',
-        'На базе',
-        'Фактический срок обучения',
-    ])
+    def apply(self, sheet) -> None:
+        for col, length in self.pixels.items():
+            # отступ 7 пикселей, как у Excel
+            sheet.set_column_pixels(col, col, min(length + 7, MAX_COLUMN_PIXELS))
 
-    aup_info: AupInfo = AupInfo.query.filter_by(num_aup=aup).first()
 
-    sheet.write_column(1, 1, [
+def get_aup_header_values(aup_info: AupInfo) -> list:
+    return [
         aup_info.num_aup,
         aup_info.type_educ,
         aup_info.degree.name_deg,
@@ -408,49 +350,130 @@ def get_aup_data_excel(aup: str) -> tuple[io.BytesIO, str]:
         aup_info.period_educ,
         aup_info.base,
         F"{aup_info.years} года" + (f' {aup_info.months} месяцев' if aup_info.months else ''),
-    ])
-
-    sheet.autofit()
-
-    sheet = book.add_worksheet("Лист2")
-
-    sheet.write_row(0, 0, [
-        'Блок',
-        'Шифр',
-        'Часть',
-        'Модуль',
-        'Тип записи',
-        'Дисциплина',
-        'Период контроля',
-        'Нагрузка',
-        'Количество',
-        'Ед. изм.',
-        'ЗЕТ',
-    ], header_format)
-
-    periods = {el.id: el.title for el in D_Period.query.all()}
-
-    for i, el in enumerate(aup_info.aup_data, start=1):
-        el: AupData
-        sheet.write_row(i, 0, [
-            el.block.title,
-            el.shifr,
-            el.part.title,
-            el.module.title,
-            el.type_record.title,
-            el.discipline.title,
-            periods[el.id_period],
-            el.type_control.title,
-            el.amount / 100,
-            el.ed_izmereniya.title,
-            el.zet / 100,
-        ])
-
-    sheet.autofit()
+    ]
+
+
+def get_aup_data_rows(id_aups: list[int]) -> Iterator[tuple]:
+    """
+    Строки планов (AupInfo.num_aup + AUP_DATA_COLUMNS) одним запросом с названиями из справочников.
+    Строки читаются порциями (серверный курсор там, где его поддерживает драйвер).
+    """
+    query = (
+        select(
+            AupInfo.num_aup,
+            D_Blocks.title,
+            AupData.shifr,
+            D_Part.title,
+            D_Modules.title,
+            D_TypeRecord.title,
+            SprDiscipline.title,
+            D_Period.title,
+            D_ControlType.title,
+            AupData.amount,
+            D_EdIzmereniya.title,
+            AupData.zet,
+        )
+        .join(AupInfo, AupData.id_aup == AupInfo.id_aup)
+        .outerjoin(D_Blocks, AupData.id_block == D_Blocks.id)
+        .outerjoin(D_Part, AupData.id_part == D_Part.id)
+        .outerjoin(D_Modules, AupData.id_module == D_Modules.id)
+        .outerjoin(D_TypeRecord, AupData.id_type_record == D_TypeRecord.id)
+        .outerjoin(SprDiscipline, AupData.id_discipline == SprDiscipline.id)
+        .outerjoin(D_Period, AupData.id_period == D_Period.id)
+        .outerjoin(D_ControlType, AupData.id_type_control == D_ControlType.id)
+        .outerjoin(D_EdIzmereniya, AupData.id_edizm == D_EdIzmereniya.id)
+        .where(AupData.id_aup.in_(id_aups))
+        .order_by(AupInfo.num_aup, AupData.id)
+        .execution_options(yield_per=AUP_DATA_CHUNK_SIZE)
+    )
+    for *row, amount, ed_izmereniya, zet in db.session.execute(query):
+        # количество и ЗЕТ хранятся в сотых долях
+        yield *row, amount / 100, ed_izmereniya, zet / 100
+
+
+def get_plans(id_faculty: int | None = None, year: int | None = None) -> list[AupInfo]:
+    """
+    Неудаленные планы факультета и/или года набора.
+    """
+    query = AupInfo.query.filter(or_(AupInfo.is_delete.is_(None), AupInfo.is_delete == False))
+    if id_faculty is not None:
+        query = query.filter_by(id_faculty=id_faculty)
+    if year is not None:
+        query = query.filter_by(year_beg=year)
+    return query.order_by(AupInfo.num_aup).all()
+
+
+def write_aup_sheets(book, aup_info: AupInfo, header_format, sheet_prefix: str = '') -> None:
+    """
+    Лист шапки и лист строк плана в формате выгрузки, которую принимает загрузка.
+    """
+    sheet = book.add_worksheet(f"{sheet_prefix}Лист1")
+    widths = ColumnWidths()
+    sheet.write_row(0, 0, ['Наименование', "Содержание", ], header_format)
+    widths.update(['Наименование', "Содержание", ])
+    for i, row in enumerate(zip(AUP_HEADER_FIELDS, get_aup_header_values(aup_info)), start=1):
+        sheet.write_row(i, 0, row)
+        widths.update(row)
+    widths.apply(sheet)
+
+    sheet = book.add_worksheet(f"{sheet_prefix}Лист2")
+    widths = ColumnWidths()
+    sheet.write_row(0, 0, AUP_DATA_COLUMNS, header_format)
+    widths.update(AUP_DATA_COLUMNS)
+    for i, row in enumerate(get_aup_data_rows([aup_info.id_aup]), start=1):
+        sheet.write_row(i, 0, row[1:])
+        widths.update(row[1:])
+    widths.apply(sheet)
+
+
+def get_aup_data_excel(aup: str) -> tuple[io.BytesIO, str]:
+    in_memory_file = io.BytesIO()
+
+    book = xlsxwriter.Workbook(in_memory_file, {'constant_memory': True})
+    header_format = book.add_format()
+    header_format.set_bold(True)
+
+    aup_info: AupInfo = AupInfo.query.filter_by(num_aup=aup).first()
+    write_aup_sheets(book, aup_info, header_format)
+
     book.close()
     return in_memory_file, F"{aup_info.num_aup} {aup_info.degree.name_deg} {aup_info.spec.name_spec} {aup_info.form.form}"
 
 
+def get_plans_data_excel(aup_infos: list[AupInfo], long: bool = False) -> BinaryIO:
+    """
+    Выгрузка нескольких планов: пара листов на план (листы "<номер АУП> Лист1/Лист2")
+    или, с long, один лист строк всех планов с колонкой "Номер АУП".
+    Книга пишется в режиме constant_memory во временный файл, возвращается открытый файл
+    (сам файл уже удален), поэтому память воркера не растет с числом планов.
+    """
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        book = xlsxwriter.Workbook(path, {'constant_memory': True})
+        header_format = book.add_format()
+        header_format.set_bold(True)
+
+        if long:
+            sheet = book.add_worksheet("Лист1")
+            widths = ColumnWidths()
+            columns = ['Номер АУП', *AUP_DATA_COLUMNS]
+            sheet.write_row(0, 0, columns, header_format)
+            widths.update(columns)
+            for i, row in enumerate(get_aup_data_rows([el.id_aup for el in aup_infos]), start=1):
+                sheet.write_row(i, 0, row)
+                widths.update(row)
+            widths.apply(sheet)
+        else:
+            for aup_info in aup_infos:
+                write_aup_sheets(book, aup_info, header_format, sheet_prefix=f"{aup_info.num_aup} ")
+
+        book.close()
+        return open(path, 'rb')
+    finally:
+        os.remove(path)
+
+
 def load_and_control(el, load: bool, control: bool):
     '''
     Форматирование нагрузки и контроля
@@ -0,0 +1,123 @@
+"""
+Предпросмотр карты дисциплин в SVG (GET /map/<aup>/preview.svg).
+
+Рисует ту же сетку, что xlsx из print_excel.render_map: шапку, курсы, семестры, шкалу ЗЕТ
+и блоки дисциплин высотой по ЗЕТ с цветом группы. Строится по данным get_map_data
+и раскладке map_layout простой сборкой строк, без библиотек Excel.
+"""
+import textwrap
+from xml.sax.saxutils import escape, quoteattr
+
+from maps.logic.map_layout import THICK, THIN, build_layout, get_text_color, normalize_color
+
+SCALE_WIDTH = 48
+COLUMN_WIDTH = 150
+ROW_HEIGHT = 14  # одна строка сетки - половина ЗЕТ
+HEADER_HEIGHT = 64
+LABEL_HEIGHT = 22
+
+FONT_SIZE = 11
+HEADER_FONT_SIZE = 14
+# средняя ширина символа Arial относительно размера шрифта, для переноса строк
+CHAR_WIDTH = 0.55
+LINE_HEIGHT = 1.2
+PADDING = 4
+
+STROKE_WIDTHS = {THIN: 0.5, THICK: 2}
+
+
+def rect(x, y, width, height, fill="none", stroke="#000000", stroke_width=STROKE_WIDTHS[THIN]) -> str:
+    return (
+        f'<rect x="{x:g}" y="{y:g}" width="{width:g}" height="{height:g}" '
+        f'fill={quoteattr(fill)} stroke={quoteattr(stroke)} stroke-width="{stroke_width:g}"/>'
+    )
+
+
+def line(x1, y1, x2, y2, stroke_width) -> str:
+    return f'<line x1="{x1:g}" y1="{y1:g}" x2="{x2:g}" y2="{y2:g}" stroke="#000000" stroke-width="{stroke_width:g}"/>'
+
+
+def text(x, y, width, height, value, font_size=FONT_SIZE, color="#000000", bold=True) -> str:
+    """
+    Текст по центру прямоугольника с переносом по словам. Строки, не поместившиеся по высоте, отбрасываются.
+    """
+    chars = max(int((width - 2 * PADDING) / (font_size * CHAR_WIDTH)), 1)
+    lines = []
+    for paragraph in str(value).split("\n"):
+        lines.extend(textwrap.wrap(paragraph, chars) or [""])
+    lines = [el for el in lines if el.strip()] or [""]
+    lines = lines[:max(int((height - 2 * PADDING) / (font_size * LINE_HEIGHT)), 1)]
+
+    first_y = y + height / 2 - (len(lines) - 1) * font_size * LINE_HEIGHT / 2
+    tspans = "".join(
+        f'<tspan x="{x + width / 2:g}" y="{first_y + i * font_size * LINE_HEIGHT:g}">{escape(el)}</tspan>'
+        for i, el in enumerate(lines)
+    )
+    weight = ' font-weight="bold"' if bold else ""
+    return (
+        f'<text font-family="Arial" font-size="{font_size}"{weight} fill={quoteattr(color)} '
+        f'text-anchor="middle" dominant-baseline="central">{tspans}</text>'
+    )
+
+
+def render_map_svg(map_data: dict) -> str:
+    layout = build_layout(map_data["items"])
+    columns_count = layout["print_columns"]
+
+    grid_top = HEADER_HEIGHT + 2 * LABEL_HEIGHT
+    grid_height = max(layout["rows"], layout["print_rows"]) * ROW_HEIGHT
+    width = SCALE_WIDTH + columns_count * COLUMN_WIDTH
+    height = grid_top + grid_height
+
+    def column_x(column: int) -> float:
+        return SCALE_WIDTH + column * COLUMN_WIDTH
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}">',
+        f"<title>АУП {escape(map_data['num_aup'])}</title>",
+        rect(0, 0, width, height, fill="#FFFFFF", stroke="none", stroke_width=0),
+        rect(0, 0, width, HEADER_HEIGHT, stroke_width=STROKE_WIDTHS[THICK]),
+        text(0, 0, width, HEADER_HEIGHT, map_data["header"], font_size=HEADER_FONT_SIZE),
+    ]
+
+    # шапка сетки: курсы, семестры и подпись шкалы
+    for first, last, title in layout["courses"]:
+        x = column_x(first)
+        course_width = (last - first + 1) * COLUMN_WIDTH
+        parts.append(rect(x, HEADER_HEIGHT, course_width, LABEL_HEIGHT, stroke_width=STROKE_WIDTHS[THICK]))
+        parts.append(text(x, HEADER_HEIGHT, course_width, LABEL_HEIGHT, title))
+    for column in range(columns_count):
+        y = HEADER_HEIGHT + LABEL_HEIGHT
+        parts.append(rect(column_x(column), y, COLUMN_WIDTH, LABEL_HEIGHT, stroke_width=STROKE_WIDTHS[THICK]))
+        parts.append(text(column_x(column), y, COLUMN_WIDTH, LABEL_HEIGHT, f"{column + 1} семестр"))
+    parts.append(rect(0, HEADER_HEIGHT, SCALE_WIDTH, 2 * LABEL_HEIGHT, stroke_width=STROKE_WIDTHS[THICK]))
+    parts.append(text(0, HEADER_HEIGHT, SCALE_WIDTH, 2 * LABEL_HEIGHT, "З.Е."))
+
+    for row, value in layout["scale"]:
+        y = grid_top + row * ROW_HEIGHT
+        parts.append(rect(0, y, SCALE_WIDTH, 2 * ROW_HEIGHT, stroke_width=STROKE_WIDTHS[THICK]))
+        parts.append(text(0, y, SCALE_WIDTH, 2 * ROW_HEIGHT, value))
+
+    for block in layout["blocks"]:
+        el = block["item"]
+        x, y = column_x(block["column"]), grid_top + block["row"] * ROW_HEIGHT
+        block_height = block["height"] * ROW_HEIGHT
+        color = normalize_color(el["color"])
+        parts.append(
+            f'<g><title>{escape(el["discipline"])}, {block["zet"]:g} з.е.</title>'
+            + rect(x, y, COLUMN_WIDTH, block_height, fill=color)
+            + text(x, y, COLUMN_WIDTH, block_height, el["text"], color=get_text_color(color))
+            + "</g>"
+        )
+
+    # толстый край карты: правый у последнего семестра и нижний по строке last_row
+    if columns_count:
+        right = column_x(columns_count)
+        parts.append(line(right, grid_top, right, grid_top + layout["rows"] * ROW_HEIGHT, STROKE_WIDTHS[THICK]))
+    if layout["last_row"] is not None:
+        bottom = grid_top + (layout["last_row"] + 1) * ROW_HEIGHT
+        parts.append(line(SCALE_WIDTH, bottom, column_x(columns_count), bottom, STROKE_WIDTHS[THICK]))
+
+    parts.append("</svg>")
+    return "".join(parts)
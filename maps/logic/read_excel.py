@@ -1,33 +1,80 @@
+import numpy
 import pandas
-from pandas import DataFrame
+from pandas import DataFrame, Series
+from pandas.api.types import infer_dtype
 from werkzeug.datastructures import FileStorage
 
+# Колонки второго листа, остальные колонки не читаются
+TEXT_COLUMNS = [
+    'Блок',
+    'Шифр',
+    'Часть',
+    'Модуль',
+    'Тип записи',
+    'Дисциплина',
+    'Период контроля',
+    'Нагрузка',
+    'Ед. изм.',
+]
+NUMERIC_COLUMNS = ['Количество', 'ЗЕТ']
+DATA_COLUMNS = TEXT_COLUMNS + NUMERIC_COLUMNS
+
 
 def format_standard(value: str) -> str:
     return 'ФГОС ВО 3++' if value in ['ФГОС3++', 'ФГОС ВО (3++)'] else value
 
 
-def format_cipher(value) -> str:
-    return str(value).replace('Б.', 'Б')
+def format_number(value) -> str:
+    # как pandas.read_excel: целые числа из ячеек Excel (float) пишутся без дробной части
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
 
 
-def read_excel(file: FileStorage) -> tuple[DataFrame, DataFrame]:
-    data = pandas.read_excel(file, sheet_name=None, engine='calamine')
+def to_text(column: Series) -> Series:
+    if infer_dtype(column, skipna=True) in ('string', 'empty'):
+        return column
 
-    header_df = data['Лист1']
-    header_df.loc[7, 'Наименование'] = format_standard(header_df['Наименование'][7])
+    numbers = column.notna() & ~column.map(type).eq(str)
+    return column.mask(numbers, column[numbers].map(format_number))
+
+
+def to_float(column: Series) -> Series:
+    """
+    Числа в выгрузке бывают записаны строкой с десятичной запятой.
+    """
+    return column.astype(str).str.replace(',', '.', regex=False).astype(float)
 
-    data_df = data['Лист2']
 
-    # remove unnamed columns
-    data_df.drop(data_df.columns[data_df.columns.str.contains('unnamed', case=False)], axis=1, inplace=True)
+def read_data_sheet(rows: list[list]) -> DataFrame:
+    """
+    Второй лист выгрузки из строк листа calamine, без разбора pandas.read_excel.
+    Результат совпадает с pandas.read_excel: пустые ячейки - NaN, целые числа в текстовых колонках
+    без дробной части. Отсутствующие колонки не добавляются, их отсутствие сообщает LoadTitlesCheck.
+    """
+    columns = pandas.Index(rows[0])
+    values = numpy.array(rows[1:], dtype=object).reshape(-1, len(columns))
 
-    to_float = lambda x: float(str(x).replace(',', '.'))
+    selected = columns.isin(DATA_COLUMNS) & ~columns.duplicated()
+    values = values[:, selected]
+    values[values == ''] = numpy.nan
+    data_df = DataFrame(values, columns=columns[selected])
 
-    data_df['ЗЕТ'] = data_df['ЗЕТ'].apply(to_float)
-    data_df['Количество'] = data_df['Количество'].apply(to_float)
-    data_df['Шифр'] = data_df['Шифр'].apply(format_cipher)
+    for column in data_df.columns.intersection(TEXT_COLUMNS):
+        data_df[column] = to_text(data_df[column])
+    return data_df
+
+
+def read_excel(file: FileStorage) -> tuple[DataFrame, DataFrame]:
+    with pandas.ExcelFile(file, engine='calamine') as workbook:
+        header_df = workbook.parse('Лист1')
+        data_df = read_data_sheet(workbook.book.get_sheet_by_name('Лист2').to_python())
+
+    header_df.loc[7, 'Наименование'] = format_standard(header_df['Наименование'][7])
 
+    data_df['ЗЕТ'] = to_float(data_df['ЗЕТ'])
+    data_df['Количество'] = to_float(data_df['Количество'])
+    data_df['Шифр'] = data_df['Шифр'].astype(str).str.replace('Б.', 'Б', regex=False)
 
     data_df = data_df.fillna(
         {
@@ -0,0 +1,240 @@
+"""
+Чтение учебного плана из XML 1С (PLX) без промежуточной выгрузки в Excel.
+
+Файл имеет ту же структуру, что пишет upload_xml.py: Документ/План, Титул (шапка плана
+и названия блоков АтрибутыЦикловНов/Цикл), СтрокиПлана/Строка - дисциплины с семестрами Сем.
+Файл разбирается потоково (iterparse), каждый разобранный элемент (строка плана целиком,
+элементы титула, компетенции и т.д.) сразу удаляется из дерева, поэтому память не зависит
+от размера файла.
+
+В PLX нет модулей дисциплин: у всех строк модуль "Без названия", их можно заполнить
+из других планов параметром загрузки checkboxFillNullModulesModel. Часы контроля
+берутся из атрибутов часов (ЧасЭкз), без них строки контроля имеют количество 0,
+как в выгрузке Excel.
+
+Результат - те же header/data, что у read_excel.read_excel: шапка из 15 строк
+Наименование/Содержание и строки нагрузки с колонками второго листа выгрузки.
+"""
+import re
+import xml.etree.ElementTree as et
+
+import numpy
+from pandas import DataFrame
+
+from maps.logic.read_excel import DATA_COLUMNS
+from maps.logic.tools import sems
+
+PLX_EXTENSIONS = (".plx", ".xml")
+
+HEADER_FIELDS = [
+    "Номер АУП",
+    "Вид образования",
+    "Уровень образования",
+    "Направление (специальность)",
+    "Код специальности",
+    "Квалификация",
+    "Профиль (специализация)",
+    "Тип стандарта",
+    "Факультет",
+    "Выпускающая кафедра",
+    "Форма обучения",
+    "Год набора",
+    "Период обучения",
+    "На базе",
+    "Фактический срок обучения",
+]
+
+EDUCATION_TYPES = {
+    "ВПО": "Высшее образование",
+    "СПО": "Среднее профессиональное образование",
+}
+# уровень образования и база поступления по коду уровня в коде специальности (09.03.01)
+EDUCATION_LEVELS = {
+    "03": ("Бакалавриат", "СОО"),
+    "04": ("Магистратура", "ВО"),
+    "05": ("Специалитет", "СОО"),
+}
+STANDARD_TYPES = {
+    "3": "ФГОС ВО 3+",
+    "3.5": "ФГОС ВО 3++",
+}
+PARTS = {
+    "О": "Обязательная часть",
+    "Б": "Обязательная часть",
+    "В": "Часть, формируемая участниками образовательных отношений",
+}
+RECORD_TYPES = {
+    "Б2": "Практика",
+    "Б3": "ГИА",
+    "ФТД": "Факультативная",
+}
+
+# атрибуты семестра (Сем) с часами нагрузки и ID соответствующих элементов VZ
+LOAD_ATTRIBUTES = {
+    "Лек": ("101", "Лекционные занятия"),
+    "Лаб": ("102", "Лабораторные занятия"),
+    "Пр": ("103", "Практические занятия"),
+    "СРС": ("107", "Самостоятельная работа"),
+}
+CONTROL_ATTRIBUTES = {
+    "Экз": "Экзамен",
+    "Зач": "Зачет",
+    "ДифЗач": "Дифференцированный зачет",
+    "КП": "Курсовой проект",
+    "КР": "Курсовая работа",
+}
+# атрибуты Сем с часами контроля
+CONTROL_HOURS_ATTRIBUTES = {
+    "Экз": "ЧасЭкз",
+}
+
+HOURS_IN_ZET = 36
+
+ROW_COLUMNS = ["Шифр", "Дисциплина", "Период контроля", "Нагрузка", "Количество", "Ед. изм.", "ЗЕТ"]
+
+PLAN_NUMBER_RE = re.compile(r"учебный план\s+(\S+)", re.IGNORECASE)
+SPECIALITY_PREFIX_RE = re.compile(
+    r"^(Направление подготовки|Специальность)\s+[\d.]+\s+|^Направленность \(профиль\)\s+"
+)
+
+
+def to_number(value: str | None) -> float:
+    if not value:
+        return 0.0
+    return float(value.replace(",", "."))
+
+
+def read_semester(semester: et.Element) -> list[tuple[str, float, str, float]]:
+    """
+    Строки нагрузки одного семестра: (Нагрузка, Количество, Ед. изм., ЗЕТ).
+    Часы берутся из атрибутов Сем, а если их нет - из вложенных элементов VZ.
+    """
+    hours_by_id = {vz.get("ID"): vz.get("Н") for vz in semester.iter("VZ")}
+
+    rows = []
+    for attribute, (vz_id, load) in LOAD_ATTRIBUTES.items():
+        hours = to_number(semester.get(attribute) or hours_by_id.get(vz_id))
+        if hours:
+            rows.append((load, hours, "Часы", hours / HOURS_IN_ZET))
+
+    for attribute, control in CONTROL_ATTRIBUTES.items():
+        if to_number(semester.get(attribute)):
+            hours = to_number(semester.get(CONTROL_HOURS_ATTRIBUTES.get(attribute)))
+            rows.append((control, hours, "Часы", hours / HOURS_IN_ZET))
+
+    # практики и ГИА задаются трудоемкостью в ЗЕТ без часов
+    zet = to_number(semester.get("ЗЕТ"))
+    if zet and not any(unit == "Часы" and amount for _, amount, unit, _ in rows):
+        rows.append((None, zet, "Зет", zet))
+    return rows
+
+
+def format_block(abbreviation: str, title: str | None) -> str:
+    if not title:
+        return abbreviation
+    if number := re.fullmatch(r"Б\.?(\d+)", abbreviation):
+        return f"Блок {number[1]} «{title}»"
+    return title
+
+
+def get_header(plan: dict, title: dict, specialities: list[str], qualification: dict) -> DataFrame:
+    code = title.get("ПоследнийШифр")
+    level, base = EDUCATION_LEVELS.get((code or "..").split(".")[1], (None, None))
+
+    year = title.get("ГодНачалаПодготовки")
+    duration = qualification.get("СрокОбучения") or ""
+    years = re.match(r"\d+", duration)
+    number = PLAN_NUMBER_RE.search(title.get("ИмяПлана", ""))
+    form = plan.get("ФормаОбучения")
+
+    values = [
+        number[1] if number else None,
+        EDUCATION_TYPES.get(plan.get("УровеньОбразования"), plan.get("УровеньОбразования")),
+        level,
+        specialities[0] if specialities else None,
+        code,
+        qualification.get("Название") or plan.get("ОбразовательнаяПрограмма"),
+        specialities[1] if len(specialities) > 1 else None,
+        STANDARD_TYPES.get(title.get("ТипГОСа"), title.get("ТипГОСа")),
+        title.get("Факультет"),
+        title.get("Кафедра"),
+        form.capitalize() if form else None,
+        year,
+        f"{year} - {int(year) + int(years[0])}" if year and years else None,
+        base,
+        f"{years[0]} г" if years else None,
+    ]
+    return DataFrame(
+        {
+            "Наименование": HEADER_FIELDS,
+            "Содержание": [numpy.nan if el is None else el for el in values],
+        }
+    )
+
+
+def read_row(row: et.Element) -> list[tuple]:
+    shifr = row.get("НовИдДисциплины") or row.get("ИдетификаторДисциплины") or ""
+    discipline = row.get("Дис")
+
+    result = []
+    # семестры - прямые потомки строки (вложенные в Курс элементы Сем нумеруются внутри курса)
+    for semester in row.findall("Сем"):
+        number = int(semester.get("Ном", 0))
+        period = f"{sems[number - 1]} семестр" if 0 < number <= len(sems) else None
+        for load, amount, unit, zet in read_semester(semester):
+            result.append((shifr, discipline, period, load, amount, unit, zet))
+    return result
+
+
+def read_plx(path: str) -> tuple[DataFrame, DataFrame]:
+    plan, title = {}, {}
+    specialities, qualification = [], {}
+    blocks = {}
+    rows = []
+
+    # открытые элементы, чтобы удалять разобранные элементы из родителя
+    stack = []
+    # число открытых строк плана: потомки строки (Сем, VZ) нужны до ее конца
+    open_rows = 0
+    for event, elem in et.iterparse(path, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            if elem.tag == "План":
+                plan = dict(elem.attrib)
+            elif elem.tag == "Строка":
+                open_rows += 1
+            continue
+
+        stack.pop()
+        match elem.tag:
+            case "Титул":
+                title = dict(elem.attrib)
+            case "Специальность":
+                specialities.append(SPECIALITY_PREFIX_RE.sub("", elem.get("Название", "")))
+            case "Квалификация":
+                qualification = dict(elem.attrib)
+            case "Цикл" if elem.get("Аббревиатура"):
+                blocks[elem.get("Аббревиатура")] = elem.get("Название")
+            case "Строка":
+                rows.extend(read_row(elem))
+                open_rows -= 1
+
+        # разобранный элемент удаляется из дерева, кроме потомков еще не разобранной строки
+        if not open_rows:
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+    data = DataFrame(rows, columns=ROW_COLUMNS)
+    data["Шифр"] = data["Шифр"].str.replace("Б.", "Б", regex=False)
+
+    segments = data["Шифр"].str.split(".")
+    abbreviations = segments.str[0]
+    data["Блок"] = abbreviations.map(lambda el: format_block(el, blocks.get(el)))
+    # шифры без буквы части (факультативы ФТД.01) относятся к части, формируемой участниками
+    data["Часть"] = segments.str[1].map(PARTS).fillna(PARTS["В"])
+    data["Модуль"] = "Без названия"
+    data["Тип записи"] = abbreviations.map(RECORD_TYPES).fillna("Дисциплина")
+    data["Нагрузка"] = data["Нагрузка"].fillna(data["Тип записи"])
+
+    return get_header(plan, title, specialities, qualification), data[DATA_COLUMNS]
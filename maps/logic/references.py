@@ -0,0 +1,202 @@
+"""
+Кеш справочников (блоки, дисциплины, модули, группы, ...) вида название -> ID для загрузки выгрузок.
+
+Кеш хранится в памяти процесса. Найденные и созданные записи копятся в session.info и попадают
+в кеш только после коммита транзакции, а при ее откате отбрасываются (при откате SAVEPOINT -
+только найденные внутри него). Слушатели событий подключены только к db.session.
+
+Переименование и удаление записей справочника отмечается увеличением версии в таблице
+reference_version (bump_reference_version), при расхождении версий кеш справочника сбрасывается.
+Версия увеличивается автоматически при flush измененных или удаленных объектов справочника
+и при ORM-запросах UPDATE/DELETE к таблицам справочников, поэтому вызывать ее в местах записи
+не нужно. Изменения в обход db.session (сырой SQL, другие сессии) кеш не сбрасывают.
+"""
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import event, inspect, insert, select, update
+from sqlalchemy.orm import SessionTransaction
+
+from maps.models import (
+    D_Blocks,
+    D_ControlType,
+    D_EdIzmereniya,
+    D_Modules,
+    D_Part,
+    D_Period,
+    D_TypeRecord,
+    Department,
+    Groups,
+    NameOP,
+    ReferenceVersion,
+    SprDegreeEducation,
+    SprDiscipline,
+    SprFaculty,
+    SprFormEducation,
+    db,
+)
+
+# model -> (колонка с названием, колонка с ID)
+REFERENCES = {
+    D_Blocks: ("title", "id"),
+    D_Part: ("title", "id"),
+    D_TypeRecord: ("title", "id"),
+    D_Period: ("title", "id"),
+    D_ControlType: ("title", "id"),
+    D_EdIzmereniya: ("title", "id"),
+    D_Modules: ("title", "id"),
+    SprDiscipline: ("title", "id"),
+    Groups: ("name_group", "id_group"),
+    SprFaculty: ("name_faculty", "id_faculty"),
+    Department: ("name_department", "id_department"),
+    NameOP: ("name_spec", "id_spec"),
+    SprDegreeEducation: ("name_deg", "id_degree"),
+    SprFormEducation: ("form", "id_form"),
+}
+
+PENDING_KEY = "reference_pending"
+
+_cache: dict[str, dict[str, int]] = {}
+_versions: dict[str, int] = {}
+# состояние найденных в транзакции записей на начало каждого SAVEPOINT
+_savepoints: "WeakKeyDictionary[SessionTransaction, dict]" = WeakKeyDictionary()
+
+
+def get_pending(session) -> dict[str, dict[str, int]]:
+    """
+    Найденные и созданные в текущей транзакции записи: справочник -> название -> ID.
+    """
+    return session.info.setdefault(PENDING_KEY, {})
+
+
+def refresh_versions() -> None:
+    """
+    Сверяет версии справочников с БД (один запрос) и сбрасывает кеш изменившихся справочников.
+    Вызывается в начале загрузки файла.
+    """
+    versions = dict(db.session.execute(select(ReferenceVersion.name, ReferenceVersion.version)).all())
+
+    for name in list(_cache):
+        if versions.get(name, 0) != _versions.get(name, 0):
+            _cache.pop(name)
+    _versions.clear()
+    _versions.update(versions)
+
+
+def bump_reference_version(model) -> None:
+    """
+    Отмечает, что записи справочника были переименованы или удалены.
+    Изменение фиксируется вместе с транзакцией вызывающего кода. Для изменений через db.session
+    вызывается из событий сессии, вручную - только для записи в обход ORM.
+    """
+    name = model.__tablename__
+    updated = db.session.execute(
+        update(ReferenceVersion)
+        .where(ReferenceVersion.name == name)
+        .values(version=ReferenceVersion.version + 1)
+    ).rowcount
+    if not updated:
+        db.session.add(ReferenceVersion(name=name, version=1))
+    _cache.pop(name, None)
+
+
+def select_ids(model, titles) -> dict[str, int]:
+    title_column, id_column = REFERENCES[model]
+    title_column = getattr(model, title_column)
+    id_column = getattr(model, id_column)
+
+    rows = db.session.execute(
+        select(title_column, id_column)
+        .where(title_column.in_(titles))
+        .order_by(id_column)
+    ).all()
+    # при дублях названий берется запись с наибольшим ID
+    return {title: id for title, id in rows}
+
+
+def resolve(model, values, create: bool = True, **defaults) -> dict[str, int]:
+    """
+    Возвращает словарь название -> ID для значений values. Если create истина,
+    отсутствующие в справочнике названия добавляются (defaults - значения остальных колонок).
+    В БД уходят только названия, которых нет в кеше процесса.
+    """
+    name = model.__tablename__
+    cache = _cache.get(name, {})
+    pending = get_pending(db.session).setdefault(name, {})
+
+    result = {}
+    unseen = set()
+    for value in set(values):
+        if value in cache:
+            result[value] = cache[value]
+        elif value in pending:
+            result[value] = pending[value]
+        else:
+            unseen.add(value)
+
+    if not unseen:
+        return result
+
+    found = select_ids(model, unseen)
+    pending.update(found)
+    result.update(found)
+
+    missing = unseen - found.keys()
+    if not missing or not create:
+        return result
+
+    title_column, _ = REFERENCES[model]
+    db.session.execute(
+        insert(model),
+        [{title_column: title, **defaults} for title in missing],
+    )
+    created = select_ids(model, missing)
+    pending.update(created)
+    result.update(created)
+    return result
+
+
+def remember(model, title: str, id: int) -> None:
+    """
+    Добавляет в кеш запись справочника, созданную вне resolve (до коммита транзакции).
+    """
+    get_pending(db.session).setdefault(model.__tablename__, {})[title] = id
+
+
+def is_title_changed(instance) -> bool:
+    title_column, _ = REFERENCES[type(instance)]
+    return inspect(instance).attrs[title_column].history.has_changes()
+
+
+@event.listens_for(db.session, "before_flush")
+def _bump_changed(session, flush_context, instances) -> None:
+    changed = {type(el) for el in session.deleted if type(el) in REFERENCES}
+    changed.update(type(el) for el in session.dirty if type(el) in REFERENCES and is_title_changed(el))
+    for model in changed:
+        bump_reference_version(model)
+
+
+@event.listens_for(db.session, "do_orm_execute")
+def _bump_bulk_changed(orm_execute_state) -> None:
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in REFERENCES:
+        bump_reference_version(mapper.class_)
+
+
+@event.listens_for(db.session, "after_commit")
+def _commit_pending(session) -> None:
+    for name, titles in session.info.pop(PENDING_KEY, {}).items():
+        _cache.setdefault(name, {}).update(titles)
+
+
+@event.listens_for(db.session, "after_transaction_create")
+def _save_pending(session, transaction) -> None:
+    if transaction.nested:
+        _savepoints[transaction] = {name: dict(titles) for name, titles in get_pending(session).items()}
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def _drop_pending(session, previous_transaction) -> None:
+    saved = _savepoints.pop(previous_transaction, None)
+    session.info[PENDING_KEY] = saved if saved is not None else {}
@@ -0,0 +1,188 @@
+import hashlib
+
+from sqlalchemy import select
+
+from app import cache
+from maps.logic.tools import check_skiplist
+from maps.logic.validation_rules import (
+    get_total_zet_norm,
+    integrity_error,
+    integrity_error_line,
+    is_integer_zet,
+    is_total_zet_valid,
+    measure_to_zet,
+    total_zet_error,
+)
+from maps.models import (
+    AupData,
+    AupInfo,
+    D_Blocks,
+    D_EdIzmereniya,
+    D_Period,
+    D_TypeRecord,
+    db,
+)
+
+PLAN_TOTALS_TIMEOUT = 24 * 3600
+
+
+def get_plan_version(aup_info: AupInfo) -> str:
+    """
+    Версия плана для проверки актуальности кеша: хеш всех полей записей AupData, из которых
+    считаются суммы, и кода направления, по которому берется норма ЗЕТ. Меняется при любой правке
+    (редактор, загрузка с объединением, откат ревизии, правка шапки) в любом процессе. Один узкий
+    запрос без загрузки объектов, заметно дешевле пересчета сумм.
+    """
+    rows = db.session.execute(
+        select(
+            AupData.id,
+            AupData.id_discipline,
+            AupData._discipline,
+            AupData.id_period,
+            AupData.id_block,
+            AupData.id_type_record,
+            AupData.id_edizm,
+            AupData.amount,
+            AupData.zet,
+        )
+        .where(AupData.id_aup == aup_info.id_aup)
+        .order_by(AupData.id)
+    ).all()
+
+    digest = hashlib.sha256(repr(aup_info.spec.program_code).encode())
+    digest.update(repr([tuple(row) for row in rows]).encode())
+    return digest.hexdigest()
+
+
+def get_titles(model) -> dict[int, str]:
+    return {el.id: el.title for el in model.query.all()}
+
+
+class SaveChecker:
+    """
+    Проверка ЗЕТ плана при сохранении из веб-редактора.
+
+    Для плана в кеше хранятся суммы ЗЕТ по (дисциплина, период) и суммы количества по единицам
+    измерения. При сохранении суммы обновляются только по измененным записям, и перепроверяются
+    только затронутые группы (дисциплина, период). Кеш сверяется с get_plan_version, поэтому
+    правки плана не через SaveChecker приводят к полному пересчету.
+    """
+
+    def __init__(self, aup_info: AupInfo):
+        self.aup_info = aup_info
+        self.affected = {}
+        self.totals = self.load_totals()
+
+    @property
+    def cache_key(self) -> str:
+        return f"plan_totals:{self.aup_info.id_aup}"
+
+    def load_totals(self) -> dict:
+        version = get_plan_version(self.aup_info)
+        totals = cache.get(self.cache_key)
+        if totals and totals["version"] == version:
+            return totals
+
+        totals = {
+            "version": version,
+            "norm": get_total_zet_norm(self.aup_info.spec.program_code),
+            "refs": {
+                "blocks": get_titles(D_Blocks),
+                "periods": get_titles(D_Period),
+                "type_records": get_titles(D_TypeRecord),
+                "measures": get_titles(D_EdIzmereniya),
+            },
+            "groups": {},
+            "titles": {},
+            "units": {},
+        }
+        self.totals = totals
+        for el in self.aup_info.aup_data:
+            self.apply(totals, self.contribution(el), 1)
+        return totals
+
+    def contribution(self, el: AupData | None) -> tuple | None:
+        """
+        Вклад записи AupData в суммы плана. Для записей из skiplist возвращает None.
+        Суммы хранятся в сотых, как в самой таблице aup_data, чтобы не накапливать погрешность.
+        """
+        refs = self.totals["refs"]
+        if el is None or not check_skiplist(
+            el.amount,
+            el._discipline or "",
+            refs["type_records"].get(el.id_type_record, ""),
+            refs["blocks"].get(el.id_block, ""),
+        ):
+            return None
+
+        return (
+            (el.id_discipline, el.id_period),
+            el._discipline,
+            el.zet or 0,
+            el.id_edizm,
+            el.amount or 0,
+        )
+
+    @staticmethod
+    def apply(totals: dict, contribution: tuple | None, sign: int) -> None:
+        if contribution is None:
+            return
+
+        key, title, zet, id_edizm, amount = contribution
+        totals["groups"][key] = totals["groups"].get(key, 0) + sign * zet
+        totals["titles"][key[0]] = title
+        totals["units"][id_edizm] = totals["units"].get(id_edizm, 0) + sign * amount
+
+    def track(self, before: tuple | None, after: AupData | None) -> None:
+        """
+        Учитывает изменение записи: before - вклад записи до изменения (contribution),
+        after - запись после изменения или None, если запись удалена.
+        """
+        after = self.contribution(after)
+        if before == after:
+            return
+
+        for contribution, sign in ((before, -1), (after, 1)):
+            self.apply(self.totals, contribution, sign)
+            if contribution is not None:
+                self.affected[contribution[0]] = True
+
+    def get_total_zet(self) -> float:
+        measures = self.totals["refs"]["measures"]
+        return sum(
+            amount / 100 * measure_to_zet.get(measures.get(id_edizm), 0)
+            for id_edizm, amount in self.totals["units"].items()
+        )
+
+    def get_warnings(self) -> list[dict]:
+        warnings = []
+
+        errors = []
+        for key in self.affected:
+            zet = self.totals["groups"].get(key, 0) / 100
+            if not is_integer_zet(zet):
+                id_discipline, id_period = key
+                errors.append(
+                    integrity_error_line(
+                        self.totals["refs"]["periods"].get(id_period, id_period),
+                        self.totals["titles"].get(id_discipline),
+                        zet,
+                    )
+                )
+        if errors:
+            warnings.append(integrity_error(errors))
+
+        norm = self.totals["norm"]
+        total = round(self.get_total_zet(), 2)
+        if norm is not None and not is_total_zet_valid(total, norm):
+            warnings.append(total_zet_error(total, norm))
+
+        return warnings
+
+    def save(self) -> list[dict]:
+        """
+        Вызывается после коммита изменений: сохраняет суммы в кеш и возвращает предупреждения.
+        """
+        self.totals["version"] = get_plan_version(self.aup_info)
+        cache.set(self.cache_key, self.totals, timeout=PLAN_TOTALS_TIMEOUT)
+        return self.get_warnings()
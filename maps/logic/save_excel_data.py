@@ -1,11 +1,34 @@
+from collections import Counter
+import hashlib
 from datetime import datetime
 
+import numpy
 import pandas
 from pandas import DataFrame
+from sqlalchemy import insert, or_, select, update
 
+import config
 from maps.logic.excel_check import ExcelValidator
-from maps.logic.read_excel import read_excel
+from maps.logic.excel_pool import (
+    hash_file,
+    parse_excel_files,
+    remove_files,
+    spool_files,
+)
+from maps.logic.module_stats import (
+    get_discipline_module_mapper,
+    get_plan_module_counts,
+    update_module_stats,
+)
+from maps.logic.references import refresh_versions, remember, resolve
+from maps.logic.save_into_bd import create_changes_revision
 from maps.logic.tools import timeit
+from maps.logic.upload_tokens import (
+    claim_parsed_token,
+    release_claimed_token,
+    remove_claimed_token,
+    save_parsed_token,
+)
 from utils.logging import logger
 
 from maps.models import (
@@ -24,144 +47,420 @@ from maps.models import (
     SprOKCO,
     AupData,
     AupInfo,
+    ChangeLog,
     Groups,
     Department,
     NameOP,
 )
 
+FILE_VALID = "valid"
+FILE_SAVED = "saved"
+FILE_INVALID = "invalid"
+FILE_UNCHANGED = "unchanged"
+FILE_FAILED = "failed"
+
+# Ключ сопоставления записей выгрузки и БД при слиянии
+MERGE_KEY = ["id_discipline", "id_period", "id_type_control", "id_edizm"]
+# Поля, которые обновляются у сопоставленных записей
+# (модуль, группа и порядок строк в семестре num_row правятся вручную в редакторе карты)
+MERGE_UPDATE_COLUMNS = [
+    "id_block",
+    "shifr",
+    "id_part",
+    "id_type_record",
+    "_discipline",
+    "amount",
+    "zet",
+]
+MERGE_COLUMNS = [*MERGE_KEY, *MERGE_UPDATE_COLUMNS, "num_row", "id_module", "id_group"]
+MERGE_AUP_INFO_SKIP = {"id_aup", "is_delete", "date_delete"}
+# Параметры загрузки, от которых зависит записанный план: входят в хеши file_hash и data_hash
+HASH_OPTIONS = ["checkboxMergeModel", "checkboxFillNullModulesModel"]
+
 
 @timeit
-def save_excel_files(files, options):
+def save_excel_files(files, options, user_id: int | None = None):
     files = files.getlist("file")
-    logger.info(f"prcessing {len(files)} files...")
+
+    paths = spool_files(files)
+    try:
+        return save_excel_paths([file.filename for file in files], paths, options, user_id)
+    finally:
+        remove_files(paths)
+
+
+def save_excel_paths(
+    filenames: list[str],
+    paths: list[str],
+    options: dict,
+    user_id: int | None = None,
+    file_hashes: list[str] | None = None,
+) -> list[dict]:
+    """
+    Загрузка файлов, уже сохраненных на диск (POST /upload, загрузка по частям).
+    Файлы записываются пачками по UPLOAD_COMMIT_BATCH_SIZE (см. save_parsed_files).
+    """
+    logger.info(f"prcessing {len(paths)} files...")
+
+    # Разбор и проверка файлов идут параллельно в пуле процессов,
+    # запись в БД - последовательно в процессе запроса.
+    parsed_files = parse_new_files(paths, options, file_hashes)
+
     all_files_check_result = []
-    for file in files:
-        logger.info(f"processing file: {file.filename}")
+    batch_size = config.UPLOAD_COMMIT_BATCH_SIZE
+    for i in range(0, len(paths), batch_size):
+        all_files_check_result.extend(
+            save_parsed_files(
+                filenames[i:i + batch_size],
+                parsed_files[i:i + batch_size],
+                options,
+                user_id,
+            )
+        )
+
+    logger.debug("all aups has been processed")
+    return all_files_check_result
+
+
+def save_parsed_files(
+    filenames: list[str],
+    parsed_files: list[dict],
+    options: dict,
+    user_id: int | None = None,
+) -> list[dict]:
+    """
+    Записывает файлы одной транзакцией, каждый файл - в своем SAVEPOINT.
+    Статус файла в ответе:
+      saved     - записан;
+      unchanged - совпадает с уже загруженным планом, не записывался;
+      invalid   - не прошел проверки, не записывался;
+      failed    - ошибка при записи, откатан только этот файл.
+    Если не удалась фиксация всей транзакции, записанные файлы пачки получают статус failed.
+    """
+    results = []
+    for filename, parsed in zip(filenames, parsed_files):
+        logger.info(f"processing file: {filename}")
         try:
-            header, data = read_excel(file)
+            with db.session.begin_nested():
+                res = save_parsed_file(filename, parsed, options, user_id, commit=False)
         except Exception as e:
-            res = {
-                "aup": "-",
-                "filename": file.filename,
-                "errors": [{"message": "Некорректная структура выгрузки."}],
-            }
-            all_files_check_result.append(res)
-            logger.warning(f"Structure error in excel file: {res['errors']}")
-            continue
+            logger.error(f"{filename}: failed to save: {e}")
+            res = failed_result(filename, parsed, e)
+        results.append(res)
+
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"failed to commit {len(filenames)} files: {e}")
+        for i, res in enumerate(results):
+            if res["status"] == FILE_SAVED:
+                results[i] = failed_result(res["filename"], parsed_files[i], e)
+    return results
+
+
+def failed_result(filename: str, parsed: dict, error: Exception) -> dict:
+    aup = "-"
+    if parsed.get("header") is not None:
+        aup = parsed["header"]["Содержание"][0]
+        aup = aup if not pandas.isna(aup) else "-"
+    return {
+        "aup": aup,
+        "filename": filename,
+        "status": FILE_FAILED,
+        "errors": [{"message": f"Ошибка при записи в БД: {error}"}],
+    }
+
+
+@timeit
+def validate_excel_files(files, options) -> list[dict]:
+    """
+    Разбор и проверка файлов без обращения к БД. Для корректных файлов возвращается токен:
+    POST /upload/commit/<token> записывает выгрузку в БД без повторного разбора.
+    """
+    files = files.getlist("file")
+    logger.info(f"validating {len(files)} files...")
+
+    paths = spool_files(files)
+    try:
+        file_hashes = [hash_file(path) for path in paths]
+        parsed_files = parse_excel_files(paths, options)
+    finally:
+        remove_files(paths)
 
-        aup = header["Содержание"][0]
+    results = []
+    for file, file_hash, parsed in zip(files, file_hashes, parsed_files):
+        aup = "-"
+        if parsed["header"] is not None:
+            aup = parsed["header"]["Содержание"][0]
+            aup = aup if not pandas.isna(aup) else "-"
 
         res = {
-            "aup": aup if not pandas.isna(aup) else "-",
+            "aup": aup,
             "filename": file.filename,
-            "errors": ExcelValidator.validate(options, header, data),
+            "status": FILE_INVALID if parsed["errors"] else FILE_VALID,
+            "errors": parsed["errors"],
         }
-        all_files_check_result.append(res)
+        if not parsed["errors"]:
+            res["token"] = save_parsed_token(
+                file.filename, {**parsed, "file_hash": file_hash}, options
+            )
+        results.append(res)
 
-        if res["errors"]:
-            logger.warning(f"Validation errors in file: {res['errors']}")
-            continue
-        else: 
-            logger.info('Excel file is valid')
-
-        save_excel_data(
-            file.filename,
-            header,
-            data,
-            use_other_modules=options.get("checkboxFillNullModulesModel", False),
+    return results
+
+
+def commit_parsed_token(token: str, user_id: int | None = None) -> dict | None:
+    """
+    Записывает в БД выгрузку, разобранную validate_excel_files. None - токен не найден, истек
+    или уже использован. Если запись не удалась, токен можно использовать повторно.
+    """
+    if not (claimed := claim_parsed_token(token)):
+        return None
+
+    saved, claimed_path = claimed
+    try:
+        res = save_parsed_file(saved["filename"], saved["parsed"], saved["options"], user_id)
+    except Exception:
+        db.session.rollback()
+        release_claimed_token(claimed_path)
+        raise
+    remove_claimed_token(claimed_path)
+    return res
+
+
+def get_upload_hash(content_hash: str | None, options: dict) -> str | None:
+    """
+    Хеш файла или данных выгрузки вместе с параметрами загрузки из HASH_OPTIONS:
+    файл, загруженный с другими параметрами, не считается уже загруженным.
+    Без таких параметров совпадает с хешем содержимого.
+    """
+    enabled = [option for option in HASH_OPTIONS if options.get(option, False)]
+    if content_hash is None or not enabled:
+        return content_hash
+    return hashlib.sha256(f"{content_hash}:{','.join(enabled)}".encode()).hexdigest()
+
+
+def get_unchanged_aups(column, hashes: list[str]) -> dict[str, str]:
+    """
+    Номера АУП сохраненных (не удаленных) планов с хешем из hashes: хеш -> num_aup.
+    """
+    rows = db.session.execute(
+        select(column, AupInfo.num_aup).where(
+            column.in_(hashes),
+            or_(AupInfo.is_delete.is_(None), AupInfo.is_delete.is_(False)),
         )
-    logger.debug("all aups has been processed")
-    return all_files_check_result
+    ).all()
+    return dict(rows)
+
+
+def parse_new_files(
+    paths: list[str], options: dict, file_hashes: list[str] | None = None
+) -> list[dict]:
+    """
+    parse_excel_files, который не разбирает файлы, побайтно совпадающие с уже загруженными
+    с теми же параметрами (get_upload_hash): для них возвращается {"unchanged": num_aup}.
+    """
+    if file_hashes is None:
+        file_hashes = [hash_file(path) for path in paths]
+    upload_hashes = [get_upload_hash(file_hash, options) for file_hash in file_hashes]
+    unchanged = get_unchanged_aups(AupInfo.file_hash, upload_hashes)
+
+    to_parse = [
+        path
+        for path, upload_hash in zip(paths, upload_hashes)
+        if upload_hash not in unchanged
+    ]
+    parsed_files = iter(parse_excel_files(to_parse, options))
+
+    results = []
+    for file_hash, upload_hash in zip(file_hashes, upload_hashes):
+        if upload_hash in unchanged:
+            results.append({"unchanged": unchanged[upload_hash], "timings": {}})
+        else:
+            results.append({**next(parsed_files), "file_hash": file_hash})
+    return results
+
+
+def save_parsed_file(
+    filename: str,
+    parsed: dict,
+    options: dict,
+    user_id: int | None = None,
+    commit: bool = True,
+) -> dict:
+    """
+    Проверки с БД и запись в БД одного файла, разобранного parse_new_files.
+    Возвращает результат проверки файла для ответа /upload.
+    Если commit ложно, транзакцию завершает вызывающий код (save_excel_data).
+    """
+    if "unchanged" in parsed:
+        logger.info(f"{filename}: file is identical to saved AUP {parsed['unchanged']}")
+        return unchanged_result(filename, parsed["unchanged"])
+
+    if parsed["header"] is None:
+        res = {
+            "aup": "-",
+            "filename": filename,
+            "status": FILE_INVALID,
+            "errors": parsed["errors"],
+        }
+        logger.warning(f"Structure error in excel file: {res['errors']}")
+        return res
+
+    header, data = parsed["header"], parsed["data"]
+    aup = header["Содержание"][0]
+
+    data_hash = get_upload_hash(parsed["data_hash"], options)
+    if unchanged := get_unchanged_aups(AupInfo.data_hash, [data_hash]):
+        logger.info(f"{filename}: data is identical to saved AUP {aup}")
+        return unchanged_result(filename, unchanged[data_hash])
+
+    errors = parsed["errors"]
+    if parsed["complete"]:
+        errors += ExcelValidator.validate_db(options, header, data)
+
+    res = {
+        "aup": aup if not pandas.isna(aup) else "-",
+        "filename": filename,
+        "status": FILE_SAVED,
+        "errors": errors,
+    }
+
+    if res["errors"]:
+        logger.warning(f"Validation errors in file: {res['errors']}")
+        res["status"] = FILE_INVALID
+        return res
+    else: 
+        logger.info('Excel file is valid')
+
+    save_excel_data(
+        filename,
+        header,
+        data,
+        use_other_modules=options.get("checkboxFillNullModulesModel", False),
+        merge=options.get("checkboxMergeModel", False),
+        user_id=user_id,
+        file_hash=get_upload_hash(parsed["file_hash"], options),
+        data_hash=data_hash,
+        commit=commit,
+    )
+    return res
+
+
+def unchanged_result(filename: str, aup: str) -> dict:
+    return {
+        "aup": aup,
+        "filename": filename,
+        "status": FILE_UNCHANGED,
+        "errors": [],
+    }
 
 
 @timeit
 def save_excel_data(
-    filename, header: DataFrame, data: DataFrame, use_other_modules: bool = True
+    filename,
+    header: DataFrame,
+    data: DataFrame,
+    use_other_modules: bool = True,
+    merge: bool = False,
+    user_id: int | None = None,
+    file_hash: str | None = None,
+    data_hash: str | None = None,
+    commit: bool = True,
 ):
-    logger.debug("saving excel file: {filename}")
+    """
+    Записывает выгрузку в БД и фиксирует транзакцию. Если commit ложно, транзакцию
+    (или SAVEPOINT вокруг вызова) фиксирует или откатывает вызывающий код.
+    """
+    logger.debug(f"saving excel file: {filename}")
     header = header.set_index("Наименование")["Содержание"].to_dict()
     groups = None
     try:
-        if aup_info := AupInfo.query.filter_by(num_aup=header["Номер АУП"]).first():
-            groups = {el.discipline.title: el for el in aup_info.aup_data}
-            db.session.query(AupData).filter(AupData.id_aup == aup_info.id_aup).delete()
-            db.session.delete(aup_info)
-
-        aup_info = save_aup_info(filename, header)
-        db.session.add(aup_info)
-        db.session.flush()
-        aup_data = save_aup_data(
-            data, aup_info, saved_groups=groups, use_other_modules=use_other_modules
-        )
-        db.session.bulk_save_objects(aup_data)
+        refresh_versions()
+        aup_info = AupInfo.query.filter_by(num_aup=header["Номер АУП"]).first()
+        if aup_info and merge:
+            module_counts = get_plan_module_counts(aup_info.id_aup)
+            merge_aup_info(
+                aup_info, save_aup_info(filename, header, file_hash, data_hash)
+            )
+            merge_aup_data(filename, aup_info, data, use_other_modules, user_id)
+            update_module_stats(module_counts, get_plan_module_counts(aup_info.id_aup))
+        else:
+            if aup_info:
+                update_module_stats(get_plan_module_counts(aup_info.id_aup), Counter())
+                groups = {el.discipline.title: el.id_group for el in aup_info.aup_data}
+                db.session.query(AupData).filter(AupData.id_aup == aup_info.id_aup).delete()
+                db.session.delete(aup_info)
+                # справочники могут разрешиться из кеша без запросов (и без autoflush),
+                # поэтому удаление старого плана отправляется в БД до вставки нового
+                db.session.flush()
+
+            aup_info = save_aup_info(filename, header, file_hash, data_hash)
+            db.session.add(aup_info)
+            db.session.flush()
+            aup_data = save_aup_data(
+                data, aup_info, saved_groups=groups, use_other_modules=use_other_modules
+            )
+            db.session.execute(insert(AupData), aup_data.to_dict("records"))
+            update_module_stats(Counter(), get_plan_module_counts(aup_info.id_aup))
+
+        if commit:
+            db.session.commit()
     except Exception as e:
-        db.session.rollback()
+        if commit:
+            db.session.rollback()
         logger.error(e)
         raise e
 
-    finally:
-        logger.debug("excel file succesfully saved.")
-        db.session.commit()
+    logger.debug("excel file succesfully saved.")
 
 
 @timeit
-def save_aup_info(filename: str, header: DataFrame) -> AupInfo:
-    if not (
-        faculty := SprFaculty.query.filter_by(name_faculty=header["Факультет"]).first()
-    ):
-        faculty = SprFaculty(name_faculty=header["Факультет"], id_branch=1)
-        db.session.add(faculty)
-
-    if not (
-        department := Department.query.filter_by(
-            name_department=header["Выпускающая кафедра"]
-        ).first()
-    ):
-        department = Department(name_department=header["Выпускающая кафедра"])
-        db.session.add(department)
-
-    if not (
-        name_op := NameOP.query.filter_by(
-            name_spec=header["Профиль (специализация)"]
-        ).first()
-    ):
-        name_op = create_name_op(header)
-        db.session.add(name_op)
-
-    if not (
-        id_degree := SprDegreeEducation.query.filter_by(
-            name_deg=header["Уровень образования"]
-        ).first()
-    ):
-        id_degree = SprDegreeEducation(name_deg=header["Уровень образования"])
-        db.session.add(id_degree)
+def save_aup_info(
+    filename: str,
+    header: DataFrame,
+    file_hash: str | None = None,
+    data_hash: str | None = None,
+) -> AupInfo:
+    id_faculty = resolve(SprFaculty, [header["Факультет"]], id_branch=1)
+    id_department = resolve(Department, [header["Выпускающая кафедра"]])
+    id_degree = resolve(SprDegreeEducation, [header["Уровень образования"]])
+    id_form = resolve(SprFormEducation, [header["Форма обучения"]], create=False)
+
+    name_op = header["Профиль (специализация)"]
+    if not (id_spec := resolve(NameOP, [name_op], create=False)):
+        instance = create_name_op(header)
+        db.session.add(instance)
         db.session.flush()
-    id_degree = id_degree.id_degree
+        remember(NameOP, name_op, instance.id_spec)
+        id_spec = {name_op: instance.id_spec}
 
     years, months = get_education_duration(header["Фактический срок обучения"])
     begin, end = header["Период обучения"].split(" - ")
     is_actual = datetime.today().year < int(end)
-    form = SprFormEducation.query.filter_by(form=header["Форма обучения"]).first()
 
     aup = AupInfo(
         file=filename,
         num_aup=header["Номер АУП"],
         base=header["На базе"],
-        id_faculty=faculty.id_faculty,
+        id_faculty=id_faculty[header["Факультет"]],
         id_rop=1,
         type_educ=header["Вид образования"],
         qualification=header["Квалификация"],
         type_standard=header["Тип стандарта"],
-        id_department=department.id_department,
+        id_department=id_department[header["Выпускающая кафедра"]],
         period_educ=header["Период обучения"],
-        id_degree=id_degree,
-        id_form=form.id_form,
+        id_degree=id_degree[header["Уровень образования"]],
+        id_form=id_form[header["Форма обучения"]],
         years=years,
         months=months,
-        id_spec=name_op.id_spec,
+        id_spec=id_spec[name_op],
         year_beg=begin,
         year_end=end,
         is_actual=is_actual,
+        file_hash=file_hash,
+        data_hash=data_hash,
     )
 
     return aup
@@ -171,70 +470,180 @@ def save_aup_info(filename: str, header: DataFrame) -> AupInfo:
 def save_aup_data(
     data: DataFrame,
     aup_info: AupInfo,
-    saved_groups: dict | None = None,
+    saved_groups: dict[str, int] | None = None,
     use_other_modules: bool = False,
-) -> list[AupData]:
-    get_group_from_module = (
-        lambda module: module[8:-1].strip() if "Модуль" in module else module
-    )
-
-    blocks = fill_spr_from_aup_data_values(data["Блок"], D_Blocks)
-    parts = fill_spr_from_aup_data_values(data["Часть"], D_Part)
-    record_types = fill_spr_from_aup_data_values(data["Тип записи"], D_TypeRecord)
-    disciplines = fill_spr_from_aup_data_values(data["Дисциплина"], SprDiscipline)
-    periods = fill_spr_from_aup_data_values(data["Период контроля"], D_Period)
-    control_types = fill_spr_from_aup_data_values(data["Нагрузка"], D_ControlType)
-    measures = fill_spr_from_aup_data_values(data["Ед. изм."], D_EdIzmereniya)
-
-    modules_mapping = {}
+) -> DataFrame:
+    """
+    Формирует записи AupData (колонки таблицы aup_data) для вставки одним insert(AupData).
+    Все колонки выгрузки переводятся в ID справочников целиком (Series.map), без цикла по строкам.
+    """
+    blocks = resolve(D_Blocks, data["Блок"].unique())
+    parts = resolve(D_Part, data["Часть"].unique())
+    record_types = resolve(D_TypeRecord, data["Тип записи"].unique())
+    disciplines = resolve(SprDiscipline, data["Дисциплина"].unique())
+    periods = resolve(D_Period, data["Период контроля"].unique())
+    control_types = resolve(D_ControlType, data["Нагрузка"].unique())
+    measures = resolve(D_EdIzmereniya, data["Ед. изм."].unique())
+
+    id_disciplines = data["Дисциплина"].map(disciplines)
+
+    module_titles = data["Модуль"]
     if use_other_modules:
-        modules_mapping = get_discipline_module_mapper()
+        unnamed = module_titles == "Без названия"
+        modules_mapping = get_discipline_module_mapper(
+            id_disciplines[unnamed].unique().tolist()
+        )
+        module_titles = module_titles.mask(
+            unnamed,
+            id_disciplines.map(modules_mapping).fillna(module_titles),
+        )
 
-    modules = fill_spr_from_aup_data_values(data["Модуль"], D_Modules, color="#5f60ec")
+    modules = resolve(D_Modules, module_titles.unique(), color="#5f60ec")
 
     # Extract a string between double quotes in module title
-    group_names = [get_group_from_module(el) for el in data["Модуль"]]
+    group_names = module_titles.str.slice(8, -1).str.strip().where(
+        module_titles.str.contains("Модуль", regex=False), module_titles
+    )
+    groups = resolve(Groups, group_names.unique(), color="#5f60ec")
+
+    id_groups = group_names.map(groups)
+    if saved_groups:
+        id_groups = data["Дисциплина"].map(saved_groups).fillna(id_groups)
 
-    groups = fill_groups_from_aup_data_values(group_names)
     num_rows = get_num_rows(data)
 
     db.session.flush()
-    instances = []
-    for _, row in data.iterrows():
-        id_discipline = disciplines[row["Дисциплина"]].id
-
-        module = modules[row["Модуль"]]
-        if module.title == "Без названия" and use_other_modules:
-            row["Модуль"] = modules_mapping.get(id_discipline, row["Модуль"])
-            module = modules[row["Модуль"]]
-
-        group_title = get_group_from_module(row["Модуль"])
-        group = (
-            saved_groups[row["Дисциплина"]]
-            if saved_groups and row["Дисциплина"] in saved_groups
-            else groups[group_title]
-        )
+    records = DataFrame(
+        {
+            "id_aup": aup_info.id_aup,
+            "id_block": data["Блок"].map(blocks),
+            "shifr": data["Шифр"],
+            "id_part": data["Часть"].map(parts),
+            "id_module": module_titles.map(modules),
+            "id_group": id_groups.astype(int),
+            "id_type_record": data["Тип записи"].map(record_types),
+            "id_discipline": id_disciplines,
+            "_discipline": data["Дисциплина"],
+            "id_period": data["Период контроля"].map(periods),
+            "num_row": num_rows,
+            "id_type_control": data["Нагрузка"].map(control_types),
+            "amount": (data["Количество"] * 100).astype(int),
+            "id_edizm": data["Ед. изм."].map(measures),
+            "zet": (data["ЗЕТ"] * 100).astype(int),
+        }
+    )
+
+    return records
+
+
+def merge_aup_info(aup_info: AupInfo, new_info: AupInfo) -> None:
+    """
+    Переносит в существующий план поля шапки новой выгрузки, сохраняя id_aup.
+    """
+    for column in AupInfo.__table__.columns:
+        if column.key in MERGE_AUP_INFO_SKIP:
+            continue
+        value = getattr(new_info, column.key)
+        if getattr(aup_info, column.key) != value:
+            setattr(aup_info, column.key, value)
+
+
+def get_stored_aup_data(id_aup: int) -> DataFrame:
+    columns = [AupData.id, *(getattr(AupData, name) for name in MERGE_COLUMNS)]
+    rows = db.session.execute(
+        select(*columns).where(AupData.id_aup == id_aup).order_by(AupData.id)
+    ).all()
+    return DataFrame(rows, columns=["id", *MERGE_COLUMNS])
+
+
+def to_db_value(value):
+    if value is pandas.NA:
+        return None
+    return value.item() if isinstance(value, numpy.generic) else value
+
+
+@timeit
+def merge_aup_data(
+    filename: str,
+    aup_info: AupInfo,
+    data: DataFrame,
+    use_other_modules: bool,
+    user_id: int | None,
+) -> None:
+    """
+    Повторная загрузка плана слиянием: записи выгрузки и БД сопоставляются по
+    (дисциплина, период, нагрузка, ед. изм.), в БД применяются только добавления,
+    изменения и удаления. Модуль, группа и порядок строк (num_row) сопоставленных записей
+    не меняются, чтобы не терять ручные правки; num_row из выгрузки получают только новые записи. Изменения полей записываются в Revision.
+    """
+    stored = get_stored_aup_data(aup_info.id_aup)
+    saved_groups = dict(zip(stored["_discipline"], stored["id_group"]))
+    new = save_aup_data(
+        data, aup_info, saved_groups=saved_groups, use_other_modules=use_other_modules
+    )
+    # nullable-типы, чтобы после outer merge целые колонки не становились float
+    stored, new = stored.convert_dtypes(), new.convert_dtypes()
+
+    # одинаковые ключи (например, дисциплина в двух блоках) сопоставляются по порядку
+    stored["occurrence"] = stored.groupby(MERGE_KEY).cumcount()
+    new["occurrence"] = new.groupby(MERGE_KEY).cumcount()
+    merged = stored.merge(
+        new,
+        on=[*MERGE_KEY, "occurrence"],
+        how="outer",
+        suffixes=("_old", ""),
+        indicator=True,
+    )
 
-        aup_data = AupData(
-            id_aup=aup_info.id_aup,
-            id_block=blocks[row["Блок"]].id,
-            shifr=row["Шифр"],
-            id_part=parts[row["Часть"]].id,
-            id_module=module.id,
-            id_group=group.id_group,
-            id_type_record=record_types[row["Тип записи"]].id,
-            id_discipline=id_discipline,
-            _discipline=row["Дисциплина"],
-            id_period=periods[row["Период контроля"]].id,
-            num_row=num_rows[(row["Период контроля"], row["Дисциплина"])],
-            id_type_control=control_types[row["Нагрузка"]].id,
-            amount=int(row["Количество"] * 100),
-            id_edizm=measures[row["Ед. изм."]].id,
-            zet=int(row["ЗЕТ"] * 100),
+    deleted = merged.loc[merged["_merge"] == "left_only", "id"].astype(int).tolist()
+    inserted = merged.loc[merged["_merge"] == "right_only", new.columns.drop("occurrence")]
+    matched = merged[merged["_merge"] == "both"]
+
+    changes = []
+    updates = {}
+    for field in MERGE_UPDATE_COLUMNS:
+        old, value = matched[f"{field}_old"], matched[field]
+        changed = (old != value).fillna(old.isna() != value.isna()).astype(bool)
+        for id, old_value, new_value in zip(
+            matched["id"][changed], old[changed], value[changed]
+        ):
+            id, old_value, new_value = int(id), to_db_value(old_value), to_db_value(new_value)
+            updates.setdefault(id, {"id": id})[field] = new_value
+            changes.append(
+                ChangeLog(
+                    model=AupData.__name__,
+                    row_id=id,
+                    field=field,
+                    old=old_value,
+                    new=new_value,
+                )
+            )
+
+    if deleted:
+        db.session.query(AupData).filter(AupData.id.in_(deleted)).delete()
+    if updates:
+        db.session.execute(update(AupData), list(updates.values()))
+    if not inserted.empty:
+        db.session.execute(
+            insert(AupData),
+            [
+                {key: to_db_value(value) for key, value in row.items()}
+                for row in inserted.to_dict("records")
+            ],
         )
-        instances.append(aup_data)
 
-    return instances
+    logger.info(
+        f"{aup_info.num_aup} merged: {len(inserted)} inserted, "
+        f"{len(updates)} updated, {len(deleted)} deleted"
+    )
+    if changes or deleted or not inserted.empty:
+        create_changes_revision(
+            user_id,
+            aup_info.id_aup,
+            changes,
+            title=f"Загрузка {filename}: добавлено {len(inserted)}, "
+            f"изменено {len(updates)}, удалено {len(deleted)}",
+        )
 
 
 def get_education_duration(duration: str) -> tuple:
@@ -261,47 +670,11 @@ def create_name_op(header: DataFrame):
 
 
 @timeit
-def fill_spr_from_aup_data_values(values, model, **kwargs):
-    # TODO: Change this
-    print(model.__name__, end="\t")
-    values = list(values)
-
-    instances = model.query.all()
-    instances = {el.title: el for el in instances}
-    created_instances = []
-    for el in values:
-        if el not in instances:
-            created_instances.append({"title": el, **kwargs})
-            instances.update({el: None})
-
-    if len(created_instances) == 0:
-        return instances
-    db.session.bulk_insert_mappings(model, created_instances)
-
-    return {el.title: el for el in model.query.all()}
-
-
-@timeit
-def fill_groups_from_aup_data_values(values):
-    values = list(values)
-
-    instances = Groups.query.all()
-    instances = {el.name_group: el for el in instances}
-    created_instances = []
-    for el in values:
-        if el not in instances:
-            created_instances.append({"name_group": el, "color": "#5f60ec"})
-            instances.update({el: None})
-
-    if len(created_instances) == 0:
-        return instances
-    db.session.bulk_insert_mappings(Groups, created_instances)
-
-    return {el.name_group: el for el in Groups.query.all()}
-
-
-@timeit
-def get_num_rows(data: DataFrame) -> dict[tuple[str, str], int]:
+def get_num_rows(data: DataFrame) -> numpy.ndarray:
+    """
+    Номер строки дисциплины в семестре: дисциплины семестра упорядочиваются по весу и названию
+    и нумеруются с 1. Возвращает массив, выровненный по строкам data.
+    """
     default_weight = 5
     weights = {
         "Проектная деятельность": 10,
@@ -310,48 +683,10 @@ def get_num_rows(data: DataFrame) -> dict[tuple[str, str], int]:
         "Иностранный язык": 1,
     }
 
-    periods = {}
-
-    for _, row in data.iterrows():
-        period, discipline = row["Период контроля"], row["Дисциплина"]
-        weight = weights.get(discipline, default_weight)
-        value = (discipline, weight)
-
-        if period not in periods:
-            periods.update({period: [value]})
-        else:
-            periods[period].append(value)
-    res = {}
-    for period, value in periods.items():
-        value.sort(key=lambda x: (x[1], x[0]))
-        for i, (discipline, _) in enumerate(value, start=1):
-            res.update({(period, discipline): i})
-
-    return res
-
-
-@timeit
-def get_discipline_module_mapper() -> dict[int, int]:
-    from collections import defaultdict, Counter
-
-    res = (
-        db.session.query(AupData.id_discipline, D_Modules.title)
-        .join(D_Modules)
-        .filter(D_Modules.title.ilike('%модуль%"%"'))
-        .all()
-    )
-
-    grouped = defaultdict(list)
-
-    for id1, id2 in res:
-        grouped[id1].append(id2)
-
-    result = []
-
-    for id1, id2_list in grouped.items():
-        count = Counter(id2_list)
-        id2_with_max_count = max(count.items(), key=lambda x: x[1])[0]
-        result.append((id1, id2_with_max_count))
+    keys = ["Период контроля", "Дисциплина"]
+    rows = data[keys].drop_duplicates()
+    rows["weight"] = rows["Дисциплина"].map(weights).fillna(default_weight)
+    rows = rows.sort_values(["Период контроля", "weight", "Дисциплина"])
+    rows["num_row"] = rows.groupby("Период контроля").cumcount() + 1
 
-    result.sort(key=lambda x: x[0])
-    return dict(result)
+    return data[keys].merge(rows, on=keys, how="left")["num_row"].to_numpy()
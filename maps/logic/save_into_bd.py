@@ -56,19 +56,18 @@ def update_fields(aup_data: AupData, discipline: dict, load: dict) -> list[Chang
     ]))
 
 
-def create_changes_revision(user_id: int, aup_info_id: int, changes: list[ChangeLog]) -> None:
+def create_changes_revision(user_id: int | None, aup_info_id: int, changes: list[ChangeLog], title: str = "") -> Revision:
     """
-        Функция для создания Ревизии изменений.
+        Функция для создания Ревизии изменений. Изменения фиксируются коммитом вызывающего кода.
     """
     # Поиск последней ревизии по дате, где значение isActual == True
     last_revision = db.session.query(Revision).filter_by(isActual=True, aup_id=aup_info_id).first()
     if last_revision:
         # Последняя актуальная ревизия перестаёт быть актуальной  
         last_revision.isActual = False
-        db.session.commit()
 
     revision = Revision(
-        title="",
+        title=title,
         date=datetime.now(),
         isActual=True,
         user_id=user_id,
@@ -76,8 +75,9 @@ def create_changes_revision(user_id: int, aup_info_id: int, changes: list[Change
     )
 
     db.session.add(revision)
-    db.session.commit()
+    db.session.flush()
     for i in range(len(changes)):
         changes[i].revision_id = revision.id
 
     db.session.bulk_save_objects(changes)
+    return revision
@@ -1,3 +1,4 @@
+import re
 import time
 from functools import wraps
 
@@ -61,6 +62,23 @@ def check_skiplist(zet_or_hours, value_discipline, value_record_type, value_bloc
             len(list(filter(lambda x: x in value_block, skiplist['record_type']))) == 0)
 
 
+def get_skipped_mask(amounts: pd.Series, disciplines: pd.Series, record_types: pd.Series,
+                     blocks: pd.Series) -> pd.Series:
+    """
+        Векторная версия check_skiplist для колонок выгрузки.
+        Возвращает маску строк, которые не учитываются при подсчете ЗЕТ.
+    """
+    discipline_pattern = '|'.join(map(re.escape, skiplist['discipline']))
+    record_type_pattern = '|'.join(map(re.escape, skiplist['record_type']))
+
+    return (
+            amounts.isna() |
+            disciplines.astype(str).str.contains(discipline_pattern, regex=True) |
+            record_types.astype(str).str.contains(record_type_pattern, regex=True) |
+            blocks.astype(str).str.contains(record_type_pattern, regex=True)
+    )
+
+
 def prepare_shifr(shifr):
     if len(shifr) > 2 and shifr[1] == '.':
         # Если второй символ - точка, удалить её
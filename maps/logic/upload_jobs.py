@@ -0,0 +1,220 @@
+"""
+Очередь задач загрузки (таблицы upload_job, upload_job_file), выполняет `flask maps upload-worker`.
+
+Воркер, забравший задачу, записывает в нее свой worker_id и обновляет heartbeat_at после каждой
+пачки файлов. Задача, от воркера которой нет сигнала дольше UPLOAD_JOB_LEASE, возвращается
+в очередь любым воркером, поэтому воркеров может быть несколько, а перезапуск одного
+не трогает задачи, которые выполняют другие. Воркер, потерявший аренду, задачу бросает.
+"""
+import os
+import shutil
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from werkzeug.datastructures import FileStorage
+
+import config
+from maps.logic.excel_pool import get_plan_suffix
+from maps.logic.save_excel_data import parse_new_files, save_parsed_files
+from maps.models import UploadJob, UploadJobFile, db
+from utils.logging import logger
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+FILE_PENDING = "pending"
+
+# идентификатор процесса воркера для аренды задач
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[-64:]
+
+
+def get_job_dir(job_id: str) -> str:
+    return os.path.join(config.UPLOAD_SPOOL_DIR, "jobs", job_id)
+
+
+def create_upload_job(
+    files: list[FileStorage], options: dict, user_id: int | None = None
+) -> UploadJob:
+    """
+    Сохраняет загруженные файлы на диск и ставит задачу на импорт в очередь (таблица upload_job).
+    """
+    job = UploadJob(
+        id=uuid.uuid4().hex,
+        status=JOB_PENDING,
+        options=options,
+        user_id=user_id,
+        created_at=datetime.now(),
+    )
+
+    job_dir = get_job_dir(job.id)
+    os.makedirs(job_dir, exist_ok=True)
+
+    for position, file in enumerate(files):
+        path = os.path.join(job_dir, f"{position}{get_plan_suffix(file.filename)}")
+        file.save(path)
+        job.files.append(
+            UploadJobFile(
+                position=position,
+                filename=file.filename,
+                path=path,
+                status=FILE_PENDING,
+            )
+        )
+
+    db.session.add(job)
+    db.session.commit()
+    logger.info(f"upload job {job.id} created with {len(files)} files")
+    return job
+
+
+def job_as_dict(job: UploadJob) -> dict:
+    res = job.as_dict()
+    res["files"] = [
+        {
+            "filename": file.filename,
+            "status": file.status,
+            "aup": file.aup,
+            "errors": file.errors or [],
+            "timings": file.timings or {},
+        }
+        for file in job.files
+    ]
+    return res
+
+
+def claim_next_job() -> UploadJob | None:
+    """
+    Забирает самую старую задачу из очереди. Смена статуса идет условным UPDATE,
+    поэтому задачу не заберут дважды, даже если воркеров несколько.
+    """
+    while True:
+        job_id = (
+            db.session.query(UploadJob.id)
+            .filter_by(status=JOB_PENDING)
+            .order_by(UploadJob.created_at)
+            .limit(1)
+            .scalar()
+        )
+        if job_id is None:
+            db.session.rollback()
+            return None
+
+        now = datetime.now()
+        claimed = (
+            db.session.query(UploadJob)
+            .filter_by(id=job_id, status=JOB_PENDING)
+            .update(
+                {"status": JOB_RUNNING, "started_at": now, "worker_id": WORKER_ID, "heartbeat_at": now}
+            )
+        )
+        db.session.commit()
+        if claimed:
+            return db.session.get(UploadJob, job_id)
+
+
+def heartbeat(job: UploadJob) -> bool:
+    """
+    Продлевает аренду задачи. False - задачу уже вернули в очередь (аренда истекла),
+    ее выполняет или выполнит другой воркер.
+    """
+    renewed = (
+        db.session.query(UploadJob)
+        .filter_by(id=job.id, status=JOB_RUNNING, worker_id=WORKER_ID)
+        .update({"heartbeat_at": datetime.now()}, synchronize_session=False)
+    )
+    db.session.commit()
+    return bool(renewed)
+
+
+def requeue_expired_jobs() -> None:
+    """
+    Возвращает в очередь задачи в статусе running, от воркера которых нет сигнала дольше
+    UPLOAD_JOB_LEASE (воркер остановлен или завис). Задачи живых воркеров не трогает.
+    """
+    expired_before = datetime.now() - timedelta(seconds=config.UPLOAD_JOB_LEASE)
+    requeued = (
+        db.session.query(UploadJob)
+        .filter(
+            UploadJob.status == JOB_RUNNING,
+            db.or_(
+                UploadJob.heartbeat_at < expired_before,
+                db.and_(UploadJob.heartbeat_at.is_(None), UploadJob.started_at < expired_before),
+            ),
+        )
+        .update(
+            {"status": JOB_PENDING, "started_at": None, "worker_id": None, "heartbeat_at": None},
+            synchronize_session=False,
+        )
+    )
+    db.session.commit()
+    if requeued:
+        logger.info(f"{requeued} upload jobs with expired lease returned to the queue")
+
+
+def run_upload_job(job: UploadJob) -> None:
+    """
+    Импорт файлов задачи пачками по UPLOAD_COMMIT_BATCH_SIZE: пачка разбирается в пуле процессов
+    и записывается одной транзакцией (save_parsed_files), статусы файлов пачки фиксируются после нее.
+    После каждой пачки продлевается аренда; если ее потеряли, задача бросается без изменения статуса.
+    """
+    logger.info(f"upload job {job.id}: processing {len(job.files)} files...")
+    files = [file for file in job.files if file.status == FILE_PENDING]
+
+    try:
+        for i in range(0, len(files), config.UPLOAD_COMMIT_BATCH_SIZE):
+            if not heartbeat(job):
+                logger.warning(f"upload job {job.id}: lease lost, leaving it to another worker")
+                return
+            batch = files[i:i + config.UPLOAD_COMMIT_BATCH_SIZE]
+            parsed_files = parse_new_files([file.path for file in batch], job.options)
+
+            start_time = time.perf_counter()
+            results = save_parsed_files(
+                [file.filename for file in batch], parsed_files, job.options, job.user_id
+            )
+            # время записи всей пачки, в которую вошел файл
+            save_time = time.perf_counter() - start_time
+
+            for file, parsed, res in zip(batch, parsed_files, results):
+                file.status = res["status"]
+                file.aup = str(res["aup"])
+                file.errors = res["errors"]
+                file.timings = {**parsed["timings"], "save": save_time}
+                db.session.add(file)
+            db.session.commit()
+
+        status = JOB_DONE
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"upload job {job.id} failed: {e}")
+        status = JOB_FAILED
+
+    finished = (
+        db.session.query(UploadJob)
+        .filter_by(id=job.id, status=JOB_RUNNING, worker_id=WORKER_ID)
+        .update({"status": status, "finished_at": datetime.now()}, synchronize_session=False)
+    )
+    db.session.commit()
+    if not finished:
+        logger.warning(f"upload job {job.id}: lease lost before finishing")
+        return
+    shutil.rmtree(get_job_dir(job.id), ignore_errors=True)
+    logger.info(f"upload job {job.id}: {status}")
+
+
+def run_worker(poll_interval: float = 2.0) -> None:
+    """
+    Цикл воркера задач загрузки. Запускается командой `flask maps upload-worker`.
+    """
+    logger.info(f"upload worker {WORKER_ID} started")
+    while True:
+        requeue_expired_jobs()
+        job = claim_next_job()
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        run_upload_job(job)
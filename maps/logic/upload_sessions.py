@@ -0,0 +1,282 @@
+"""
+Загрузка файлов по частям: сессия создается со списком файлов, части (chunks) каждого файла
+приходят отдельными PUT-запросами и сразу пишутся на диск, после получения всех частей
+сессия завершается (finalize) и файлы передаются в обычную загрузку (save_excel_paths).
+
+Состояние сессии хранится только на диске (UPLOAD_SPOOL_DIR/sessions/<id>):
+  session.json              - параметры загрузки и список файлов;
+  <номер файла>/<номер>.chunk - полученные части;
+  finalize.lock             - сессия завершается, части и повторное завершение не принимаются.
+Часть записывается во временный файл и переименовывается после проверки длины и контрольной суммы,
+поэтому прерванная загрузка продолжается с первой отсутствующей части.
+Число и размер файлов сессии ограничены UPLOAD_SESSION_MAX_FILES, UPLOAD_MAX_FILE_SIZE
+и UPLOAD_SESSION_MAX_SIZE.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import time
+import uuid
+
+import config
+from maps.logic.excel_pool import get_plan_suffix
+from maps.logic.save_excel_data import save_excel_paths
+from utils.logging import logger
+
+SESSION_RE = re.compile(r"[0-9a-f]{32}")
+READ_BLOCK_SIZE = 1 << 20
+
+
+class SessionBusyError(Exception):
+    """
+    Сессия уже завершается другим запросом.
+    """
+
+
+def get_sessions_dir() -> str:
+    return os.path.join(config.UPLOAD_SPOOL_DIR, "sessions")
+
+
+def get_session_dir(session_id: str) -> str:
+    return os.path.join(get_sessions_dir(), session_id)
+
+
+def get_lock_path(session_id: str) -> str:
+    return os.path.join(get_session_dir(session_id), "finalize.lock")
+
+
+def get_chunk_path(session_id: str, file_index: int, chunk_index: int) -> str:
+    return os.path.join(get_session_dir(session_id), str(file_index), f"{chunk_index}.chunk")
+
+
+def remove_expired_sessions() -> None:
+    """
+    Удаляет сессии, в которые давно не приходили части (время изменения session.json).
+    """
+    sessions_dir = get_sessions_dir()
+    if not os.path.isdir(sessions_dir):
+        return
+
+    expired_before = time.time() - config.UPLOAD_SESSION_LIFETIME
+    for entry in os.scandir(sessions_dir):
+        try:
+            if os.path.getmtime(os.path.join(entry.path, "session.json")) < expired_before:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except FileNotFoundError:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def create_session(files: list[dict], options: dict) -> dict:
+    """
+    files - список {"filename", "size", "sha256" (необязательно)}.
+    Размер части задает сервер (UPLOAD_CHUNK_SIZE), части нумеруются с 0.
+    """
+    if not files:
+        raise ValueError("Не передан список файлов")
+    if len(files) > config.UPLOAD_SESSION_MAX_FILES:
+        raise ValueError(f"В сессии может быть не больше {config.UPLOAD_SESSION_MAX_FILES} файлов")
+    for file in files:
+        if not file.get("filename") or not isinstance(file.get("size"), int) or file["size"] < 0:
+            raise ValueError("Для каждого файла нужны filename и size")
+        if file["size"] > config.UPLOAD_MAX_FILE_SIZE:
+            raise ValueError(
+                f"Файл {file['filename']} больше {config.UPLOAD_MAX_FILE_SIZE} байт"
+            )
+    if sum(file["size"] for file in files) > config.UPLOAD_SESSION_MAX_SIZE:
+        raise ValueError(f"Файлы сессии больше {config.UPLOAD_SESSION_MAX_SIZE} байт")
+
+    remove_expired_sessions()
+
+    session = {
+        "id": uuid.uuid4().hex,
+        "options": options,
+        "chunk_size": config.UPLOAD_CHUNK_SIZE,
+        "files": [
+            {
+                "filename": file["filename"],
+                "size": file["size"],
+                "sha256": file.get("sha256"),
+                "chunks": max(math.ceil(file["size"] / config.UPLOAD_CHUNK_SIZE), 1),
+            }
+            for file in files
+        ],
+    }
+
+    session_dir = get_session_dir(session["id"])
+    for file_index in range(len(files)):
+        os.makedirs(os.path.join(session_dir, str(file_index)))
+    with open(os.path.join(session_dir, "session.json"), "w") as fo:
+        json.dump(session, fo, ensure_ascii=False)
+
+    logger.info(f"upload session {session['id']} created with {len(files)} files")
+    return session
+
+
+def load_session(session_id: str) -> dict | None:
+    if not SESSION_RE.fullmatch(session_id):
+        return None
+    try:
+        with open(os.path.join(get_session_dir(session_id), "session.json")) as fo:
+            return json.load(fo)
+    except FileNotFoundError:
+        return None
+
+
+def get_received_chunks(session: dict, file_index: int) -> list[int]:
+    file_dir = os.path.join(get_session_dir(session["id"]), str(file_index))
+    return sorted(
+        int(name.removesuffix(".chunk"))
+        for name in os.listdir(file_dir)
+        if name.endswith(".chunk")
+    )
+
+
+def session_status(session: dict) -> dict:
+    """
+    Какие части уже получены: клиент досылает только missing.
+    """
+    files = []
+    for file_index, file in enumerate(session["files"]):
+        received = set(get_received_chunks(session, file_index))
+        files.append(
+            {
+                "filename": file["filename"],
+                "size": file["size"],
+                "chunks": file["chunks"],
+                "missing": [i for i in range(file["chunks"]) if i not in received],
+            }
+        )
+    return {"id": session["id"], "chunk_size": session["chunk_size"], "files": files}
+
+
+def save_chunk(
+    session: dict,
+    file_index: int,
+    chunk_index: int,
+    stream,
+    checksum: str | None = None,
+    content_length: int | None = None,
+) -> dict:
+    """
+    Пишет часть из потока запроса на диск блоками по READ_BLOCK_SIZE.
+    checksum - ожидаемый SHA-256 части (заголовок X-Chunk-Sha256), при расхождении часть отбрасывается.
+    Часть длиннее объявленного размера файла отклоняется по Content-Length до чтения,
+    а без него - как только прочитано больше ожидаемого.
+    """
+    if os.path.exists(get_lock_path(session["id"])):
+        raise SessionBusyError()
+    if not 0 <= file_index < len(session["files"]):
+        raise ValueError(f"Нет файла с номером {file_index}")
+    file = session["files"][file_index]
+    if not 0 <= chunk_index < file["chunks"]:
+        raise ValueError(f"Нет части с номером {chunk_index}")
+
+    chunk_size = session["chunk_size"]
+    expected_size = min(chunk_size, file["size"] - chunk_index * chunk_size)
+    if content_length is not None and content_length > expected_size:
+        raise ValueError(f"Часть больше ожидаемого размера {expected_size}")
+
+    path = get_chunk_path(session["id"], file_index, chunk_index)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as fo:
+            while block := stream.read(READ_BLOCK_SIZE):
+                size += len(block)
+                if size > expected_size:
+                    raise ValueError(f"Часть больше ожидаемого размера {expected_size}")
+                digest.update(block)
+                fo.write(block)
+
+        if size != expected_size:
+            raise ValueError(f"Размер части {size}, ожидался {expected_size}")
+        if checksum and checksum.lower() != digest.hexdigest():
+            raise ValueError("Контрольная сумма части не совпадает")
+
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # время изменения session.json продлевает жизнь сессии
+    os.utime(os.path.join(get_session_dir(session["id"]), "session.json"))
+    return {"size": size, "sha256": digest.hexdigest()}
+
+
+def assemble_files(session: dict) -> tuple[list[str], list[str]]:
+    """
+    Склеивает части в файлы потоковым копированием, заодно считая SHA-256 файлов.
+    Если клиент передал SHA-256 файла, он сверяется. Возвращает пути и хеши файлов.
+    """
+    session_dir = get_session_dir(session["id"])
+    paths, file_hashes = [], []
+    for file_index, file in enumerate(session["files"]):
+        path = os.path.join(session_dir, f"{file_index}{get_plan_suffix(file['filename'])}")
+        digest = hashlib.sha256()
+        with open(path, "wb") as fo:
+            for chunk_index in range(file["chunks"]):
+                with open(get_chunk_path(session["id"], file_index, chunk_index), "rb") as fi:
+                    while block := fi.read(READ_BLOCK_SIZE):
+                        digest.update(block)
+                        fo.write(block)
+
+        if file["sha256"] and file["sha256"].lower() != digest.hexdigest():
+            os.remove(path)
+            raise ValueError(f"Контрольная сумма файла {file['filename']} не совпадает")
+        paths.append(path)
+        file_hashes.append(digest.hexdigest())
+    return paths, file_hashes
+
+
+def claim_session(session_id: str) -> None:
+    """
+    Атомарно создает finalize.lock: второй запрос завершения получает SessionBusyError.
+    """
+    try:
+        os.close(os.open(get_lock_path(session_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        raise SessionBusyError()
+
+
+def release_session(session_id: str) -> None:
+    try:
+        os.remove(get_lock_path(session_id))
+    except FileNotFoundError:
+        pass
+
+
+def finalize_session(session: dict, user_id: int | None = None) -> list[dict] | None:
+    """
+    Собирает файлы сессии и загружает их как POST /upload.
+    Сессия удаляется только после успешной загрузки, при ошибке ее можно завершить повторно.
+    None - получены не все части (см. session_status).
+    """
+    claim_session(session["id"])
+    try:
+        status = session_status(session)
+        if any(file["missing"] for file in status["files"]):
+            release_session(session["id"])
+            return None
+
+        paths, file_hashes = assemble_files(session)
+        res = save_excel_paths(
+            [file["filename"] for file in session["files"]],
+            paths,
+            session["options"],
+            user_id,
+            file_hashes,
+        )
+    except BaseException:
+        release_session(session["id"])
+        raise
+
+    remove_session(session["id"])
+    return res
+
+
+def remove_session(session_id: str) -> None:
+    shutil.rmtree(get_session_dir(session_id), ignore_errors=True)
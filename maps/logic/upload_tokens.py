@@ -0,0 +1,102 @@
+import os
+import pickle
+import re
+import time
+import uuid
+
+import config
+from utils.logging import logger
+
+TOKEN_RE = re.compile(r"[0-9a-f]{32}")
+
+
+def get_tokens_dir() -> str:
+    return os.path.join(config.UPLOAD_SPOOL_DIR, "tokens")
+
+
+def get_token_path(token: str) -> str:
+    return os.path.join(get_tokens_dir(), f"{token}.pickle")
+
+
+def remove_expired_tokens() -> None:
+    tokens_dir = get_tokens_dir()
+    if not os.path.isdir(tokens_dir):
+        return
+
+    expired_before = time.time() - config.UPLOAD_TOKEN_LIFETIME
+    for entry in os.scandir(tokens_dir):
+        try:
+            if entry.stat().st_mtime < expired_before:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def save_parsed_token(filename: str, parsed: dict, options: dict) -> str:
+    """
+    Сохраняет разобранную выгрузку на диск (pickle) и возвращает токен,
+    по которому ее можно записать в БД без повторного разбора (load_parsed_token).
+    """
+    remove_expired_tokens()
+    os.makedirs(get_tokens_dir(), exist_ok=True)
+
+    token = uuid.uuid4().hex
+    path = get_token_path(token)
+    with open(f"{path}.tmp", "wb") as fo:
+        pickle.dump(
+            {"filename": filename, "parsed": parsed, "options": options},
+            fo,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(f"{path}.tmp", path)
+    return token
+
+
+def claim_parsed_token(token: str) -> tuple[dict, str] | None:
+    """
+    Забирает разобранную выгрузку по токену: файл токена атомарно переименовывается
+    в <токен>.pickle.claimed, поэтому при одновременных запросах токен достается только одному.
+    Возвращает выгрузку и путь к забранному файлу, None - токен не существует, уже использован
+    или истек. После записи в БД файл удаляется (remove_claimed_token), при ошибке записи
+    токен возвращается (release_claimed_token).
+    """
+    if not TOKEN_RE.fullmatch(token):
+        return None
+
+    path = get_token_path(token)
+    claimed_path = f"{path}.claimed"
+    try:
+        os.rename(path, claimed_path)
+    except FileNotFoundError:
+        return None
+
+    try:
+        expired = os.path.getmtime(claimed_path) < time.time() - config.UPLOAD_TOKEN_LIFETIME
+        if not expired:
+            with open(claimed_path, "rb") as fo:
+                res = pickle.load(fo)
+    except FileNotFoundError:
+        return None
+
+    if expired:
+        logger.info(f"upload token {token} is expired")
+        remove_claimed_token(claimed_path)
+        return None
+    return res, claimed_path
+
+
+def remove_claimed_token(claimed_path: str) -> None:
+    try:
+        os.remove(claimed_path)
+    except FileNotFoundError:
+        pass
+
+
+def release_claimed_token(claimed_path: str) -> None:
+    """
+    Возвращает забранный токен: его можно снова использовать до истечения срока.
+    """
+    try:
+        os.rename(claimed_path, claimed_path.removesuffix(".claimed"))
+    except FileNotFoundError:
+        pass
@@ -1,135 +1,126 @@
+"""
+Выгрузка учебного плана в XML 1С (формат PLX).
+
+План читается из БД одним запросом, строки группируются в памяти. XML отдается потоком:
+шапка, затем каждая строка плана сериализуется отдельно, без общего файла на диске.
+"""
 import xml.etree.ElementTree as et
+from typing import Iterator
 
 from maps.models import AupData, AupInfo
-from maps.logic.take_from_bd import (create_json)
-
-
-def create_json_xml(aup):
-    aupInfo = AupInfo.query.filter_by(num_aup=aup).first()
-    aupData = AupData.query.filter_by(id_aup=aupInfo.id_aup).order_by(AupData.shifr, AupData.id_discipline,
-                                                                      AupData.id_period, AupData.id_type_control).all()
-
-    json = dict()
-    json["aup"] = aupInfo.id_aup
-    json["Строка"] = list()
-    # index = 0
-    flag = ""
-    flag_sem = ""
-    d = dict()
-    load = False
-    sem = dict()
-    load_sem = False
-    for i, item in enumerate(aupData):
-        item: AupData
-
-        if load == True and flag != item.discipline.title:
-            json["Строка"].append(d)
-            d = dict()
-            load = False
-
-        if flag != item.discipline.title:
-
-            load = True
-            # d['last']=last
-            d["Дис"] = item.discipline.title
-            flag = item.discipline.title
-            d["НовЦикл"] = item.type_record.title
-            d["НовИдДисциплины"] = d["НовЦикл"] + " что-то (.1.1)"
-            d["Цикл"] = d["НовЦикл"] + " что-то (.ДВ8)"
-            d["ИдетификаторДисциплины"] = d["НовИдДисциплины"]
-            if item.type_control.title == "Зачет":
-                type_control = 5
-                data = AupData.query.filter_by(id_aup=aupInfo.id_aup, id_discipline=item.id_discipline, id_type_control=5).order_by(
-                    AupData.id_period)
-                for j, elem in enumerate(data):
-                    try:
-                        d["СемЗач"] += str(elem.id_period)
-                    except:
-                        d["СемЗач"] = ""
-                        d["СемЗач"] += str(elem.id_period)
-            if item.type_control.title == "Экзамен":
-                type_control = 5
-                data = AupData.query.filter_by(id_aup=aupInfo.id_aup, id_discipline=item.id_discipline, id_type_control=1).order_by(
-                    AupData.id_period)
-                for j, elem in enumerate(data):
-                    try:
-                        d["СемЭкз"] += str(elem.id_period)
-                    except:
-                        d["СемЭкз"] = ""
-                        d["СемЭкз"] += str(elem.id_period)
-            if item.type_control.title == "Дифференцированный зачет":
-                type_control = 5
-                data = AupData.query.filter_by(id_aup=aupInfo.id_aup, id_discipline=item.id_discipline, id_type_control=9).order_by(
-                    AupData.id_period)
-                for j, elem in enumerate(data):
-                    try:
-                        d["СемДифЗач"] += str(elem.id_period)
-                    except:
-                        d["СемДифЗач"] = ""
-                        d["СемДифЗач"] += str(elem.id_period)
-            # data = AupData.query.filter_by(id_aup=aupInfo.id_aup, discipline=d["Дис"],id_type_control=6).order_by(AupData.id_period)
-            # for j, elem in enumerate(data):
-            #     d["СРС"]=str(elem.amount//100)
-            # data = AupData.query.filter_by(id_aup=aupInfo.id_aup, discipline=d["Дис"]).order_by(AupData.id_period)
-            d["sem"] = []
-
-            # if item.id_period!=flag_sem and load_sem==True:
-            #     d["sem"].append(sem)
-            #     sem = dict()
-
-            # if item.id_period!=flag_sem:
-            # d["sem"].append(sem)
-
-            data = AupData.query.filter_by(id_aup=aupInfo.id_aup, id_discipline=item.id_discipline).order_by(AupData.id_period)
-            for j, elem in enumerate(data):
-                data_2 = data.filter_by(id_period=elem.id_period)
-                sem = dict()
-                sem["Ном"] = elem.id_period
-                for k, ter in enumerate(data_2):
-                    if ter.id_type_control == 1:
-                        sem["Экз"] = "1"
-                    if ter.id_type_control == 2:
-                        sem["Лек"] = str(ter.amount // 100)
-                    if ter.id_type_control == 4:
-                        sem["СРС"] = str(ter.amount // 100)
-                    if ter.id_type_control == 6:
-                        sem["Лаб"] = str(ter.amount // 100)
-                    if ter.id_type_control == 5:
-                        sem["Зач"] = "1"
-                    if ter.id_type_control == 9:
-                        sem["ДифЗач"] = "1"
-                    if ter.id_type_control == 18:
-                        sem["КП"] = "1"
-                if not (sem in d["sem"]):
-                    d["sem"].append(sem)
-
-    return json
-
-
-def create_xml(aup):
-    aupInfo = AupInfo.query.filter_by(num_aup=aup).first()
-    aupData = AupData.query.filter_by(id_aup=aupInfo.id_aup).order_by(AupData.shifr, AupData.id_discipline,
-                                                                      AupData.id_period, AupData.id_type_control).all()
-
-    dict = create_json(aup)
-    dict_2 = create_json_xml(aup)
+
+# тип контроля первой записи дисциплины -> (ID типа контроля, атрибут со списком семестров)
+CONTROL_SEMESTERS = {
+    "Зачет": (5, "СемЗач"),
+    "Экзамен": (1, "СемЭкз"),
+    "Дифференцированный зачет": (9, "СемДифЗач"),
+}
+# ID типа контроля (нагрузки) -> атрибут Сем
+SEMESTER_ATTRIBUTES = {
+    1: "Экз",
+    2: "Лек",
+    4: "СРС",
+    6: "Лаб",
+    5: "Зач",
+    9: "ДифЗач",
+    18: "КП",
+}
+# атрибуты Сем с часами, остальные - отметка "1"
+HOURS_ATTRIBUTES = {"Лек", "СРС", "Лаб"}
+# атрибуты Сем, которые дублируются элементом VZ с ID вида работ
+VZ_IDS = {
+    "Лаб": "102",
+    "Лек": "101",
+    "Пр": "103",
+    "СРС": "107",
+    "Сем": "107",
+}
+
+
+def get_semesters(aup_data: list[AupData]) -> list[dict]:
+    """
+    Семестры дисциплины (записи отсортированы по периоду): номер и нагрузка/контроль по атрибутам Сем.
+    """
+    semesters = {}
+    for el in aup_data:
+        sem = semesters.setdefault(el.id_period, {"Ном": el.id_period})
+        if key := SEMESTER_ATTRIBUTES.get(el.id_type_control):
+            sem[key] = str(el.amount // 100) if key in HOURS_ATTRIBUTES else "1"
+    return list(semesters.values())
+
+
+def create_json_xml(aup_data: list[AupData]) -> list[dict]:
+    """
+    Строки плана. aup_data - все записи плана в порядке шифр, дисциплина, период, тип контроля;
+    строка начинается с каждой смены названия дисциплины.
+    """
+    by_discipline = {}
+    for el in aup_data:
+        by_discipline.setdefault(el.id_discipline, []).append(el)
+    for rows in by_discipline.values():
+        rows.sort(key=lambda el: (el.id_period, el.id))
+
+    result = []
+    title = None
+    for item in aup_data:
+        if item.discipline.title == title:
+            continue
+        title = item.discipline.title
+        rows = by_discipline[item.id_discipline]
+
+        d = dict()
+        d["Дис"] = title
+        d["НовЦикл"] = item.type_record.title
+        d["НовИдДисциплины"] = d["НовЦикл"] + " что-то (.1.1)"
+        d["Цикл"] = d["НовЦикл"] + " что-то (.ДВ8)"
+        d["ИдетификаторДисциплины"] = d["НовИдДисциплины"]
+        if control := CONTROL_SEMESTERS.get(item.type_control.title):
+            id_type_control, key = control
+            periods = "".join(str(el.id_period) for el in rows if el.id_type_control == id_type_control)
+            if periods:
+                d[key] = periods
+        d["sem"] = get_semesters(rows)
+        result.append(d)
+
+    return result
+
+
+def create_line(item: dict) -> et.Element:
+    line = et.Element("Строка")
+    for key in item.keys():
+        if key != "sem":
+            line.set(key, item[key])
+            continue
+
+        for num_sem in item[key]:
+            sem = et.SubElement(line, "Сем")
+            for key_sem in num_sem:
+                sem.set(key_sem, str(num_sem[key_sem]))
+                if key_sem in VZ_IDS:
+                    vz = et.SubElement(sem, "VZ")
+                    vz.set("ID", VZ_IDS[key_sem])
+                    vz.set("Н", str(num_sem[key_sem]))
+    return line
+
+
+def create_header(aup_info: AupInfo) -> et.Element:
     doc = et.Element("Документ")
     doc.set("Тип", "Академический учебный план")
     plan = et.SubElement(doc, "План")
     plan.set("ПодТип", "рабочий учебный план")
     plan.set("Шифр", "PLM")
-    plan.set("ОбразовательнаяПрограмма", aupInfo.qualification)  # подтянуть из базы тип обучения Бак/Спец/Маг и тд
-    plan.set("ФормаОбучения", str(aupInfo.form.form))  # тоже самое формой обучения
+    plan.set("ОбразовательнаяПрограмма", aup_info.qualification)  # подтянуть из базы тип обучения Бак/Спец/Маг и тд
+    plan.set("ФормаОбучения", str(aup_info.form.form))  # тоже самое формой обучения
     plan.set("УровеньОбразования", "ВПО")  # и тут тоже
     titul = et.SubElement(doc, "Титул")
-    titul.set("ИмяПлана", "Академический учебный план " + aup + " от 01.11." + str(dict["year"]) + " 0:00:00")
-    titul.set("ПолноеИмяПлана", "Академический учебный план " + aup + " от 01.11." + str(dict["year"]) + " 0:00:00")
+    titul.set("ИмяПлана", "Академический учебный план " + aup_info.num_aup + " от 01.11." + str(aup_info.year_beg) + " 0:00:00")
+    titul.set("ПолноеИмяПлана", "Академический учебный план " + aup_info.num_aup + " от 01.11." + str(aup_info.year_beg) + " 0:00:00")
     titul.set("ИмяВуза",
               "Федеральное государственное автономное образовательное учреждение высшего образования «Московский политехнический университет»")
-    titul.set("ИмяВуза2", dict["header"][3])
-    titul.set("Факультет", dict["header"][3])
-    titul.set("ПоследнийШифр", dict["header"][0])
-    titul.set("ГодНачалаПодготовки", str(dict["year"]))
+    titul.set("ИмяВуза2", aup_info.faculty.name_faculty)
+    titul.set("Факультет", aup_info.faculty.name_faculty)
+    titul.set("ПоследнийШифр", aup_info.spec.okco.program_code + "." + aup_info.spec.num_profile)
+    titul.set("ГодНачалаПодготовки", str(aup_info.year_beg))
     titul.set("ВидПлана", "2")
     titul.set("КодУровня", "B")
     titul.set("СеместровНаКурсе", "2")
@@ -199,42 +190,24 @@ def create_xml(aup):
     # <Цикл Ном="13" Аббревиатура="Факультативные дисциплины"/>
     atr = et.SubElement(titul, "АтрибутыЦиклов")
     spec = et.SubElement(titul, "Специальности")
-    stroki_plan = et.SubElement(doc, "СтрокиПлана")
-
-    for item in dict_2["Строка"]:
-        line = et.SubElement(stroki_plan, "Строка")
-        for key in item.keys():
-            if key != "sem":
-                line.set(key, item[key])
-            else:
-                # sem = et.SubElement(line, "Сем")
-                for num_sem in item[key]:
-                    sem = et.SubElement(line, "Сем")
-                    for key_sem in num_sem:
-                        print(key_sem, num_sem[key_sem])
-                        sem.set(key_sem, str(num_sem[key_sem]))
-                        if key_sem == "Лаб":
-                            vz = et.SubElement(sem, "VZ")
-                            vz.set("ID", "102")
-                            vz.set("Н", str(num_sem[key_sem]))
-                        elif key_sem == "Лек":
-                            vz = et.SubElement(sem, "VZ")
-                            vz.set("ID", "101")
-                            vz.set("Н", str(num_sem[key_sem]))
-                        elif key_sem == "Пр":
-                            vz = et.SubElement(sem, "VZ")
-                            vz.set("ID", "103")
-                            vz.set("Н", str(num_sem[key_sem]))
-                        elif key_sem == "СРС":
-                            vz = et.SubElement(sem, "VZ")
-                            vz.set("ID", "107")
-                            vz.set("Н", str(num_sem[key_sem]))
-                        elif key_sem == "Сем":
-                            vz = et.SubElement(sem, "VZ")
-                            vz.set("ID", "107")
-                            vz.set("Н", str(num_sem[key_sem]))
-    save = et.ElementTree(doc)
-    save.write("sample.txt", encoding='UTF-8')
-    # save.save(filename=filename_xml)
-    # return doc
-    return "sample.txt"
+    et.SubElement(doc, "СтрокиПлана")
+    return doc
+
+
+def create_xml(aup_info: AupInfo) -> Iterator[str]:
+    """
+    XML плана по частям: шапка и по одной строке плана.
+    """
+    aup_data = AupData.query.filter_by(id_aup=aup_info.id_aup).order_by(AupData.shifr, AupData.id_discipline,
+                                                                        AupData.id_period, AupData.id_type_control).all()
+    lines = create_json_xml(aup_data)
+
+    header = et.tostring(create_header(aup_info), encoding="unicode")
+    if not lines:
+        yield header
+        return
+
+    yield header.removesuffix("<СтрокиПлана /></Документ>") + "<СтрокиПлана>"
+    for item in lines:
+        yield et.tostring(create_line(item), encoding="unicode")
+    yield "</СтрокиПлана></Документ>"
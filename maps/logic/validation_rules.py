@@ -0,0 +1,77 @@
+"""
+Правила проверки учебного плана, общие для выгрузки Excel (excel_check.py)
+и для записей AupData, сохраненных в БД (save_check.py).
+"""
+from pandas import Series
+
+INTEGRITY_TOLERANCE = 0.05
+TOTAL_ZET_TOLERANCE = 0.1
+
+total_sum_by_level = {
+    "03": 240,
+    "04": 120,
+    "05": 300,
+}
+
+measure_to_zet = {
+    "Часы": 1 / 36,
+    "Недели": 1.5,
+    "Зет": 1,
+}
+
+
+def is_integer_zet(zet: float) -> bool:
+    """
+    Проверяет, что суммарный объем дисциплины за семестр - целое число ЗЕТ.
+    """
+    return float(abs(zet - round(zet))) <= INTEGRITY_TOLERANCE
+
+
+def integer_zet_mask(zet: Series) -> Series:
+    """
+    Векторная версия is_integer_zet для колонки сумм ЗЕТ.
+    """
+    return (zet - zet.round()).abs() <= INTEGRITY_TOLERANCE
+
+
+def get_total_zet_norm(program_code: str) -> int | None:
+    """
+    Возвращает норму ЗЕТ для кода специальности вида 09.03.01 (по уровню образования).
+    """
+    try:
+        level_code = program_code.split(".")[1]
+    except (AttributeError, IndexError):
+        return None
+    return total_sum_by_level.get(level_code)
+
+
+def is_total_zet_valid(total: float, norm: int) -> bool:
+    return abs(norm - total) < TOTAL_ZET_TOLERANCE
+
+
+def integrity_error(errors: list[str]) -> dict:
+    return {"message": f"Ошибка при подсчете ЗЕТ" + "\n".join(errors)}
+
+
+def integrity_error_line(period: str, discipline: str, zet: float) -> str:
+    return f"{period}: {discipline} {zet}"
+
+
+def unknown_level_error(program_code: str) -> dict:
+    return {
+        "message": f"Не удалось определить уровень образования по коду специальности {program_code}, "
+        f"норма ЗЕТ известна для уровней {', '.join(total_sum_by_level)}"
+    }
+
+
+def unknown_measure_error(measures: list[str]) -> dict:
+    return {
+        "message": f"Неизвестные единицы измерения: {', '.join(measures)}. "
+        f"Допустимые: {', '.join(measure_to_zet)}"
+    }
+
+
+def total_zet_error(total: float, norm: int) -> dict:
+    return {
+        "message": f"В выгрузке общая сумма ЗЕТ ({total} ЗЕТ) не соответствует норме ({norm} ЗЕТ)"
+    }
@@ -135,6 +135,9 @@ class AupInfo(db.Model, SerializationMixin):
     is_actual = db.Column(db.Boolean, nullable=False)
     is_delete = db.Column(db.Boolean, nullable=True)
     date_delete = db.Column(db.DateTime, nullable=True)
+    # sha256 загруженного файла и разобранных данных, сбрасываются при правках плана
+    file_hash = db.Column(db.String(64), nullable=True, index=True)
+    data_hash = db.Column(db.String(64), nullable=True)
 
     degree = db.relationship("SprDegreeEducation")
     form = db.relationship("SprFormEducation")
@@ -148,7 +151,15 @@ class AupInfo(db.Model, SerializationMixin):
     def __repr__(self):
         return "<№ AUP %r>" % self.num_aup
 
-    def copy(self, num, file=None):
+    def reset_hashes(self):
+        self.file_hash = None
+        self.data_hash = None
+
+    def copy(self, num, file=None, commit: bool = True) -> "AupInfo":
+        """
+        Копия плана с записями. commit=False - без коммита, чтобы вызывающий код
+        дописал связанные изменения в той же транзакции.
+        """
         new_aup: AupInfo = AupInfo(
             file=file if file else "",
             num_aup=num,
@@ -176,7 +187,11 @@ class AupInfo(db.Model, SerializationMixin):
         aup_data_queryset = AupData.query.filter_by(id_aup=self.id_aup).all()
         db.session.add_all([el.copy(new_aup) for el in aup_data_queryset])
 
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+        return new_aup
 
 
 class Department(db.Model, SerializationMixin):
@@ -431,7 +446,7 @@ class Revision(db.Model):
     title = db.Column(db.String(255))
     date = db.Column(db.DateTime)
     isActual = db.Column(db.Boolean)
-    user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.id_user"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.id_user"), nullable=True)
     aup_id = db.Column(
         db.Integer, db.ForeignKey("tbl_aup.id_aup", ondelete="CASCADE"), nullable=False
     )
@@ -467,3 +482,74 @@ class Weeks(db.Model):
         primary_key=True,
     )
     amount = db.Column(db.Integer)
+
+
+class UploadJob(db.Model, SerializationMixin):
+    __tablename__ = "upload_job"
+    __table_args__ = (
+        db.Index("ix_upload_job_status_created_at", "status", "created_at"),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default="pending")
+    options = db.Column(db.JSON, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("tbl_users.id_user"), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # воркер, выполняющий задачу, и время его последнего сигнала (аренда задачи)
+    worker_id = db.Column(db.String(64), nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    files = db.relationship(
+        "UploadJobFile",
+        order_by="UploadJobFile.position",
+        lazy="joined",
+        passive_deletes=True,
+    )
+
+
+class UploadJobFile(db.Model, SerializationMixin):
+    __tablename__ = "upload_job_file"
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(
+        db.String(32),
+        db.ForeignKey("upload_job.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    position = db.Column(db.Integer, nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    path = db.Column(db.String(1024), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="pending")
+    aup = db.Column(db.String(255), nullable=True)
+    errors = db.Column(db.JSON, nullable=True)
+    timings = db.Column(db.JSON, nullable=True)
+
+
+class ReferenceVersion(db.Model):
+    __tablename__ = "reference_version"
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Количество записей aup_data по (дисциплина, модуль) во всех планах,
+# поддерживается в maps.logic.module_stats
+class DisciplineModuleStats(db.Model):
+    __tablename__ = "discipline_module_stats"
+    __table_args__ = (
+        db.Index("ix_discipline_module_stats_discipline_count", "id_discipline", "count"),
+    )
+
+    id_discipline = db.Column(
+        db.Integer,
+        db.ForeignKey("spr_discipline.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    id_module = db.Column(
+        db.Integer,
+        db.ForeignKey("d_modules.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    count = db.Column(db.Integer, nullable=False, default=0)
@@ -4,6 +4,9 @@ from flask import Blueprint, make_response, jsonify, request
 from auth.logic import admin_only
 from datetime import datetime
 
+from collections import Counter
+
+from maps.logic.module_stats import get_plan_module_counts, update_module_stats
 from maps.models import db, AupInfo, NameOP
 
 aup_info_router = Blueprint(
@@ -23,7 +26,10 @@ def aup_copy(aup: str | None):
             if AupInfo.query.filter_by(num_aup=new_aup_num).first():
                 return jsonify({"status": "already exists"}), 400
 
-            aup_record.copy(new_aup_num)
+            # копия и счетчики модулей - одна транзакция
+            new_aup = aup_record.copy(new_aup_num, commit=False)
+            update_module_stats(Counter(), get_plan_module_counts(new_aup.id_aup))
+            db.session.commit()
             return jsonify({"status": "ok", "aup_num": new_aup_num})
         case _:
             return jsonify({"result": "failed"}), 400
@@ -40,6 +46,7 @@ def aup_change(aup: str | None):
     for field, value in data.items():
         if field in AupInfo.__dict__:
             setattr(aup_record, field, value)
+    aup_record.reset_hashes()
 
     db.session.add(aup_record)
 
@@ -59,6 +66,7 @@ def aup_delete(aup: str | None):
     if not aup_record:
         return jsonify({"status": "not found"}), 404
 
+    update_module_stats(get_plan_module_counts(aup_record.id_aup), Counter())
     db.session.delete(aup_record)
     db.session.commit()
     return jsonify({"status": "ok"})
@@ -110,6 +118,7 @@ def confirm_aup_deletion(aup: str | None):
         return jsonify({"status": "not found"}), 404
 
     if aup_record.is_delete == 1:
+        update_module_stats(get_plan_module_counts(aup_record.id_aup), Counter())
         db.session.delete(aup_record)
     else:
         return jsonify({"status": "aup not mark_deleted"}), 400
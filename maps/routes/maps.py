@@ -1,28 +1,53 @@
 import io
 import json
-import os
 from collections import defaultdict
 from itertools import chain
 from pprint import pprint
 
-from flask import Blueprint, make_response, jsonify, request, send_file
+from flask import Blueprint, Response, make_response, jsonify, request, send_file, stream_with_context
 
 from app import cache
 
-from auth.logic import login_required, aup_require, verify_jwt_token
+from auth.logic import login_required, aup_require, admin_only, verify_jwt_token, get_request_user_id
 from auth.models import Mode
-from maps.logic.print_excel import saveMap, get_aup_data_excel
-from maps.logic.save_excel_data import save_excel_files
+from maps.cli import register_commands
+from maps.logic.analytics_dump import EXTENSIONS, MIMETYPES, get_available_format, stream_dump
+from maps.logic.check_timings import get_histograms
+from maps.logic.export_cache import get_cached_export
+from maps.logic.faculty_export import get_faculty_plans, iter_faculty_maps, stream_zip
+from maps.logic.map_layout import is_color
+from maps.logic.module_stats import (
+    get_plan_module_counts,
+    move_module_stats,
+    update_module_stats,
+)
+from maps.logic.print_excel import saveMap, get_aup_data_excel, get_map_data, get_plans, get_plans_data_excel
+from maps.logic.print_svg import render_map_svg
+from maps.logic.save_check import SaveChecker
+from maps.logic.save_excel_data import (
+    commit_parsed_token,
+    save_excel_files,
+    validate_excel_files,
+)
 from maps.logic.save_into_bd import update_fields, create_changes_revision
 from maps.logic.take_from_bd import control_type_r, create_json
+from maps.logic.upload_jobs import create_upload_job, job_as_dict
+from maps.logic.upload_sessions import (
+    SessionBusyError,
+    create_session,
+    finalize_session,
+    load_session,
+    save_chunk,
+    session_status,
+)
 from maps.logic.upload_xml import create_xml
 from maps.models import *
 from utils.logging import logger
 
-maps = Blueprint("maps", __name__, static_folder="../static")
+maps = Blueprint("maps", __name__, static_folder="../static", cli_group="maps")
 
-if not os.path.exists(maps.static_folder + "/temp"):
-    os.makedirs(maps.static_folder + "/temp", exist_ok=True)
+COLOR_ERROR = "Цвет должен быть в формате #RRGGBB"
+register_commands(maps)
 
 
 @maps.route("/map/<string:aup>")
@@ -44,6 +69,8 @@ def save_map(aup):
     aup_data_id_map = {el.id: el for el in aup_info.aup_data}
 
     disciplines = {el.title: el.id for el in SprDiscipline.query.all()}
+    checker = SaveChecker(aup_info)
+    module_counts = get_plan_module_counts(aup_info.id_aup)
 
     changes = []
     for discipline in data:
@@ -52,10 +79,13 @@ def save_map(aup):
                 aup_data = AupData()
                 aup_data.id_discipline = disciplines[discipline["discipline"]]
                 aup_info.aup_data.append(aup_data)
+                before = None
             else:
                 aup_data = aup_data_id_map.pop(load["id"])
+                before = checker.contribution(aup_data)
 
             changes.extend(update_fields(aup_data, discipline, load))
+            checker.track(before, aup_data)
 
             if changes:
                 db.session.add(aup_data)
@@ -66,10 +96,17 @@ def save_map(aup):
 
     if aup_data_id_map.keys():
         for el in AupData.query.filter(AupData.id.in_(aup_data_id_map.keys())):
+            checker.track(checker.contribution(el), None)
             db.session.delete(el)
 
+    if changes or aup_data_id_map:
+        aup_info.reset_hashes()
+        update_module_stats(module_counts, get_plan_module_counts(aup_info.id_aup))
     db.session.commit()
-    return make_response(jsonify(create_json(aup)), 200)
+
+    result = create_json(aup)
+    result["warnings"] = checker.save()
+    return make_response(jsonify(result), 200)
 
 
 @maps.route("/meta-info", methods=["GET"])
@@ -117,35 +154,172 @@ def upload():
     logger.info("/upload - processing files uploading")
     options = dict(json.loads(request.form["options"]))
     logger.debug(f"/upload - options: {options}")
-    res = save_excel_files(request.files, options)
+    res = save_excel_files(request.files, options, get_request_user_id(request))
     return jsonify(res), 200
 
 
-@maps.route("/save_excel/<string:aup>", methods=["GET"])
-def save_excel(aup):
+@maps.route("/upload/validate", methods=["POST"])
+def validate_upload():
+    options = dict(json.loads(request.form["options"]))
+    res = validate_excel_files(request.files, options)
+    return jsonify(res), 200
+
+
+@maps.route("/upload/commit/<string:token>", methods=["POST"])
+def commit_upload(token: str):
+    res = commit_parsed_token(token, get_request_user_id(request))
+    if res is None:
+        return jsonify({"error": "Токен не найден, истек или уже использован"}), 404
+
+    return jsonify(res), 200
+
+
+@maps.route("/upload/jobs", methods=["POST"])
+def create_upload_job_view():
+    options = dict(json.loads(request.form["options"]))
+    job = create_upload_job(
+        request.files.getlist("file"), options, get_request_user_id(request)
+    )
+    return jsonify({"id": job.id, "status": job.status}), 202
+
+
+@maps.route("/upload/jobs/<string:job_id>", methods=["GET"])
+def get_upload_job(job_id: str):
+    job = db.session.get(UploadJob, job_id)
+    if not job:
+        return jsonify({"error": "not found"}), 404
+
+    return jsonify(job_as_dict(job)), 200
+
+
+@maps.route("/upload/sessions", methods=["POST"])
+def create_upload_session():
+    data = request.get_json()
+    try:
+        session = create_session(data.get("files") or [], data.get("options") or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(session_status(session)), 201
+
+
+@maps.route("/upload/sessions/<string:session_id>", methods=["GET"])
+def get_upload_session(session_id: str):
+    session = load_session(session_id)
+    if not session:
+        return jsonify({"error": "not found"}), 404
+
+    return jsonify(session_status(session)), 200
+
+
+@maps.route(
+    "/upload/sessions/<string:session_id>/files/<int:file_index>/chunks/<int:chunk_index>",
+    methods=["PUT"],
+)
+def put_upload_chunk(session_id: str, file_index: int, chunk_index: int):
+    session = load_session(session_id)
+    if not session:
+        return jsonify({"error": "not found"}), 404
+
+    try:
+        res = save_chunk(
+            session,
+            file_index,
+            chunk_index,
+            request.stream,
+            request.headers.get("X-Chunk-Sha256"),
+            request.content_length,
+        )
+    except SessionBusyError:
+        return jsonify({"error": "Сессия уже завершается"}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(res), 200
+
+
+@maps.route("/upload/sessions/<string:session_id>/finalize", methods=["POST"])
+def finalize_upload_session(session_id: str):
+    session = load_session(session_id)
+    if not session:
+        return jsonify({"error": "not found"}), 404
+
+    try:
+        res = finalize_session(session, get_request_user_id(request))
+    except SessionBusyError:
+        return jsonify({"error": "Сессия уже завершается"}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if res is None:
+        return jsonify(session_status(session)), 409
+
+    return jsonify(res), 200
+
+
+@maps.route("/upload/check-timings", methods=["GET"])
+def get_check_timings():
+    """
+    Гистограммы времени проверок выгрузки текущего воркера gunicorn (см. check_timings.py).
+    """
+    return jsonify(get_histograms()), 200
+
+
+def get_print_options() -> dict:
     try:
         paper_size = json.loads(request.form["paper_size"])
         orientation = json.loads(request.form["orientation"])
-        load = False
-        control = False
     except:
         paper_size = "3"
         orientation = "land"
-        load = False
-        control = False
-    filename = saveMap(aup, maps.static_folder, paper_size, orientation, control, load)
+    return {"paper_size": str(paper_size), "orientation": orientation, "control": False, "load": False}
+
+
+@maps.route("/save_excel/<string:aup>", methods=["GET"])
+def save_excel(aup):
+    aup_info = AupInfo.query.filter_by(num_aup=aup).first()
+    if aup_info is None:
+        return jsonify({"error": "not found"}), 404
+
+    options = get_print_options()
+    file = get_cached_export(
+        "map",
+        aup_info,
+        options,
+        lambda: saveMap(aup, options["paper_size"], options["orientation"], options["control"], options["load"])[0],
+    )
+
+    response = make_response(send_file(file, download_name=f"КД {aup_info.file}"))
+    response.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
+    return response
 
-    # Upload xlxs file in memory and delete file from storage
-    return_data = io.BytesIO()
-    with open(filename, "rb") as fo:
-        return_data.write(fo.read())
 
-    # after writing, cursor will be at last byte, so move it to start
-    return_data.seek(0)
+@maps.route("/map/<string:aup>/preview.svg", methods=["GET"])
+def map_preview(aup):
+    aup_info = AupInfo.query.filter_by(num_aup=aup).first()
+    if aup_info is None:
+        return jsonify({"error": "not found"}), 404
+
+    file = get_cached_export(
+        "preview",
+        aup_info,
+        {},
+        lambda: io.BytesIO(render_map_svg(get_map_data(aup_info)).encode()),
+        suffix=".svg",
+    )
+    return send_file(file, mimetype="image/svg+xml")
 
-    os.remove(filename)
 
-    response = make_response(send_file(return_data, download_name=filename))
+@maps.route("/faculties/<int:id_faculty>/maps.zip", methods=["GET"])
+@login_required(request)
+def faculty_maps_zip(id_faculty):
+    aup_infos = get_faculty_plans(id_faculty)
+    if not aup_infos:
+        return jsonify({"error": "У факультета нет учебных планов"}), 404
+
+    entries = iter_faculty_maps(aup_infos, get_print_options())
+    response = Response(stream_with_context(stream_zip(entries)), mimetype="application/zip")
+    response.headers["Content-Disposition"] = f"attachment; filename=maps-{id_faculty}.zip"
     response.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
     return response
 
@@ -188,6 +362,9 @@ def add_module():
             400,
         )
 
+    if not is_color(module.get("color")):
+        return jsonify({"result": "error", "message": COLOR_ERROR}), 400
+
     new_module = D_Modules()
     new_module.title = module["name"]
     new_module.color = module["color"]
@@ -214,7 +391,9 @@ def edit_or_delete_module(id: int):
     if request.method == "DELETE":
         for el in AupData.query.filter_by(id_module=module.id).all():
             el.id_module = 19
+            el.aup.reset_hashes()
             db.session.add(el)
+        move_module_stats(module.id, 19)
 
         db.session.delete(module)
         db.session.commit()
@@ -222,6 +401,9 @@ def edit_or_delete_module(id: int):
 
     elif request.method == "PUT":
         data = request.get_json()
+        if not is_color(data.get("color")):
+            return jsonify({"result": "error", "message": COLOR_ERROR}), 400
+
         module.title = data["name"]
         module.color = data["color"]
 
@@ -292,6 +474,8 @@ def AddNewGroup():
     request_data = request.get_json()
     if request_data["name"] == "":
         return make_response(jsonify("Введите название группировки"), 400)
+    if not is_color(request_data.get("color")):
+        return make_response(jsonify(COLOR_ERROR), 400)
     data = Groups(name_group=request_data["name"], color=request_data["color"])
     db.session.add(data)
     db.session.commit()
@@ -365,6 +549,8 @@ def GetModulesByAup(aup):
 @aup_require(request)
 def UpdateGroup():
     request_data = request.get_json()
+    if not is_color(request_data.get("color")):
+        return make_response(jsonify(COLOR_ERROR), 400)
     gr = Groups.query.filter_by(id_group=request_data["id"]).first()
     gr.name_group = request_data["name"]
     gr.color = request_data["color"]
@@ -393,14 +579,16 @@ def test():
 
 @maps.route("/upload-xml/<string:aup>")
 def upload_xml(aup):
-    filename = create_xml(aup)
-
-    data = io.BytesIO()
-    with open(filename, "rb") as res:
-        data.write(res.read())
-    data.seek(0)
+    aup_info = AupInfo.query.filter_by(num_aup=aup).first()
+    if aup_info is None:
+        return jsonify({"error": "not found"}), 404
 
-    return send_file(data, download_name="sample.txt")
+    response = Response(
+        stream_with_context(el.encode() for el in create_xml(aup_info)),
+        mimetype="text/plain",
+    )
+    response.headers["Content-Disposition"] = "inline; filename=sample.txt"
+    return response
 
 
 @maps.route("/exprort-aup/<string:aup>", methods=["GET"])
@@ -416,6 +604,46 @@ def export_aup_excel(aup: str):
     )
 
 
+@maps.route("/export-aups", methods=["GET"])
+@login_required(request)
+def export_aups_excel():
+    id_faculty = request.args.get("faculty", type=int)
+    year = request.args.get("year", type=int)
+    if id_faculty is None and year is None:
+        return jsonify({"error": "Укажите факультет (faculty) или год набора (year)"}), 400
+
+    aup_infos = get_plans(id_faculty, year)
+    if not aup_infos:
+        return jsonify({"error": "Учебные планы не найдены"}), 404
+
+    long = request.args.get("layout", "sheets") == "long"
+    file = get_plans_data_excel(aup_infos, long=long)
+    filename = "aups" + (f"-{id_faculty}" if id_faculty is not None else "") + (f"-{year}" if year is not None else "")
+    return send_file(
+        file,
+        download_name=f"{filename}.xlsx",
+        as_attachment=True,
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+@maps.route("/aup-data/dump", methods=["GET"])
+@admin_only(request)
+def aup_data_dump():
+    requested_format = request.args.get("format")
+    if requested_format is not None and requested_format not in EXTENSIONS:
+        return jsonify({"error": f"Неизвестный формат {requested_format}, доступны parquet и csv"}), 400
+
+    dump_format = get_available_format(requested_format)
+    if requested_format is not None and dump_format != requested_format:
+        return jsonify({"error": "Для выгрузки в Parquet на сервере не установлен pyarrow, используйте format=csv"}), 400
+
+    response = Response(stream_with_context(stream_dump(dump_format)), mimetype=MIMETYPES[dump_format])
+    response.headers["Content-Disposition"] = f"attachment; filename=aup_data{EXTENSIONS[dump_format]}"
+    response.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
+    return response
+
+
 @maps.route("/weeks/<string:aup>/save", methods=["POST"])
 @login_required(request)
 @aup_require(request)
@@ -483,6 +711,8 @@ def revert_revision(id_revision):
         .all()
     )
 
+    module_counts = get_plan_module_counts(current_revision.aup_id)
+
     # получаем сразу всю AupData чтобы не делать лишних запросов
     aup_data_mapper = {
         el.id: el
@@ -495,7 +725,9 @@ def revert_revision(id_revision):
         for change in revision.logs:
             change: ChangeLog
 
-            aup_data_row = aup_data_mapper[change.row_id]
+            # записи, удаленные при загрузке выгрузки слиянием, не восстанавливаются
+            if not (aup_data_row := aup_data_mapper.get(change.row_id)):
+                continue
             setattr(aup_data_row, change.field, change.old)
             db.session.add(aup_data_row)
 
@@ -515,6 +747,11 @@ def revert_revision(id_revision):
         current_revision.isActual = True
         db.session.add(current_revision)
 
+    db.session.get(AupInfo, subsequent_revisions[0].aup_id).reset_hashes()
+    update_module_stats(
+        module_counts, get_plan_module_counts(subsequent_revisions[0].aup_id)
+    )
+
     db.session.query(Revision).filter(Revision.id.in_(to_delete)).delete()
     db.session.commit()
     return jsonify({"result": "ok"}), 200
@@ -0,0 +1,46 @@
+import os
+import tempfile
+
+import pytest
+from flask import Flask
+
+# app.py читает справочники из БД при импорте, поэтому тестовая БД создается до него
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="maps_tests_"), "test.db")
+os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
+
+import auth.models  # noqa: E402,F401
+import unification.models  # noqa: E402,F401
+from maps.models import db  # noqa: E402
+from tests.factories import add_references  # noqa: E402
+
+_schema_app = Flask(__name__)
+_schema_app.config["SQLALCHEMY_DATABASE_URI"] = os.environ["SQLALCHEMY_DATABASE_URI"]
+db.init_app(_schema_app)
+with _schema_app.app_context():
+    db.create_all()
+
+from app import app as flask_app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    flask_app.config["TESTING"] = True
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+@pytest.fixture(scope="session")
+def references(app):
+    with app.app_context():
+        add_references()
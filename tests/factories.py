@@ -0,0 +1,57 @@
+"""
+Справочники и планы для тестов, записываются напрямую через модели.
+"""
+from maps.models import (AupData, AupInfo, D_Blocks, D_ControlType, D_EdIzmereniya, D_Part, D_Period, D_TypeRecord,
+                         Groups, NameOP, SprBranch, SprDegreeEducation, SprDiscipline, SprFaculty, SprFormEducation,
+                         SprOKCO, SprRop, db)
+
+# ID типа контроля -> название: экзамен, лекции, СРС
+CONTROL_TYPES = {1: "Экзамен", 2: "Лекционные занятия", 4: "Самостоятельная работа"}
+SEMESTERS = 4
+
+
+def add_references() -> None:
+    db.session.add_all([
+        SprBranch(id_branch=1, city="Москва", location="Москва"),
+        SprFaculty(id_faculty=1, name_faculty="Факультет ИТ", id_branch=1),
+        SprRop(id_rop=1, last_name="И", first_name="И", middle_name="И", email="e", telephone="t"),
+        SprDegreeEducation(id_degree=1, name_deg="Бакалавриат"),
+        SprFormEducation(id_form=1, form="Очная"),
+        SprOKCO(program_code="09.03.01", name_okco="Информатика"),
+        SprOKCO(program_code="09.04.01", name_okco="Информатика"),
+        NameOP(id_spec=1, program_code="09.03.01", num_profile="01", name_spec="Разработка"),
+        NameOP(id_spec=2, program_code="09.04.01", num_profile="01", name_spec="Разработка"),
+        D_Blocks(id=1, title="Блок 1"),
+        D_Part(id=1, title="Обязательная часть"),
+        D_TypeRecord(id=1, title="Дисциплина"),
+        D_EdIzmereniya(id=1, title="Часы"),
+        Groups(id_group=1, name_group="Без названия", color="#ffffff"),
+        *(D_ControlType(id=id_type, title=title) for id_type, title in CONTROL_TYPES.items()),
+        *(D_Period(id=i, title=f"Семестр {i}") for i in range(1, SEMESTERS + 1)),
+    ])
+    db.session.commit()
+
+
+def make_plan(num_aup: str, disciplines: int) -> AupInfo:
+    """
+    План из disciplines дисциплин, у каждой в каждом семестре по записи на тип контроля (1 ЗЕТ, 36 часов).
+    """
+    aup_info = AupInfo(
+        file=f"{num_aup}.xlsx", num_aup=num_aup, base="СОО", id_faculty=1, id_rop=1, type_educ="Высшее",
+        qualification="Бакалавр", type_standard="ФГОС3++", period_educ="2024 - 2028", id_degree=1, id_form=1,
+        years=4, id_spec=1, year_beg=2024, year_end=2028, is_actual=True,
+    )
+    db.session.add(aup_info)
+    for i in range(disciplines):
+        discipline = SprDiscipline(title=f"{num_aup} дисциплина {i}")
+        db.session.add(discipline)
+        db.session.flush()
+        for id_period in range(1, SEMESTERS + 1):
+            for id_type_control in CONTROL_TYPES:
+                db.session.add(AupData(
+                    aup=aup_info, id_block=1, shifr=f"Б1.{i:03}", id_part=1, id_type_record=1,
+                    id_discipline=discipline.id, _discipline=discipline.title, id_period=id_period, num_row=i,
+                    id_type_control=id_type_control, amount=3600, id_edizm=1, zet=100,
+                ))
+    db.session.commit()
+    return aup_info
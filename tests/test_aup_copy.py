@@ -0,0 +1,38 @@
+from unittest import mock
+
+import pytest
+
+from maps.models import AupData, AupInfo, DisciplineModuleStats, db
+from tests.factories import make_plan
+
+
+@pytest.fixture(scope="module")
+def num_aup(app, references):
+    with app.app_context():
+        return make_plan("000000301", 2).num_aup
+
+
+def get_stats_total(id_aup: int) -> int:
+    disciplines = {el.id_discipline for el in AupData.query.filter_by(id_aup=id_aup)}
+    return sum(el.count for el in DisciplineModuleStats.query if el.id_discipline in disciplines)
+
+
+def test_copy_counts_module_stats(client, app_context, num_aup):
+    source = AupInfo.query.filter_by(num_aup=num_aup).one()
+    before = get_stats_total(source.id_aup)
+
+    response = client.post(f"/api/aup-info/{num_aup}?copy_with_num=000000302")
+
+    assert response.status_code == 200
+    copy = AupInfo.query.filter_by(num_aup="000000302").one()
+    assert AupData.query.filter_by(id_aup=copy.id_aup).count() == len(source.aup_data)
+    assert get_stats_total(source.id_aup) == before + len(source.aup_data)
+
+
+def test_copy_is_rolled_back_with_stats(client, app_context, num_aup):
+    with mock.patch("maps.routes.aup_info.update_module_stats", side_effect=RuntimeError("stats failed")):
+        with pytest.raises(RuntimeError):
+            client.post(f"/api/aup-info/{num_aup}?copy_with_num=000000303")
+
+    db.session.rollback()
+    assert AupInfo.query.filter_by(num_aup="000000303").first() is None
@@ -0,0 +1,53 @@
+import pytest
+from pandas import DataFrame
+
+from maps.logic.excel_check import TotalZetCheck, ValidationContext
+
+
+def make_header(program_code: str) -> DataFrame:
+    return DataFrame(
+        {
+            "Наименование": ["Номер АУП", "Вид образования", "Уровень образования", "Направление (специальность)",
+                             "Код специальности"],
+            "Содержание": ["000000001", "Высшее образование", "Бакалавриат", "Информатика", program_code],
+        }
+    )
+
+
+def make_data(rows: list[tuple[float, str]]) -> DataFrame:
+    return DataFrame(
+        {
+            "Блок": "Блок 1",
+            "Тип записи": "Дисциплина",
+            "Дисциплина": [f"Дисциплина {i}" for i in range(len(rows))],
+            "Количество": [amount for amount, _ in rows],
+            "Ед. изм.": [measure for _, measure in rows],
+        }
+    )
+
+
+def validate(program_code: str, rows: list[tuple[float, str]]) -> dict | None:
+    return TotalZetCheck(ValidationContext(make_header(program_code), make_data(rows))).validate()
+
+
+def test_total_zet_ok():
+    assert validate("09.03.01", [(216 * 36, "Часы"), (16, "Недели")]) is None
+
+
+def test_total_zet_mismatch():
+    assert "не соответствует норме (240 ЗЕТ)" in validate("09.03.01", [(200 * 36, "Часы")])["message"]
+
+
+@pytest.mark.parametrize("program_code", ["09.07.01", "0903"])
+def test_unknown_education_level(program_code):
+    error = validate(program_code, [(240 * 36, "Часы")])
+
+    assert error is not None
+    assert program_code in error["message"]
+
+
+def test_unknown_measure():
+    error = validate("09.03.01", [(216 * 36, "Часы"), (24, "Дни")])
+
+    assert error is not None
+    assert "Дни" in error["message"]
@@ -0,0 +1,55 @@
+import pytest
+
+from maps.logic.export_cache import get_plan_version
+from maps.models import AupData, AupInfo, D_Blocks, D_ControlType, D_TypeRecord, db
+from tests.factories import make_plan
+
+
+@pytest.fixture(scope="module")
+def id_aup(app, references):
+    with app.app_context():
+        return make_plan("000000201", 1).id_aup
+
+
+@pytest.fixture
+def aup_info(app_context, id_aup):
+    yield db.session.get(AupInfo, id_aup)
+    for model, title in ((D_Blocks, "Блок 1"), (D_TypeRecord, "Дисциплина")):
+        db.session.get(model, 1).title = title
+    db.session.get(D_ControlType, 1).default_shortname = None
+    db.session.commit()
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda: setattr(db.session.get(D_Blocks, 1), "title", "Блок 2"),
+        lambda: setattr(db.session.get(D_TypeRecord, 1), "title", "Факультативные"),
+        lambda: setattr(db.session.get(D_ControlType, 1), "default_shortname", "Экз"),
+    ],
+    ids=["block", "type_record", "control_shortname"],
+)
+def test_version_follows_reference_titles(aup_info, change):
+    version = get_plan_version(aup_info)
+    change()
+    db.session.commit()
+
+    assert get_plan_version(aup_info) != version
+
+
+def test_version_includes_rows_without_discipline(aup_info):
+    version = get_plan_version(aup_info)
+    row = AupData.query.filter_by(id_aup=aup_info.id_aup).first()
+    row.id_discipline = None
+    db.session.commit()
+    changed = get_plan_version(aup_info)
+
+    row.amount += 100
+    db.session.commit()
+
+    assert changed != version
+    assert get_plan_version(aup_info) != changed
+
+
+def test_save_excel_unknown_plan(client):
+    assert client.get("/api/save_excel/999999999").status_code == 404
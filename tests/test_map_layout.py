@@ -0,0 +1,100 @@
+import io
+
+import openpyxl
+import pytest
+
+from maps.logic.map_layout import THICK, THIN, build_layout, cell_borders, get_text_color
+from maps.logic.print_excel import render_map
+
+DARK = "#000080"
+LIGHT = "#FFFF00"
+
+
+def make_item(text: str, num_col: int, num_row: int, zet: float, color: str = LIGHT, id_group: int = 1) -> dict:
+    return {"text": text, "num_col": num_col, "num_row": num_row, "zet": zet, "color": color, "id_group": id_group}
+
+
+@pytest.fixture
+def items() -> list[dict]:
+    # "Математика" идет два семестра, "Физкультура" меньше 1 ЗЕТ
+    return [
+        make_item("Программирование", 2, 2, 4, DARK, 2),
+        make_item("Математика", 1, 1, 3),
+        make_item("Физкультура", 1, 2, 0.5),
+        make_item("Математика", 2, 1, 2),
+    ]
+
+
+def test_blocks_placement(items):
+    layout = build_layout(items)
+
+    assert [(b["item"]["text"], b["column"], b["row"], b["height"]) for b in layout["blocks"]] == [
+        ("Математика", 0, 0, 6),
+        ("Физкультура", 0, 6, 2),
+        ("Математика", 1, 0, 4),
+        ("Программирование", 1, 4, 8),
+    ]
+    assert layout["rows"] == 12
+    assert layout["last_row"] == 11
+    assert layout["max_zet"] == 6
+    assert layout["print_rows"] == 12
+    assert layout["print_columns"] == 2
+    assert layout["courses"] == [(0, 1, "1 курс")]
+
+
+def test_grid(items):
+    layout = build_layout(items)
+
+    assert layout["grid"][0] == [0] * 6 + [1] * 2 + [None] * 4
+    assert layout["grid"][1] == [2] * 4 + [3] * 8
+
+
+def test_fractional_height_has_no_last_row():
+    layout = build_layout([make_item("Практика", 1, 1, 1.25)])
+
+    assert layout["rows"] == 2
+    assert layout["last_row"] is None
+
+
+def test_cell_borders(items):
+    layout = build_layout(items)
+
+    assert cell_borders(layout, 0, 9) == {}
+    assert cell_borders(layout, 0, 11) == {"bottom": THICK}
+    assert cell_borders(layout, 0, 0) == {"left": THIN, "right": THIN, "bottom": THIN}
+    assert cell_borders(layout, 1, 0) == {"left": THIN, "right": THICK, "bottom": THIN}
+    assert cell_borders(layout, 1, 11) == {"left": THIN, "right": THICK, "bottom": THICK}
+
+
+@pytest.mark.parametrize(
+    "color, text_color",
+    [
+        ("#000080", "#FFFFFF"),
+        ("FFFF00", "#000000"),
+        ("#8C8C8C", "#000000"),
+        ("#8B8B8B", "#FFFFFF"),
+    ],
+)
+def test_get_text_color(color, text_color):
+    assert get_text_color(color) == text_color
+
+
+def test_render_map_merges_blocks(items):
+    map_data = {
+        "num_aup": "000000001",
+        "items": items,
+        "header": "КАРТА ДИСЦИПЛИН",
+        "groups": {1: {"name": "Общие", "color": LIGHT}, 2: {"name": "ИТ", "color": DARK}},
+        "electives": {},
+    }
+    book = openpyxl.load_workbook(io.BytesIO(render_map(map_data, "3", "land")))
+    ws = book.worksheets[0]
+
+    merged = {str(cell_range) for cell_range in ws.merged_cells.ranges}
+    # сетка начинается с 4 строки и столбца B, у каждого семестра "Математики" свой блок
+    assert {"B4:B9", "B10:B11", "C4:C7", "C8:C15"} <= merged
+    assert ws["B4"].value == "Математика"
+    assert ws["C4"].value == "Математика"
+    assert ws["C8"].value == "Программирование"
+    assert ws["B4"].font.color.rgb == "FF000000"
+    assert ws["C8"].font.color.rgb == "FFFFFFFF"
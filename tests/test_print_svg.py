@@ -0,0 +1,50 @@
+import xml.etree.ElementTree as et
+
+import pytest
+
+from maps.logic.map_layout import DEFAULT_COLOR, is_color, normalize_color
+from maps.logic.print_svg import render_map_svg
+
+SVG = "{http://www.w3.org/2000/svg}"
+MALICIOUS_COLOR = 'ffffff"/><script>alert(1)</script><x a="'
+
+
+def make_map_data(color: str) -> dict:
+    return {
+        "num_aup": "000000001",
+        "header": "КАРТА ДИСЦИПЛИН",
+        "items": [
+            {"discipline": "Математика", "text": "Математика", "num_col": 1, "num_row": 1, "zet": 3, "color": color},
+        ],
+    }
+
+
+@pytest.mark.parametrize(
+    "value, valid",
+    [("#5f60ec", True), ("5F60EC", True), ("#5f60e", False), ("red", False), (MALICIOUS_COLOR, False), (None, False)],
+)
+def test_is_color(value, valid):
+    assert is_color(value) is valid
+
+
+def test_normalize_color():
+    assert normalize_color("5f60ec") == "#5F60EC"
+    assert normalize_color(MALICIOUS_COLOR) == DEFAULT_COLOR
+
+
+def test_render_map_svg_escapes_group_color():
+    svg = render_map_svg(make_map_data(MALICIOUS_COLOR))
+
+    root = et.fromstring(svg)
+    assert root.find(f".//{SVG}script") is None
+    assert "<script" not in svg
+    block = root.find(f"{SVG}g")
+    assert block.find(f"{SVG}rect").get("fill") == DEFAULT_COLOR
+    assert block.find(f"{SVG}text").get("fill") == "#000000"
+
+
+def test_render_map_svg_keeps_group_color():
+    block = et.fromstring(render_map_svg(make_map_data("000080"))).find(f"{SVG}g")
+
+    assert block.find(f"{SVG}rect").get("fill") == "#000080"
+    assert block.find(f"{SVG}text").get("fill") == "#FFFFFF"
@@ -0,0 +1,27 @@
+from maps.logic.save_check import SaveChecker
+from maps.models import AupData, AupInfo, db
+from tests.factories import make_plan
+
+
+def test_totals_follow_edits_outside_checker(app_context, references):
+    aup_info = make_plan("000000101", 2)
+    SaveChecker(aup_info).save()
+
+    # правка без SaveChecker и без ревизии, число записей не меняется
+    row = AupData.query.filter_by(id_aup=aup_info.id_aup).order_by(AupData.id).first()
+    row.zet = 150
+    db.session.commit()
+
+    checker = SaveChecker(db.session.get(AupInfo, aup_info.id_aup))
+    assert checker.totals["groups"][(row.id_discipline, row.id_period)] == 3 * 100 + 50
+
+
+def test_norm_follows_header_change(app_context, references):
+    aup_info = make_plan("000000102", 1)
+    SaveChecker(aup_info).save()
+    assert SaveChecker(aup_info).totals["norm"] == 240
+
+    aup_info.id_spec = 2  # магистратура
+    db.session.commit()
+
+    assert SaveChecker(db.session.get(AupInfo, aup_info.id_aup)).totals["norm"] == 120
@@ -0,0 +1,74 @@
+import uuid
+from datetime import datetime, timedelta
+
+import config
+from maps.logic import upload_jobs
+from maps.logic.upload_jobs import (
+    JOB_DONE,
+    JOB_PENDING,
+    JOB_RUNNING,
+    WORKER_ID,
+    claim_next_job,
+    heartbeat,
+    requeue_expired_jobs,
+    run_upload_job,
+)
+from maps.models import UploadJob, db
+
+
+def add_job(status: str, worker_id: str | None = None, heartbeat_at: datetime | None = None) -> str:
+    job = UploadJob(
+        id=uuid.uuid4().hex,
+        status=status,
+        options={},
+        created_at=datetime.now(),
+        started_at=heartbeat_at,
+        worker_id=worker_id,
+        heartbeat_at=heartbeat_at,
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_claim_records_worker(app_context):
+    job_id = add_job(JOB_PENDING)
+
+    job = claim_next_job()
+
+    assert job.id == job_id
+    assert job.status == JOB_RUNNING
+    assert job.worker_id == WORKER_ID
+    assert job.heartbeat_at is not None
+
+
+def test_requeue_only_expired_jobs(app_context):
+    expired = datetime.now() - timedelta(seconds=config.UPLOAD_JOB_LEASE + 60)
+    expired_id = add_job(JOB_RUNNING, "other:1", expired)
+    live_id = add_job(JOB_RUNNING, "other:2", datetime.now())
+
+    requeue_expired_jobs()
+    db.session.expire_all()
+
+    expired_job = db.session.get(UploadJob, expired_id)
+    assert expired_job.status == JOB_PENDING
+    assert expired_job.worker_id is None
+    live_job = db.session.get(UploadJob, live_id)
+    assert live_job.status == JOB_RUNNING
+    assert live_job.worker_id == "other:2"
+
+
+def test_lost_lease_leaves_job_to_new_owner(app_context, monkeypatch):
+    monkeypatch.setattr(upload_jobs.shutil, "rmtree", lambda *args, **kwargs: None)
+    own_id = add_job(JOB_RUNNING, WORKER_ID, datetime.now())
+    foreign_id = add_job(JOB_RUNNING, "other:3", datetime.now())
+
+    assert heartbeat(db.session.get(UploadJob, own_id))
+    assert not heartbeat(db.session.get(UploadJob, foreign_id))
+
+    run_upload_job(db.session.get(UploadJob, foreign_id))
+    run_upload_job(db.session.get(UploadJob, own_id))
+    db.session.expire_all()
+
+    assert db.session.get(UploadJob, foreign_id).status == JOB_RUNNING
+    assert db.session.get(UploadJob, own_id).status == JOB_DONE
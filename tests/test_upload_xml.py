@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import event
+
+from maps.models import db
+from tests.factories import make_plan
+
+
+@pytest.fixture(scope="module")
+def plans(app, references):
+    with app.app_context():
+        make_plan("000000001", 2)
+        make_plan("000000002", 60)
+    return {"small": "000000001", "large": "000000002"}
+
+
+def count_queries(app, client, num_aup: str) -> tuple[int, bytes]:
+    with app.app_context():
+        engine = db.engine
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        queries.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(f"/api/upload-xml/{num_aup}")
+        data = response.get_data()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert response.status_code == 200
+    return len(queries), data
+
+
+def test_create_xml_query_count_is_bounded(app, client, plans):
+    small_queries, small_xml = count_queries(app, client, plans["small"])
+    large_queries, large_xml = count_queries(app, client, plans["large"])
+
+    assert small_xml.count("<Строка ".encode()) == 2
+    assert large_xml.count("<Строка ".encode()) == 60
+    # число запросов не зависит от числа строк плана
+    assert large_queries == small_queries
+    assert small_queries <= 10
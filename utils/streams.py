@@ -0,0 +1,22 @@
+class StreamBuffer:
+    """
+    Поток без seek для zipfile, gzip и Parquet: записанные байты забираются методом pop и отдаются клиенту
+    потоковым ответом (Response(stream_with_context(...))).
+    """
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data